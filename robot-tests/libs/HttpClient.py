@@ -0,0 +1,293 @@
+"""Robot Framework keyword library with a process-wide pooled HTTP client.
+
+Usage: Library    ../libs/HttpClient.py
+
+Requests go to ${BASE_URL} through keep-alive connection pools shared by every suite of the
+process (and by every run of a warm worker), so connections are reused instead of paying a new
+TCP/TLS handshake per suite or keyword. Each suite still gets its own `requests.Session`, so
+cookies, default headers and auth never leak between suites or runs. Pool size, timeouts and
+retries come from the `http` block of config/<env>.yaml (env from ${CONFIG_ENV}, set by run_tests.py).
+
+Every request is timed (DNS, TCP connect and TLS handshake when a new connection is opened,
+time to first byte, total). The timings are logged, summarised at the end of the run, and appended
+as JSON lines to ${HTTP_TIMINGS} when run_tests.py sets it.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from robot.api import logger
+from robot.libraries.BuiltIn import BuiltIn, RobotNotRunningError
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError
+from urllib3.util.retry import Retry
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+from libs.config_loader import load_config  # noqa: E402
+
+# One pooled adapter per pool configuration, shared by the sessions of all suites of the process.
+_adapters: dict[tuple, HTTPAdapter] = {}
+_adapters_lock = threading.Lock()
+# Setup phases of the connection opened by the current request; None when a pooled one was reused.
+_phases = threading.local()
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+class _TimedConnectionMixin:
+    """Records DNS, connect and TLS times of each new connection in `_phases`."""
+
+    def _new_conn(self):
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(host, self.port, type=socket.SOCK_STREAM)
+        except socket.gaierror as exc:
+            raise NameResolutionError(self.host, self, exc) from exc
+        resolved = time.perf_counter()
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        try:
+            # Connect to the resolved addresses in order, as socket.create_connection would.
+            for i, address in enumerate(addresses):
+                self._dns_host = address
+                try:
+                    sock = super()._new_conn()
+                    break
+                except ConnectTimeoutError:
+                    if i == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+        _phases.current = {"dns_ms": _ms(resolved - start), "connect_ms": _ms(time.perf_counter() - resolved), "tls_ms": 0.0}
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        phases = getattr(_phases, "current", None)
+        if phases is not None and isinstance(self, HTTPSConnection):
+            phases["tls_ms"] = max(0.0, _ms(time.perf_counter() - start) - phases["dns_ms"] - phases["connect_ms"])
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool, "https": _TimedHTTPSConnectionPool}
+
+
+def _adapter(settings: dict) -> HTTPAdapter:
+    key = (settings["pool_connections"], settings["pool_maxsize"], settings["retries"])
+    with _adapters_lock:
+        adapter = _adapters.get(key)
+        if adapter is None:
+            retries = Retry(total=settings["retries"], backoff_factor=0.2, raise_on_status=False)
+            adapter = _TimedAdapter(
+                pool_connections=settings["pool_connections"],
+                pool_maxsize=settings["pool_maxsize"],
+                max_retries=retries,
+            )
+            _adapters[key] = adapter
+    return adapter
+
+
+def _new_session(settings: dict) -> requests.Session:
+    """A session with its own cookies and defaults on the process-wide connection pools."""
+    adapter = _adapter(settings)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class HttpClient:
+    ROBOT_LIBRARY_SCOPE = "GLOBAL"
+    ROBOT_LISTENER_API_VERSION = 3
+
+    def __init__(self):
+        self.ROBOT_LIBRARY_LISTENER = self
+        self._settings: dict | None = None
+        self._session: requests.Session | None = None
+        self._timings: list[dict] = []
+
+    # ---------- setup ----------
+
+    def _variable(self, name: str, default=None):
+        try:
+            return BuiltIn().get_variable_value("${%s}" % name, default)
+        except RobotNotRunningError:
+            return default
+
+    def _config(self) -> dict:
+        if self._settings is None:
+            config = load_config(self._variable("CONFIG_ENV", "dev"))
+            http = config["http"]
+            self._settings = {
+                "base_url": (self._variable("BASE_URL") or config["base_url"]).rstrip("/"),
+                "pool_connections": int(http["pool_connections"]),
+                "pool_maxsize": int(http["pool_maxsize"]),
+                "retries": int(http["retries"]),
+                "keep_alive": bool(http["keep_alive"]),
+                "timeout": (
+                    float(http["connect_timeout"]),
+                    float(http["read_timeout"] or self._variable("TIMEOUT") or config["timeout"]),
+                ),
+                "timings_file": self._variable("HTTP_TIMINGS"),
+            }
+        return self._settings
+
+    # ---------- keywords ----------
+
+    def http_request(self, method: str, path: str, expected_status=None, **kwargs) -> requests.Response:
+        """Send `method` to ${BASE_URL}`path` on the suite's session (pooled connections).
+
+        `expected_status` is a status code or `any`; by default 4xx/5xx responses fail.
+        Other arguments (`params`, `headers`, `json`, `data`, ...) are passed to requests.
+        """
+        settings = self._config()
+        if self._session is None:
+            self._session = _new_session(settings)
+        session = self._session
+        url = path if path.startswith(("http://", "https://")) else settings["base_url"] + "/" + path.lstrip("/")
+        kwargs.setdefault("timeout", settings["timeout"])
+        if not settings["keep_alive"]:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), "Connection": "close"}
+
+        _phases.current = None
+        start = time.perf_counter()
+        response = session.request(method.upper(), url, **kwargs)
+        total_ms = _ms(time.perf_counter() - start)
+        self._record(method.upper(), path, response, total_ms, _phases.current)
+
+        if expected_status is None:
+            if response.status_code >= 400:
+                raise AssertionError(f"{method.upper()} {path} failed with status {response.status_code}")
+        elif str(expected_status).lower() != "any":
+            self.status_should_be(expected_status, response)
+        return response
+
+    def http_get(self, path: str, **kwargs) -> requests.Response:
+        return self.http_request("GET", path, **kwargs)
+
+    def http_post(self, path: str, **kwargs) -> requests.Response:
+        return self.http_request("POST", path, **kwargs)
+
+    def http_put(self, path: str, **kwargs) -> requests.Response:
+        return self.http_request("PUT", path, **kwargs)
+
+    def http_patch(self, path: str, **kwargs) -> requests.Response:
+        return self.http_request("PATCH", path, **kwargs)
+
+    def http_delete(self, path: str, **kwargs) -> requests.Response:
+        return self.http_request("DELETE", path, **kwargs)
+
+    def status_should_be(self, expected_status, response: requests.Response) -> None:
+        if response.status_code != int(expected_status):
+            raise AssertionError(
+                f"Expected status {expected_status} but got {response.status_code} for {response.request.method} {response.url}"
+            )
+
+    def get_http_timing_stats(self) -> dict:
+        """Summary of the requests sent so far: count, new connections and ms percentiles per endpoint."""
+        endpoints: dict[str, list[float]] = {}
+        for timing in self._timings:
+            endpoints.setdefault(f"{timing['method']} {timing['endpoint']}", []).append(timing["total_ms"])
+        totals = [t["total_ms"] for t in self._timings]
+        return {
+            "requests": len(self._timings),
+            "connections_opened": sum(1 for t in self._timings if t["new_connection"]),
+            "p50_ms": round(_percentile(totals, 50), 1) if totals else None,
+            "p95_ms": round(_percentile(totals, 95), 1) if totals else None,
+            "endpoints": {
+                name: {
+                    "count": len(values),
+                    "p50_ms": round(_percentile(values, 50), 1),
+                    "p95_ms": round(_percentile(values, 95), 1),
+                    "max_ms": round(max(values), 1),
+                }
+                for name, values in sorted(endpoints.items())
+            },
+        }
+
+    def log_http_timing_stats(self) -> None:
+        stats = self.get_http_timing_stats()
+        logger.info(json.dumps(stats, indent=2))
+
+    # ---------- timings ----------
+
+    def _record(self, method: str, path: str, response: requests.Response, total_ms: float, phases: dict | None) -> None:
+        setup = phases or {"dns_ms": 0.0, "connect_ms": 0.0, "tls_ms": 0.0}
+        # requests' elapsed runs from sending the request to the parsed headers, setup included.
+        ttfb_ms = max(0.0, _ms(response.elapsed.total_seconds()) - sum(setup.values()))
+        timing = {
+            "method": method,
+            "endpoint": path.split("?", 1)[0],
+            "status": response.status_code,
+            **setup,
+            "ttfb_ms": round(ttfb_ms, 2),
+            "total_ms": total_ms,
+            "new_connection": phases is not None,
+        }
+        self._timings.append(timing)
+        if phases is not None:
+            connection = f"new connection: dns {setup['dns_ms']} ms, connect {setup['connect_ms']} ms, tls {setup['tls_ms']} ms"
+        else:
+            connection = "reused connection"
+        logger.info(
+            f"{method} {path} -> {response.status_code} in {total_ms} ms "
+            f"(first byte {timing['ttfb_ms']} ms, {connection})"
+        )
+        timings_file = self._settings["timings_file"]
+        if timings_file:
+            timing = {**timing, "test": self._variable("TEST_NAME"), "ts": time.time()}
+            # One append per line so parallel shards can share the file.
+            fd = os.open(timings_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, (json.dumps(timing) + "\n").encode("utf-8"))
+            finally:
+                os.close(fd)
+
+    def start_suite(self, data, result):
+        """Library listener: the suite gets a new session (not closed: it would close the shared pools)."""
+        self._session = None
+
+    def close(self):
+        """Library listener: print the run's request summary to the console."""
+        if not self._timings:
+            return
+        stats = self.get_http_timing_stats()
+        logger.console(
+            f"HTTP: {stats['requests']} request(s) over {stats['connections_opened']} new connection(s), "
+            f"p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms"
+        )
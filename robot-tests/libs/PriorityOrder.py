@@ -0,0 +1,33 @@
+"""Robot Framework prerunmodifier that runs likely-failing tests first.
+
+Usage: --prerunmodifier libs/PriorityOrder.py;<path to plan.json>
+The plan maps test full names to scores ({"priorities": {...}}, written by the dashboard).
+Tests and suites are ordered by descending score; unscored ones keep their original order.
+"""
+import json
+
+from robot.api import SuiteVisitor
+
+
+class PriorityOrder(SuiteVisitor):
+
+    def __init__(self, plan_path: str):
+        with open(plan_path, encoding="utf-8") as f:
+            self.scores = json.load(f).get("priorities", {})
+        self._suite_scores = {}
+
+    def _suite_score(self, suite) -> float:
+        key = id(suite)
+        if key not in self._suite_scores:
+            scores = [self.scores.get(t.full_name, 0.0) for t in suite.tests]
+            scores += [self._suite_score(s) for s in suite.suites]
+            self._suite_scores[key] = max(scores, default=0.0)
+        return self._suite_scores[key]
+
+    def start_suite(self, suite):
+        # sorted() is stable, so equal scores keep the file order.
+        suite.tests = sorted(suite.tests, key=lambda t: -self.scores.get(t.full_name, 0.0))
+        suite.suites = sorted(suite.suites, key=lambda s: -self._suite_score(s))
+
+    def visit_test(self, test):
+        pass
@@ -0,0 +1,37 @@
+"""Robot Framework listener that appends test progress events to a JSON lines file.
+
+Usage: --listener libs/ProgressListener.py;<path to events.jsonl>
+Each event is written with a single append so parallel shards can share one file.
+"""
+import json
+import os
+import time
+
+
+class ProgressListener:
+    ROBOT_LISTENER_API_VERSION = 3
+
+    def __init__(self, events_path: str):
+        self.events_path = events_path
+        os.makedirs(os.path.dirname(os.path.abspath(events_path)), exist_ok=True)
+
+    def _emit(self, event: dict) -> None:
+        event["ts"] = time.time()
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        fd = os.open(self.events_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+
+    def start_test(self, data, result):
+        self._emit({"event": "test_start", "test": result.full_name})
+
+    def end_test(self, data, result):
+        self._emit({
+            "event": "test_end",
+            "test": result.full_name,
+            "status": result.status,
+            "elapsed": result.elapsed_time.total_seconds(),
+            "message": (result.message or "")[:500],
+        })
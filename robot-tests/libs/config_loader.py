@@ -5,6 +5,21 @@ DEFAULTS = {
     "base_url": "",
     "timeout": 10,
     "env_name": "dev",
+    # Pooled HTTP client used by the suites (libs/HttpClient.py).
+    "http": {
+        "pool_connections": 4,   # hosts kept in the pool
+        "pool_maxsize": 10,      # keep-alive connections per host
+        "connect_timeout": 5,
+        "read_timeout": None,    # None = `timeout`
+        "retries": 0,
+        "keep_alive": True,
+    },
+    # Built-in httpbin stand-in (libs/httpbin_stub.py); enabled replaces base_url for the run.
+    "stub": {
+        "enabled": False,
+        "latency_ms": 0,
+        "jitter_ms": 0,
+    },
 }
 
 
@@ -17,4 +32,7 @@ def load_config(env: str) -> dict:
 
     with open(config_path, "r", encoding="utf-8") as f:
         loaded = yaml.safe_load(f) or {}
-    return {**DEFAULTS, **loaded}
+    config = {**DEFAULTS, **loaded}
+    config["http"] = {**DEFAULTS["http"], **(loaded.get("http") or {})}
+    config["stub"] = {**DEFAULTS["stub"], **(loaded.get("stub") or {})}
+    return config
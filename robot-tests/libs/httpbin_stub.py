@@ -0,0 +1,295 @@
+"""
+httpbin-compatible stub: a local, deterministic target for the suites (CI, benchmarks, offline work).
+
+One asyncio loop serves many keep-alive connections without third-party packages. It covers the
+httpbin endpoints the suites use: /get /post /put /patch /delete /anything (echo of args, headers,
+body and JSON), /status/<codes>, /headers, /ip, /user-agent, /uuid, /bytes/<n>, /delay/<seconds>,
+/cookies (+ /cookies/set, /cookies/delete), /gzip, /html and /json. Every response can be delayed
+by a fixed latency plus seeded random jitter.
+
+Usage:
+    python libs/httpbin_stub.py [--port 8080] [--latency-ms 0] [--jitter-ms 0] [--seed 0]
+
+run_tests.py --with-stub starts it on a free port and points the run at it (see running()).
+"""
+import argparse
+import asyncio
+import contextlib
+import gzip
+import json
+import random
+import subprocess
+import sys
+import uuid
+from http import HTTPStatus
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qsl, urlsplit
+
+# Same limits as httpbin.
+MAX_BYTES = 100 * 1024
+MAX_DELAY_SECONDS = 10.0
+MAX_BODY = 10 * 1024 * 1024
+# Printed on startup; running() reads the URL from it.
+READY_PREFIX = "httpbin stub listening on "
+HTML_PAGE = (
+    "<!DOCTYPE html>\n<html>\n<head></head>\n<body>\n<h1>Herman Melville - Moby-Dick</h1>\n<div><p>\n"
+    "Availing himself of the mild, summer-cool weather that now reigned in these latitudes, and in "
+    "preparation for the peculiarly active pursuits shortly to be anticipated, Perth, the begrimed, "
+    "blistered old blacksmith, had not removed his portable forge to the hold again.\n"
+    "</p></div>\n</body>\n</html>\n"
+).encode()
+SLIDESHOW = {
+    "slideshow": {
+        "author": "Yours Truly",
+        "date": "date of publication",
+        "slides": [
+            {"title": "Wake up to WonderWidgets!", "type": "all"},
+            {"items": ["Why <em>WonderWidgets</em> are great", "Who <em>buys</em> WonderWidgets"],
+             "title": "Overview", "type": "all"},
+        ],
+        "title": "Sample Slide Show",
+    }
+}
+# Endpoints answering only one method (405 otherwise), as on httpbin.
+METHOD_ENDPOINTS = {"/get": "GET", "/post": "POST", "/put": "PUT", "/patch": "PATCH", "/delete": "DELETE"}
+
+
+class Request:
+    def __init__(self, method: str, target: str, headers: list[tuple[str, str]], body: bytes, peer: str):
+        self.method = method
+        parts = urlsplit(target)
+        self.path = parts.path or "/"
+        self.query = parts.query
+        self.target = target
+        self.headers = headers
+        self.body = body
+        self.peer = peer
+
+    def header(self, name: str, default: str = "") -> str:
+        name = name.lower()
+        return next((value for key, value in self.headers if key.lower() == name), default)
+
+
+def _multi(pairs: list[tuple[str, str]]) -> dict:
+    """httpbin's args/form shape: a string per key, a list when the key repeats."""
+    result: dict = {}
+    for key, value in pairs:
+        if key in result:
+            result[key] = result[key] if isinstance(result[key], list) else [result[key]]
+            result[key].append(value)
+        else:
+            result[key] = value
+    return result
+
+
+def _title(name: str) -> str:
+    return "-".join(part.capitalize() for part in name.split("-"))
+
+
+def _json(payload, status: int = 200, headers: list | None = None) -> tuple[int, list, bytes]:
+    return status, [("Content-Type", "application/json"), *(headers or [])], json.dumps(payload, indent=2).encode() + b"\n"
+
+
+class Stub:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rng = random.Random(seed)
+
+    def _echo(self, request: Request, with_body: bool) -> dict:
+        payload = {
+            "args": _multi(parse_qsl(request.query, keep_blank_values=True)),
+            "headers": {_title(key): value for key, value in request.headers},
+            "origin": request.peer,
+            "url": f"http://{request.header('host', 'localhost')}{request.target}",
+        }
+        if with_body:
+            text = request.body.decode("utf-8", errors="replace")
+            content_type = request.header("content-type")
+            try:
+                parsed = json.loads(text) if text and "json" in content_type else None
+            except ValueError:
+                parsed = None
+            form = parse_qsl(text, keep_blank_values=True) if "x-www-form-urlencoded" in content_type else []
+            payload.update({
+                "data": "" if form else text, "files": {}, "form": _multi(form), "json": parsed,
+                "method": request.method,
+            })
+        return payload
+
+    async def respond(self, request: Request) -> tuple[int, list, bytes]:
+        path = request.path.rstrip("/") or "/"
+        segments = path.strip("/").split("/")
+        head = "/" + segments[0]
+
+        if path in METHOD_ENDPOINTS:
+            if request.method not in (METHOD_ENDPOINTS[path], "HEAD" if path == "/get" else None):
+                return 405, [("Allow", METHOD_ENDPOINTS[path])], b""
+            return _json(self._echo(request, with_body=path != "/get"))
+        if head == "/anything":
+            return _json(self._echo(request, with_body=True))
+        if head == "/status" and len(segments) == 2:
+            try:
+                codes = [int(code) for code in segments[1].split(",")]
+            except ValueError:
+                return 400, [("Content-Type", "text/plain")], b"Invalid status code\n"
+            return self.rng.choice(codes), [], b""
+        if head == "/delay" and len(segments) == 2:
+            try:
+                seconds = min(max(float(segments[1]), 0.0), MAX_DELAY_SECONDS)
+            except ValueError:
+                return 400, [("Content-Type", "text/plain")], b"Invalid delay\n"
+            await asyncio.sleep(seconds)
+            return _json(self._echo(request, with_body=True))
+        if head == "/bytes" and len(segments) == 2 and segments[1].isdigit():
+            size = min(int(segments[1]), MAX_BYTES)
+            seed = dict(parse_qsl(request.query)).get("seed")
+            rng = random.Random(int(seed)) if seed and seed.isdigit() else self.rng
+            return 200, [("Content-Type", "application/octet-stream")], rng.randbytes(size)
+        if path == "/cookies/set":
+            headers = [("Location", "/cookies")]
+            headers += [("Set-Cookie", f"{key}={value}; Path=/") for key, value in parse_qsl(request.query)]
+            return 302, headers, b""
+        if path == "/cookies/delete":
+            headers = [("Location", "/cookies")]
+            headers += [("Set-Cookie", f"{key}=; Expires=Thu, 01-Jan-1970 00:00:00 GMT; Max-Age=0; Path=/")
+                        for key, _ in parse_qsl(request.query, keep_blank_values=True)]
+            return 302, headers, b""
+        if path == "/cookies":
+            cookie = SimpleCookie()
+            cookie.load(request.header("cookie"))
+            return _json({"cookies": {key: morsel.value for key, morsel in cookie.items()}})
+        if path == "/headers":
+            return _json({"headers": self._echo(request, with_body=False)["headers"]})
+        if path == "/ip":
+            return _json({"origin": request.peer})
+        if path == "/user-agent":
+            return _json({"user-agent": request.header("user-agent")})
+        if path == "/uuid":
+            return _json({"uuid": str(uuid.UUID(int=self.rng.getrandbits(128), version=4))})
+        if path == "/gzip":
+            status, headers, body = _json({**self._echo(request, with_body=False), "gzipped": True,
+                                           "method": request.method})
+            return status, [*headers, ("Content-Encoding", "gzip")], gzip.compress(body, compresslevel=1)
+        if path == "/html":
+            return 200, [("Content-Type", "text/html; charset=utf-8")], HTML_PAGE
+        if path == "/json":
+            return _json(SLIDESHOW)
+        return 404, [("Content-Type", "text/html")], b"<h1>Not Found</h1>\n"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve one connection until the client closes it or asks to (HTTP/1.1 keep-alive)."""
+        peer = (writer.get_extra_info("peername") or ("127.0.0.1",))[0]
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    return
+                headers = [tuple(part.strip() for part in line.split(":", 1)) for line in lines[1:] if ":" in line]
+                request = Request(method.upper(), target, headers, b"", peer)
+                try:
+                    if "chunked" in request.header("transfer-encoding").lower():
+                        request.body = await self._read_chunked(reader)
+                    else:
+                        length = int(request.header("content-length") or 0)
+                        if length < 0:
+                            raise ValueError(length)
+                        if length > MAX_BODY:
+                            return
+                        request.body = await reader.readexactly(length) if length else b""
+                except ValueError:
+                    # The body cannot be delimited, so the connection cannot be reused either.
+                    await self._send(writer, 400, [("Content-Type", "text/plain")], b"Invalid request body length\n", False)
+                    return
+
+                delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+                if delay:
+                    await asyncio.sleep(delay)
+                status, extra, body = await self.respond(request)
+
+                connection = request.header("connection").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                await self._send(writer, status, extra, body if request.method != "HEAD" else b"", keep_alive,
+                                 length=len(body))
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, status: int, headers: list, body: bytes, keep_alive: bool,
+                    length: int | None = None) -> None:
+        """Write one response; `length` overrides Content-Length (HEAD answers without the body)."""
+        reason = HTTPStatus(status).phrase if status in HTTPStatus._value2member_map_ else ""
+        out = [f"HTTP/1.1 {status} {reason}", f"Content-Length: {len(body) if length is None else length}",
+               f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        out += [f"{key}: {value}" for key, value in headers]
+        writer.write(("\r\n".join(out) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    @staticmethod
+    async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b";", 1)[0].strip() or b"0", 16)
+            if size == 0:
+                await reader.readline()
+                return bytes(body)
+            body += await reader.readexactly(size)
+            await reader.readline()
+            if len(body) > MAX_BODY:
+                raise ConnectionError("request body too large")
+
+
+async def serve(host: str, port: int, stub: Stub) -> None:
+    server = await asyncio.start_server(stub.handle, host, port, backlog=1024, reuse_address=True)
+    bound = server.sockets[0].getsockname()
+    print(f"{READY_PREFIX}http://{bound[0]}:{bound[1]}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+@contextlib.contextmanager
+def running(latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 0, host: str = "127.0.0.1"):
+    """Start the stub in a child process on a free port; yields its base URL and stops it on exit."""
+    proc = subprocess.Popen(
+        [sys.executable, __file__, "--host", host, "--port", "0", "--latency-ms", str(latency_ms),
+         "--jitter-ms", str(jitter_ms), "--seed", str(seed)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        line = proc.stdout.readline()
+        if not line.startswith(READY_PREFIX):
+            raise RuntimeError(f"httpbin stub did not start (exit code {proc.poll()})")
+        yield line[len(READY_PREFIX):].strip()
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        proc.stdout.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the httpbin-compatible stub.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080, help="0 picks a free port")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra latency, up to this much")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of jitter, /uuid, /bytes and /status choices")
+    args = parser.parse_args()
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(serve(args.host, args.port, Stub(args.latency_ms, args.jitter_ms, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
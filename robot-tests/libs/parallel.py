@@ -0,0 +1,246 @@
+"""Run a Robot Framework selection as parallel shards and merge the results."""
+import heapq
+import json
+import os
+import subprocess
+import sys
+
+from robot import rebot
+from robot.api import ExecutionResult, TestSuiteBuilder
+from robot.errors import DataError
+
+# Weight used for tests that have never been timed.
+DEFAULT_TEST_DURATION = 1.0
+# Smoothing factor for recorded durations (1.0 = keep only the latest run).
+DURATION_ALPHA = 0.5
+# Robot exit codes from 252 up mean the shard did not execute normally (bad data, interrupted, crashed).
+EXECUTION_ERROR_RC = 252
+# Returned when a shard crashed or was killed: Robot's "unexpected internal error".
+SHARD_FAILED_RC = 255
+
+
+def load_durations(path: str) -> dict[str, float]:
+    """Read recorded per-test durations (seconds), keyed by test full name."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record_durations(output_xml: str, path: str) -> None:
+    """Fold the test durations of a finished run into the durations file."""
+    if not os.path.exists(output_xml):
+        return
+    durations = load_durations(path)
+    result = ExecutionResult(output_xml)
+    for test in _iter_tests(result.suite):
+        if test.status == "SKIP":
+            continue
+        elapsed = test.elapsed_time.total_seconds()
+        previous = durations.get(test.full_name)
+        if previous is None:
+            durations[test.full_name] = elapsed
+        else:
+            durations[test.full_name] = DURATION_ALPHA * elapsed + (1 - DURATION_ALPHA) * previous
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(durations, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _iter_tests(suite):
+    yield from suite.tests
+    for child in suite.suites:
+        yield from _iter_tests(child)
+
+
+def collect_items(
+    tests_dir: str,
+    include: str | None,
+    split: str,
+    suites: list[str] | None = None,
+) -> list[tuple[str, list[str]]]:
+    """
+    List the shardable items of a selection (optionally limited to the named suites).
+    Returns: [(item full name, [test full names it contains]), ...]
+    An item is a suite file for split="suite" or a single test for split="test".
+    """
+    suite = TestSuiteBuilder().build(tests_dir)
+    if include or suites:
+        suite.filter(included_suites=suites or None, included_tags=[include] if include else None)
+
+    items = []
+    if split == "test":
+        for test in _iter_tests(suite):
+            items.append((test.full_name, [test.full_name]))
+        return items
+
+    def visit(s):
+        if s.tests:
+            items.append((s.full_name, [t.full_name for t in s.tests]))
+        for child in s.suites:
+            visit(child)
+
+    visit(suite)
+    return items
+
+
+def plan_shards(items: list[tuple[str, list[str]]], durations: dict[str, float], processes: int) -> list[list[str]]:
+    """Distribute items over shards, longest first onto the least loaded shard (LPT)."""
+    known = sorted(durations.values())
+    default = known[len(known) // 2] if known else DEFAULT_TEST_DURATION
+
+    weighted = [
+        (sum(durations.get(test, default) for test in tests), index, name)
+        for index, (name, tests) in enumerate(items)
+    ]
+    weighted.sort(key=lambda w: (-w[0], w[1]))
+
+    shard_count = max(1, min(processes, len(items)))
+    heap = [(0.0, i) for i in range(shard_count)]
+    shards: list[list[tuple[int, str]]] = [[] for _ in range(shard_count)]
+    for weight, index, name in weighted:
+        load, shard = heapq.heappop(heap)
+        shards[shard].append((index, name))
+        heapq.heappush(heap, (load + weight, shard))
+    # Keep the original file order inside each shard.
+    return [[name for _, name in sorted(shard)] for shard in shards if shard]
+
+
+def _to_cli(options: dict) -> list[str]:
+    lines = []
+    for key, value in options.items():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for v in values:
+            lines.append(f"--{key} {v}")
+    return lines
+
+
+def _merge_suite(target, source) -> None:
+    """Merge result suite `source` into `target` (same suite run in another shard)."""
+    if source.start_time and (not target.start_time or source.start_time < target.start_time):
+        target.start_time = source.start_time
+    if source.end_time and (not target.end_time or source.end_time > target.end_time):
+        target.end_time = source.end_time
+    for test in list(source.tests):
+        target.tests.append(test)
+    for child in list(source.suites):
+        existing = next((s for s in target.suites if s.name == child.name), None)
+        if existing is None:
+            target.suites.append(child)
+        else:
+            _merge_suite(existing, child)
+
+
+def _merge_errors(target, source) -> None:
+    """Add the execution errors of another shard; ones every shard hit (e.g. a failed import) are kept once."""
+    seen = {(message.level, message.message) for message in target.messages}
+    target.messages.extend(message for message in source.messages if (message.level, message.message) not in seen)
+
+
+def _restore_order(suite, position: dict[str, int]) -> int:
+    """
+    Put tests and child suites back in source order (merging appends them shard by shard).
+    `position` maps test full names to their index in the selection; returns the suite's first index.
+    """
+    unknown = len(position)
+    suite.tests.sort(key=lambda test: position.get(test.full_name, unknown))
+    firsts = {id(child): _restore_order(child, position) for child in suite.suites}
+    suite.suites.sort(key=lambda child: firsts[id(child)])
+    return min([position.get(test.full_name, unknown) for test in suite.tests] + list(firsts.values()) + [unknown])
+
+
+def _read_output(path: str):
+    """Result of a shard, or None if it wrote no (or only a truncated) output.xml."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return ExecutionResult(path)
+    except DataError:
+        return None
+
+
+def run_parallel(
+    tests_dir: str,
+    robot_options: dict,
+    run_output_dir: str,
+    processes: int,
+    split: str = "suite",
+    durations_file: str | None = None,
+) -> int:
+    """Run the selection in `processes` shards and write one merged output/log/report."""
+    items = collect_items(tests_dir, robot_options.get("include"), split, robot_options.get("suite"))
+    if not items:
+        print("No tests match the selection.")
+        return 252
+
+    durations = load_durations(durations_file) if durations_file else {}
+    shards = plan_shards(items, durations, processes)
+    select_option = "test" if split == "test" else "suite"
+
+    procs = []
+    for i, names in enumerate(shards, start=1):
+        shard_dir = os.path.join(run_output_dir, "shards", f"shard-{i}")
+        os.makedirs(shard_dir, exist_ok=True)
+        options = {
+            **robot_options,
+            "outputdir": shard_dir,
+            "output": "output.xml",
+            "log": "NONE",
+            "report": "NONE",
+            select_option: names,
+        }
+        if select_option == "test":
+            # --test and --include are cumulative; the tests were already filtered by tag.
+            options.pop("include", None)
+            options.pop("suite", None)
+        # Long selections go through an argument file to avoid command-line limits.
+        argfile = os.path.join(shard_dir, "arguments.txt")
+        with open(argfile, "w", encoding="utf-8") as f:
+            f.write("\n".join(_to_cli(options)) + "\n")
+        console = open(os.path.join(shard_dir, "console.txt"), "w", encoding="utf-8")
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "robot", "--argumentfile", argfile, tests_dir],
+            stdout=console,
+            stderr=subprocess.STDOUT,
+        )
+        procs.append((i, names, proc, console, shard_dir))
+        print(f"Shard {i}: {len(names)} {select_option}(s)")
+
+    results = []
+    failed_shards = []
+    for i, names, proc, console, shard_dir in procs:
+        code = proc.wait()
+        console.close()
+        print(f"Shard {i} finished with exit code {code}")
+        result = _read_output(os.path.join(shard_dir, "output.xml"))
+        if result is not None:
+            results.append(result)
+        if code < 0 or code >= EXECUTION_ERROR_RC or result is None:
+            # Its tests are missing from the merged results, which must not pass as green.
+            failed_shards.append(code)
+            print(f"Shard {i} did not complete; see {os.path.join(shard_dir, 'console.txt')}")
+
+    if not results:
+        return SHARD_FAILED_RC
+
+    merged = results[0]
+    for shard in results[1:]:
+        _merge_suite(merged.suite, shard.suite)
+        _merge_errors(merged.errors, shard.errors)
+    _restore_order(merged.suite, {test: index for index, test in enumerate(t for _, tests in items for t in tests)})
+    merged_output = os.path.join(run_output_dir, "output.xml")
+    merged.save(merged_output)
+
+    code = rebot(
+        merged_output,
+        outputdir=run_output_dir,
+        log="log.html",
+        report="report.html",
+        loglevel=robot_options.get("loglevel", "INFO"),
+    )
+    if failed_shards:
+        return max([SHARD_FAILED_RC if c < 0 else c for c in failed_shards] + [EXECUTION_ERROR_RC])
+    return code
@@ -0,0 +1,391 @@
+"""Remote runner agent: claims queued runs from the TAF dashboard and executes them on this node.
+
+Usage:
+    python runner/agent.py --server http://dashboard:8000 --name node-1 --capacity 2
+
+The agent registers, claims runs while it has free slots, heartbeats to keep their
+leases, and uploads each run folder (files gzipped individually) before reporting the
+result. Runs whose lease is not renewed go back to the dashboard queue.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+
+import requests
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUN_TESTS = os.path.join(PROJECT_ROOT, "runner", "run_tests.py")
+WORK_DIR = os.path.join(PROJECT_ROOT, "artifacts", "agent")
+# Uploaded suite files by SHA-256 (downloaded once per node) and the per-run workspaces built from them.
+BLOB_CACHE = os.path.join(PROJECT_ROOT, "artifacts", "agent-blobs")
+WORKSPACES_DIR = os.path.join(PROJECT_ROOT, "artifacts", "agent-workspaces")
+SHARED_DIRS = ("libs", "config")
+
+# Same artifact compression as the dashboard store (taf-ms/app/artifact_store.py).
+COMPRESSIBLE_SUFFIXES = (".html", ".xml", ".log", ".txt", ".jsonl")
+MIN_COMPRESS_SIZE = 1024
+CANCEL_GRACE_SECONDS = 15.0
+PLAN_FILE = "plan.json"
+RERUN_SOURCE_FILE = "rerun-source.xml"
+HTTP_TIMEOUT = 30
+
+
+def build_command(job: dict, run_dir: str, workspace: str | None = None) -> list[str]:
+    """Mirror of runner_service.build_command for this node's checkout."""
+    cmd = [sys.executable, RUN_TESTS, "--env", job["env"], "--output-dir", run_dir]
+    if job.get("target_url"):
+        cmd.extend(["--base-url", job["target_url"]])
+    if workspace:
+        cmd.extend(["--workspace", workspace])
+    if job.get("test_type"):
+        cmd.extend(["--include", job["test_type"]])
+    plan = job.get("plan")
+    if plan and plan.get("rerun_of"):
+        cmd.extend(["--rerun-failed", os.path.join(run_dir, RERUN_SOURCE_FILE)])
+    elif plan:
+        if plan.get("suite_files"):
+            cmd.extend(["--suite-files", ",".join(plan["suite_files"])])
+        if plan.get("priorities"):
+            cmd.extend(["--priorities", os.path.join(run_dir, PLAN_FILE)])
+    return cmd
+
+
+def build_workspace(path: str, files: dict[str, str]) -> None:
+    """Mirror of taf-ms/app/uploads.build_workspace, with blobs from this node's cache."""
+    shutil.rmtree(path, ignore_errors=True)
+    for kind in ("tests", "resources"):
+        os.makedirs(os.path.join(path, kind))
+    for name, digest in files.items():
+        _link(os.path.join(BLOB_CACHE, digest[:2], digest), os.path.join(path, name))
+    resources = os.path.join(PROJECT_ROOT, "resources")
+    for entry in os.scandir(resources) if os.path.isdir(resources) else ():
+        target = os.path.join(path, "resources", entry.name)
+        if entry.is_file() and not os.path.exists(target):
+            _link(entry.path, target)
+    for name in SHARED_DIRS:
+        try:
+            os.symlink(os.path.join(PROJECT_ROOT, name), os.path.join(path, name), target_is_directory=True)
+        except OSError:
+            shutil.copytree(os.path.join(PROJECT_ROOT, name), os.path.join(path, name))
+
+
+def _link(source: str, target: str) -> None:
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def interpret(returncode: int, timed_out: bool, cancelled: bool) -> str:
+    if cancelled:
+        return "cancelled"
+    if timed_out:
+        return "timeout"
+    if returncode == 0:
+        return "finished"
+    if 1 <= returncode <= 250:
+        return "failed"
+    return "error"
+
+
+def compress_folder(run_dir: str) -> None:
+    for root, _, files in os.walk(run_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if not name.endswith(COMPRESSIBLE_SUFFIXES) or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+                continue
+            with open(path, "rb") as src, gzip.GzipFile(path + ".gz", "wb", compresslevel=6, mtime=0) as dst:
+                shutil.copyfileobj(src, dst, 64 * 1024)
+            os.remove(path)
+
+
+def pack_folder(run_dir: str) -> str:
+    """Tar the run folder (no extra compression: the files already are) into a temp file."""
+    fd, archive_path = tempfile.mkstemp(prefix="upload-", suffix=".tar", dir=os.path.dirname(run_dir))
+    os.close(fd)
+    with tarfile.open(archive_path, "w") as archive:
+        for root, _, files in os.walk(run_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                archive.add(path, arcname=os.path.relpath(path, run_dir))
+    return archive_path
+
+
+class Agent:
+    def __init__(self, server: str, name: str, capacity: int, envs: list[str], token: str | None,
+                 poll_interval: float, work_dir: str):
+        self.server = server.rstrip("/")
+        self.name = name
+        self.capacity = capacity
+        self.envs = envs
+        self.poll_interval = poll_interval
+        self.work_dir = work_dir
+        self.session = requests.Session()
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+        self.agent_id: int | None = None
+        self.lease_seconds = 60
+        self.stopping = threading.Event()
+        self.slot_freed = threading.Event()
+        self.lock = threading.Lock()
+        self.processes: dict[int, subprocess.Popen | None] = {}  # run_id -> process (None while starting)
+        self.cancelled: set[int] = set()
+
+    def _url(self, path: str) -> str:
+        return f"{self.server}/api/agents{path}"
+
+    def register(self) -> None:
+        resp = self.session.post(self._url("/register"), json={
+            "name": self.name,
+            "hostname": socket.gethostname(),
+            "capacity": self.capacity,
+            "envs": self.envs,
+        }, timeout=HTTP_TIMEOUT)
+        resp.raise_for_status()
+        data = resp.json()
+        self.agent_id = data["agent_id"]
+        self.lease_seconds = data.get("lease_seconds", 60)
+        print(f"[agent] registered as {self.name} (id {self.agent_id}), capacity {self.capacity}", flush=True)
+
+    # ---------- leases ----------
+
+    def _heartbeat_loop(self) -> None:
+        interval = max(1.0, self.lease_seconds / 3)
+        while not self.stopping.wait(interval):
+            with self.lock:
+                run_ids = list(self.processes)
+            try:
+                resp = self.session.post(self._url(f"/{self.agent_id}/heartbeat"),
+                                         json={"run_ids": run_ids}, timeout=HTTP_TIMEOUT)
+                resp.raise_for_status()
+            except requests.RequestException as exc:
+                print(f"[agent] heartbeat failed: {exc}", flush=True)
+                continue
+            for run_id in resp.json().get("cancel", []):
+                self.cancel(run_id)
+
+    def cancel(self, run_id: int) -> None:
+        with self.lock:
+            if run_id not in self.processes:
+                return
+            self.cancelled.add(run_id)
+            proc = self.processes[run_id]
+        if proc is not None:
+            print(f"[agent] stopping run {run_id}", flush=True)
+            _signal_tree(proc, signal.SIGTERM)
+
+    # ---------- execution ----------
+
+    def _execute(self, job: dict) -> None:
+        run_id = job["run_id"]
+        run_dir = os.path.join(self.work_dir, job["run_folder"])
+        shutil.rmtree(run_dir, ignore_errors=True)
+        os.makedirs(run_dir)
+        timed_out = False
+        returncode = None
+        plan = job.get("plan")
+        workspace = None
+        try:
+            if plan:
+                with open(os.path.join(run_dir, PLAN_FILE), "w", encoding="utf-8") as f:
+                    json.dump(plan, f)
+            if plan and plan.get("suite_files") == []:
+                with open(os.path.join(run_dir, "console.log"), "a", encoding="utf-8") as log:
+                    log.write(f"No suite changed since green run #{plan['baseline_run_id']}; nothing to execute.\n")
+                self._report(job, run_dir, "finished", 0)
+                return
+            if plan and plan.get("rerun_of") and not self._download_rerun_source(run_id, run_dir):
+                with open(os.path.join(run_dir, "console.log"), "a", encoding="utf-8") as log:
+                    log.write(f"output.xml of run #{plan['rerun_of']} is no longer stored; nothing to rerun.\n")
+                self._report(job, run_dir, "error", 252)
+                return
+            if job.get("uploads") is not None:
+                workspace = os.path.join(WORKSPACES_DIR, job["run_folder"])
+                if not self._prepare_workspace(job["uploads"], workspace):
+                    with open(os.path.join(run_dir, "console.log"), "a", encoding="utf-8") as log:
+                        log.write("The uploaded suites of this run are no longer stored.\n")
+                    self._report(job, run_dir, "error", 252)
+                    return
+            with open(os.path.join(run_dir, "console.log"), "ab") as log:
+                proc = _popen(build_command(job, run_dir, workspace), log)
+                with self.lock:
+                    self.processes[run_id] = proc
+                    cancelled = run_id in self.cancelled
+                if cancelled:
+                    _signal_tree(proc, signal.SIGTERM)
+                try:
+                    proc.wait(timeout=job.get("timeout"))
+                except subprocess.TimeoutExpired:
+                    timed_out = True
+                    _signal_tree(proc, signal.SIGTERM)
+                try:
+                    proc.wait(timeout=CANCEL_GRACE_SECONDS)
+                except subprocess.TimeoutExpired:
+                    _signal_tree(proc, signal.SIGKILL if sys.platform != "win32" else signal.SIGTERM)
+                    proc.wait()
+                returncode = proc.returncode
+            if plan and plan.get("rerun_of"):
+                # The merged output.xml includes everything the source held.
+                os.remove(os.path.join(run_dir, RERUN_SOURCE_FILE))
+
+            with self.lock:
+                cancelled = run_id in self.cancelled
+            self._report(job, run_dir, interpret(returncode, timed_out, cancelled), returncode)
+        except requests.RequestException as exc:
+            # Lease lost (409) or dashboard unreachable: the run is requeued by the dashboard.
+            print(f"[agent] run {run_id} could not be reported: {exc}", flush=True)
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+            if workspace:
+                shutil.rmtree(workspace, ignore_errors=True)
+            with self.lock:
+                self.processes.pop(run_id, None)
+                self.cancelled.discard(run_id)
+            self.slot_freed.set()
+
+    def _prepare_workspace(self, files: dict[str, str], workspace: str) -> bool:
+        """Download the blobs this node has not cached yet and build the run's workspace."""
+        if not files:
+            return False
+        for digest in set(files.values()):
+            blob = os.path.join(BLOB_CACHE, digest[:2], digest)
+            if os.path.exists(blob):
+                continue
+            resp = self.session.get(self._url(f"/{self.agent_id}/blobs/{digest}"), timeout=HTTP_TIMEOUT)
+            if resp.status_code == 404:
+                return False
+            resp.raise_for_status()
+            if hashlib.sha256(resp.content).hexdigest() != digest:
+                return False
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp_path = f"{blob}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(resp.content)
+            os.replace(tmp_path, blob)
+        build_workspace(workspace, files)
+        return True
+
+    def _download_rerun_source(self, run_id: int, run_dir: str) -> bool:
+        """Fetch the output.xml whose failed tests the run re-executes."""
+        with self.session.get(self._url(f"/{self.agent_id}/runs/{run_id}/rerun-source"),
+                              stream=True, timeout=HTTP_TIMEOUT * 10) as resp:
+            if resp.status_code == 404:
+                return False
+            resp.raise_for_status()
+            with open(os.path.join(run_dir, RERUN_SOURCE_FILE), "wb") as f:
+                for chunk in resp.iter_content(64 * 1024):
+                    f.write(chunk)
+        return True
+
+    def _report(self, job: dict, run_dir: str, status: str, returncode: int | None) -> None:
+        """Upload the run folder, then report the outcome."""
+        run_id = job["run_id"]
+        compress_folder(run_dir)
+        archive_path = pack_folder(run_dir)
+        try:
+            with open(archive_path, "rb") as body:
+                self.session.put(self._url(f"/{self.agent_id}/runs/{run_id}/artifacts"), data=body,
+                                 headers={"Content-Type": "application/x-tar"},
+                                 timeout=HTTP_TIMEOUT * 10).raise_for_status()
+        finally:
+            os.remove(archive_path)
+        resp = self.session.post(self._url(f"/{self.agent_id}/runs/{run_id}/complete"),
+                                 json={"status": status, "returncode": returncode}, timeout=HTTP_TIMEOUT * 10)
+        resp.raise_for_status()
+        print(f"[agent] run {run_id} done: {resp.json().get('status')}", flush=True)
+
+    def _claim(self) -> dict | None:
+        resp = self.session.post(self._url(f"/{self.agent_id}/claim"), timeout=HTTP_TIMEOUT)
+        resp.raise_for_status()
+        return resp.json() if resp.status_code == 200 else None
+
+    def run_forever(self) -> None:
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.register()
+        threading.Thread(target=self._heartbeat_loop, name="heartbeat", daemon=True).start()
+        while not self.stopping.is_set():
+            self.slot_freed.clear()
+            while not self.stopping.is_set() and len(self.processes) < self.capacity:
+                try:
+                    job = self._claim()
+                except requests.RequestException as exc:
+                    print(f"[agent] claim failed: {exc}", flush=True)
+                    job = None
+                if job is None:
+                    break
+                print(f"[agent] claimed run {job['run_id']} ({job['env']}/{job['test_type']})", flush=True)
+                with self.lock:
+                    self.processes[job["run_id"]] = None
+                threading.Thread(target=self._execute, args=(job,), name=f"run-{job['run_id']}", daemon=True).start()
+            self.slot_freed.wait(self.poll_interval)
+
+    def stop(self) -> None:
+        """Stop claiming and terminate running runs; their leases expire and they are requeued."""
+        self.stopping.set()
+        with self.lock:
+            procs = [p for p in self.processes.values() if p is not None]
+        for proc in procs:
+            _signal_tree(proc, signal.SIGTERM)
+
+
+def _popen(cmd: list[str], log) -> subprocess.Popen:
+    kwargs = {}
+    if sys.platform == "win32":
+        kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+    return subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, env=env, **kwargs)
+
+
+def _signal_tree(proc: subprocess.Popen, sig: int) -> None:
+    try:
+        if sys.platform != "win32":
+            os.killpg(proc.pid, sig)
+        else:
+            proc.terminate()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TAF remote runner agent")
+    parser.add_argument("--server", default=os.getenv("TAF_SERVER", "http://localhost:8000"))
+    parser.add_argument("--name", default=os.getenv("TAF_AGENT_NAME", socket.gethostname()))
+    parser.add_argument("--capacity", type=int, default=int(os.getenv("TAF_AGENT_CAPACITY", "1")),
+                        help="Runs executed at the same time")
+    parser.add_argument("--envs", default=os.getenv("TAF_AGENT_ENVS", ""),
+                        help="Comma-separated envs this agent serves (default: all)")
+    parser.add_argument("--token", default=os.getenv("AGENT_TOKEN"))
+    parser.add_argument("--poll-interval", type=float, default=5.0)
+    parser.add_argument("--work-dir", default=WORK_DIR)
+    args = parser.parse_args()
+
+    agent = Agent(
+        args.server,
+        args.name,
+        args.capacity,
+        [e for e in args.envs.split(",") if e],
+        args.token,
+        args.poll_interval,
+        os.path.join(os.path.abspath(args.work_dir), args.name),
+    )
+    signal.signal(signal.SIGTERM, lambda *_: agent.stop())
+    try:
+        agent.run_forever()
+    except KeyboardInterrupt:
+        agent.stop()
+
+
+if __name__ == "__main__":
+    main()
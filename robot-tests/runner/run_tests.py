@@ -6,49 +6,171 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, PROJECT_ROOT)
 
 import argparse
-from robot import run
+from robot import rebot, run
+from robot.api import ExecutionResult
+from robot.running import TestSuite
 from libs.config_loader import load_config
+from libs.httpbin_stub import running as stub_running
+from libs.parallel import record_durations, run_parallel
 
 TESTS_DIR = os.path.join(PROJECT_ROOT, "tests")
 ARTIFACTS_DIR = os.path.join(PROJECT_ROOT, "artifacts", "robot", "runs")
+DURATIONS_FILE = os.path.join(PROJECT_ROOT, "artifacts", "robot", "durations.json")
+PROGRESS_LISTENER = os.path.join(PROJECT_ROOT, "libs", "ProgressListener.py")
+PRIORITY_MODIFIER = os.path.join(PROJECT_ROOT, "libs", "PriorityOrder.py")
+# Test progress events (JSON lines) written into each run folder for the dashboard.
+EVENTS_FILE = "events.jsonl"
+# Per-request timings from libs/HttpClient.py (JSON lines), also in the run folder.
+HTTP_TIMINGS_FILE = "http_timings.jsonl"
+# Output of the re-executed tests of a --rerun-failed run, before it is merged into output.xml.
+RERUN_OUTPUT = "rerun.xml"
 
 
-def main():
+def _new_run_dir() -> str:
+    """Create a timestamped results folder that no concurrent run can share."""
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S-%f")
+    os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+    suffix = 0
+    while True:
+        name = timestamp if suffix == 0 else f"{timestamp}-{suffix}"
+        path = os.path.join(ARTIFACTS_DIR, name)
+        try:
+            os.makedirs(path)
+            return path
+        except FileExistsError:
+            suffix += 1
+
+
+def merge_rerun(source: str, run_output_dir: str) -> int:
+    """
+    Merge the re-executed tests into the earlier output (rebot --merge): output.xml, log.html and
+    report.html then hold the whole selection with the latest result of each test.
+    Returns the number of failed tests in the merged result, like Robot's exit code.
+    """
+    rerun_output = os.path.join(run_output_dir, RERUN_OUTPUT)
+    outputs = [source, rerun_output] if os.path.exists(rerun_output) else [source]
+    return rebot(
+        *outputs,
+        merge=len(outputs) > 1,
+        outputdir=run_output_dir,
+        output="output.xml",
+        log="log.html",
+        report="report.html",
+    )
+
+
+def execute(argv: list[str] | None = None) -> int:
+    """Run the suite for command-line style `argv` and return Robot's exit code (used by warm workers)."""
     parser = argparse.ArgumentParser()
     parser.add_argument("--env", default="dev")
     parser.add_argument("--include", default=None)
     parser.add_argument("--base-url", dest="base_url", default=None)
-    args = parser.parse_args()
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Run suites in N parallel processes and merge the results")
+    parser.add_argument("--split", choices=("suite", "test"), default="suite",
+                        help="Shard by suite file (default) or by individual test")
+    parser.add_argument("--output-dir", dest="output_dir", default=None,
+                        help="Results folder (default: a new timestamped folder under artifacts/robot/runs)")
+    parser.add_argument("--suite-files", dest="suite_files", default=None,
+                        help="Comma-separated .robot files in tests/ to limit the run to")
+    parser.add_argument("--priorities", default=None,
+                        help="JSON file with {\"priorities\": {test full name: score}}; higher scores run first")
+    parser.add_argument("--workspace", default=None,
+                        help="Run the suites in <workspace>/tests (a per-run workspace of uploaded suites)")
+    parser.add_argument("--rerun-failed", dest="rerun_failed", default=None,
+                        help="output.xml of an earlier run: execute only its failed tests and merge them into it")
+    parser.add_argument("--with-stub", dest="with_stub", action="store_true",
+                        help="Run against the built-in httpbin stub (libs/httpbin_stub.py) instead of base_url")
+    parser.add_argument("--stub-latency-ms", dest="stub_latency_ms", type=float, default=None,
+                        help="Latency the stub adds to every response (default: stub.latency_ms of the env)")
+    parser.add_argument("--stub-jitter-ms", dest="stub_jitter_ms", type=float, default=None,
+                        help="Random extra latency of the stub, up to this much (default: stub.jitter_ms)")
+    args = parser.parse_args(argv)
 
     config = load_config(args.env)
+    stub = config["stub"]
+    if not (args.with_stub or stub["enabled"]):
+        return _run(args, config)
+    latency_ms = stub["latency_ms"] if args.stub_latency_ms is None else args.stub_latency_ms
+    jitter_ms = stub["jitter_ms"] if args.stub_jitter_ms is None else args.stub_jitter_ms
+    with stub_running(latency_ms, jitter_ms) as stub_url:
+        print(f"Running against the httpbin stub at {stub_url}")
+        # The stub replaces any --base-url: the run is meant to be hermetic.
+        args.base_url = stub_url
+        return _run(args, config)
+
+
+def _run(args, config: dict) -> int:
+    tests_dir = os.path.join(os.path.abspath(args.workspace), "tests") if args.workspace else TESTS_DIR
     if args.base_url:
         config["base_url"] = args.base_url
 
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    run_output_dir = os.path.join(ARTIFACTS_DIR, timestamp)
-    os.makedirs(run_output_dir, exist_ok=True)
+    if args.output_dir:
+        run_output_dir = os.path.abspath(args.output_dir)
+        os.makedirs(run_output_dir, exist_ok=True)
+    else:
+        run_output_dir = _new_run_dir()
 
     variables = [
         f"BASE_URL:{config['base_url']}",
         f"TIMEOUT:{config.get('timeout', 10)}",
         f"ENV_NAME:{config.get('env_name', args.env)}",
+        f"CONFIG_ENV:{args.env}",
+        f"HTTP_TIMINGS:{os.path.join(run_output_dir, HTTP_TIMINGS_FILE)}",
     ]
     robot_options = {
         "outputdir": run_output_dir,
         "loglevel": "INFO",
         "variable": variables,
+        # ";" separates the listener argument so Windows drive letters survive.
+        "listener": f"{PROGRESS_LISTENER};{os.path.join(run_output_dir, EVENTS_FILE)}",
     }
     if args.include:
         robot_options["include"] = args.include
+    if args.suite_files:
+        robot_options["suite"] = [
+            TestSuite.name_from_source(os.path.join(tests_dir, name.strip()))
+            for name in args.suite_files.split(",") if name.strip()
+        ]
+    if args.priorities:
+        robot_options["prerunmodifier"] = f"{PRIORITY_MODIFIER};{os.path.abspath(args.priorities)}"
+    if args.rerun_failed:
+        source = os.path.abspath(args.rerun_failed)
+        if not ExecutionResult(source).statistics.total.failed:
+            print("No failed tests to rerun.")
+            return merge_rerun(source, run_output_dir)
+        # Only the failed tests run; their output is merged into the earlier one below.
+        robot_options.update(rerunfailed=source, output=RERUN_OUTPUT, log="NONE", report="NONE")
 
-    exit_code = run(
-        TESTS_DIR,
-        **robot_options,
-    )
+    # Shards are built from the tag selection, so a rerun of failed tests runs in one process.
+    if args.processes > 1 and not args.rerun_failed:
+        exit_code = run_parallel(
+            tests_dir,
+            robot_options,
+            run_output_dir,
+            args.processes,
+            split=args.split,
+            durations_file=DURATIONS_FILE,
+        )
+    else:
+        exit_code = run(
+            tests_dir,
+            **robot_options,
+        )
+
+    try:
+        record_durations(os.path.join(run_output_dir, robot_options.get("output", "output.xml")), DURATIONS_FILE)
+    except Exception as exc:
+        print(f"Could not record test durations: {exc}")
+    if args.rerun_failed:
+        exit_code = merge_rerun(source, run_output_dir)
 
     print(f"\nRobot results stored in: {run_output_dir}")
+    return exit_code
+
 
-    sys.exit(exit_code)
+def main():
+    sys.exit(execute())
 
 
 if __name__ == "__main__":
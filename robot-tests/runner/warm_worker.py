@@ -0,0 +1,210 @@
+"""Pool of warm Robot Framework workers that execute run_tests.py runs in-process.
+
+Usage (started by the dashboard when WARM_WORKERS > 0):
+    python runner/warm_worker.py --address /path/warm.sock --workers 4 --max-runs 50
+
+Workers are forked from a process that has already imported Robot Framework, requests, the suites'
+HTTP library (libs.HttpClient), PyYAML and run_tests, so a run skips interpreter and import startup.
+Clients connect with multiprocessing.connection (authkey from TAF_WARM_AUTHKEY) and send:
+    {"type": "run", "run_id": 1, "argv": [...run_tests.py args...], "log_path": "..."}
+        -> {"returncode": int}
+    {"type": "cancel", "run_id": 1} -> {"ok": bool}   (SIGTERM to the worker; it is replaced)
+    {"type": "ping"} -> {"ok": True, "workers": n, "busy": n}
+Workers exit after --max-runs runs to contain leaks and are replaced.
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+from multiprocessing.connection import Listener
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNNER_DIR = os.path.join(PROJECT_ROOT, "runner")
+for _path in (PROJECT_ROOT, RUNNER_DIR):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+# Imported once by the fork server; every worker starts with them loaded.
+PRELOAD_MODULES = ["robot", "robot.api", "requests", "libs.HttpClient", "yaml", "run_tests"]
+# Seconds a terminated worker gets to let Robot write its partial output.
+CANCEL_GRACE_SECONDS = 15.0
+# Worker exit code reported when a run did not return normally (Robot's "unexpected error").
+WORKER_FAILED_RC = 255
+
+
+def _run_once(request: dict) -> int:
+    """Execute one run with stdout/stderr redirected to its console log."""
+    import run_tests
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    with open(request["log_path"], "ab") as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        try:
+            return run_tests.execute(request["argv"])
+        except SystemExit as exc:  # argparse errors
+            return exc.code if isinstance(exc.code, int) else WORKER_FAILED_RC
+        except Exception as exc:
+            print(f"Run failed in warm worker: {exc!r}", flush=True)
+            return WORKER_FAILED_RC
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            os.close(saved[0])
+            os.close(saved[1])
+
+
+def _worker_main(conn, max_runs: int) -> None:
+    # Between runs SIGTERM ends the worker; during a run Robot handles it gracefully.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for _ in range(max_runs):
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        conn.send(_run_once(request))
+
+
+class _Worker:
+    def __init__(self, ctx, max_runs: int):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, max_runs), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.runs = 0
+        self.retire = False
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+
+class WarmPool:
+    def __init__(self, size: int, max_runs: int):
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            self.ctx = multiprocessing.get_context("forkserver")
+            self.ctx.set_forkserver_preload(PRELOAD_MODULES)
+        else:  # Windows: workers still stay warm across their runs
+            self.ctx = multiprocessing.get_context("spawn")
+        self.size = size
+        self.max_runs = max_runs
+        self.idle: queue.Queue[_Worker] = queue.Queue()
+        self.busy: dict[int, _Worker] = {}  # run_id -> worker
+        self.lock = threading.Lock()
+        for _ in range(size):
+            self.idle.put(_Worker(self.ctx, max_runs))
+
+    def run(self, request: dict) -> int:
+        worker = self.idle.get()
+        run_id = request["run_id"]
+        with self.lock:
+            self.busy[run_id] = worker
+        try:
+            worker.conn.send(request)
+            returncode = worker.conn.recv()
+        except (EOFError, OSError):
+            # The worker died (e.g. killed after the cancel grace period).
+            worker.process.join(1)
+            code = worker.process.exitcode
+            returncode = -code if code and code < 0 else WORKER_FAILED_RC
+            worker.retire = True
+        finally:
+            with self.lock:
+                self.busy.pop(run_id, None)
+        worker.runs += 1
+        if worker.retire or worker.runs >= self.max_runs or not worker.process.is_alive():
+            worker.stop()
+            worker = _Worker(self.ctx, self.max_runs)
+        self.idle.put(worker)
+        return returncode
+
+    def cancel(self, run_id: int) -> bool:
+        with self.lock:
+            worker = self.busy.get(run_id)
+        if worker is None:
+            return False
+        worker.retire = True
+        if sys.platform == "win32":
+            worker.process.terminate()
+            return True
+        os.kill(worker.process.pid, signal.SIGTERM)
+
+        def _kill_after_grace():
+            worker.process.join(CANCEL_GRACE_SECONDS)
+            if worker.process.is_alive():
+                worker.process.kill()
+
+        threading.Thread(target=_kill_after_grace, daemon=True).start()
+        return True
+
+    def status(self) -> dict:
+        with self.lock:
+            busy = len(self.busy)
+        return {"ok": True, "workers": self.size, "busy": busy}
+
+
+def _serve_client(pool: WarmPool, conn) -> None:
+    try:
+        request = conn.recv()
+        kind = request.get("type")
+        if kind == "run":
+            conn.send({"returncode": pool.run(request)})
+        elif kind == "cancel":
+            conn.send({"ok": pool.cancel(request["run_id"])})
+        else:
+            conn.send(pool.status())
+    except (EOFError, OSError):
+        pass
+    finally:
+        conn.close()
+
+
+def parse_address(address: str):
+    """"host:port" for TCP, anything else is a Unix socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and os.sep not in address:
+        return host or "127.0.0.1", int(port)
+    return address
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm Robot Framework worker pool")
+    parser.add_argument("--address", required=True, help="Unix socket path or host:port")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-runs", dest="max_runs", type=int, default=50,
+                        help="Runs per worker before it is replaced")
+    args = parser.parse_args()
+
+    authkey = bytes.fromhex(os.environ["TAF_WARM_AUTHKEY"]) if os.getenv("TAF_WARM_AUTHKEY") else None
+    address = parse_address(args.address)
+    if isinstance(address, str) and os.path.exists(address):
+        os.remove(address)  # stale socket from a previous pool
+
+    pool = WarmPool(args.workers, max(1, args.max_runs))
+    with Listener(address, authkey=authkey) as listener:
+        print(f"[warm] {args.workers} worker(s) listening on {args.address}", flush=True)
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                continue
+            threading.Thread(target=_serve_client, args=(pool, conn), daemon=True).start()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Remote runner agents: registration, heartbeats/leases, claims and completion."""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from app.config import AGENT_LEASE_SECONDS, RUN_TIMEOUT_SECONDS
+from app.models import QueuedRun, RunnerAgent, TestRun
+from app.run_planning import plan_run
+from app.run_queue import claim_for_agent, notify_workers, requeue
+from app.runner_service import update_run_result
+from app.uploads import load_manifest
+
+# Statuses an agent may report for a run it executed.
+AGENT_RESULT_STATUSES = ("finished", "failed", "error", "timeout", "cancelled")
+
+
+def register_agent(db, name: str, hostname: str | None, capacity: int, envs: list[str]) -> RunnerAgent:
+    """
+    Create or refresh the agent called `name`. A re-registering agent has restarted,
+    so runs it still held are put back in the queue.
+    """
+    agent = db.query(RunnerAgent).filter(RunnerAgent.name == name).first()
+    if agent is None:
+        agent = RunnerAgent(name=name)
+        db.add(agent)
+    else:
+        for entry in db.query(QueuedRun).filter(QueuedRun.agent_id == agent.id):
+            requeue(db, entry)
+    agent.hostname = hostname
+    agent.capacity = max(1, capacity)
+    agent.envs = ",".join(e.strip() for e in envs if e.strip()) or None
+    agent.registered_at = agent.last_heartbeat = datetime.utcnow()
+    db.commit()
+    notify_workers()
+    return agent
+
+
+def heartbeat(db, agent: RunnerAgent, run_ids: list[int]) -> list[int]:
+    """Renew the leases of the runs the agent reports. Returns the runs it must stop."""
+    now = datetime.utcnow()
+    agent.last_heartbeat = now
+    held = {
+        entry.run_id: entry
+        for entry in db.query(QueuedRun).filter(QueuedRun.agent_id == agent.id, QueuedRun.run_id.in_(run_ids))
+    }
+    stop = []
+    for run_id in run_ids:
+        entry = held.get(run_id)
+        if entry is None or entry.cancel_requested:
+            # Cancelled, or the lease already expired and the run went back to the queue.
+            stop.append(run_id)
+        else:
+            entry.lease_expires_at = now + timedelta(seconds=AGENT_LEASE_SECONDS)
+    db.commit()
+    return stop
+
+
+def claim(db, agent: RunnerAgent) -> dict | None:
+    """Claim the next run for `agent` and describe how to execute it."""
+    run_id = claim_for_agent(db, agent)
+    if run_id is None:
+        return None
+    plan = plan_run(db, run_id)
+    run = db.get(TestRun, run_id)
+    uploads = None
+    if run.upload_digest:
+        try:
+            uploads = load_manifest(run.upload_digest)
+        except (OSError, ValueError):
+            uploads = {}  # collected: the agent reports the run as an error
+    return {
+        "run_id": run.id,
+        "env": run.env,
+        "test_type": run.test_type,
+        "target_url": run.target_url,
+        "run_folder": run.run_folder,
+        "timeout": RUN_TIMEOUT_SECONDS or None,
+        "plan": plan,
+        "uploads": uploads,
+    }
+
+
+def held_run(db, agent: RunnerAgent, run_id: int) -> TestRun | None:
+    """The run if `agent` currently holds its lease."""
+    entry = (
+        db.query(QueuedRun)
+        .filter(QueuedRun.run_id == run_id, QueuedRun.agent_id == agent.id, QueuedRun.claimed_at.isnot(None))
+        .first()
+    )
+    return db.get(TestRun, run_id) if entry else None
+
+
+def complete(db, agent: RunnerAgent, run_id: int, status: str, returncode: int | None) -> bool:
+    """
+    Record the outcome of a run the agent executed (its artifacts are uploaded first).
+    Returns False if the agent no longer holds the run.
+    """
+    run = held_run(db, agent, run_id)
+    if run is None:
+        return False
+    if status not in AGENT_RESULT_STATUSES:
+        status = "error"
+    update_run_result(run_id, {"returncode": returncode, "interpreted_status": status, "run_folder": run.run_folder})
+    db.query(QueuedRun).filter(QueuedRun.run_id == run_id).delete(synchronize_session=False)
+    db.commit()
+    notify_workers()
+    return True
+
+
+def agent_stats(db) -> list[dict]:
+    """Registered agents with their load and whether they are still heartbeating."""
+    now = datetime.utcnow()
+    counts = dict(
+        db.query(QueuedRun.agent_id, func.count(QueuedRun.id))
+        .filter(QueuedRun.agent_id.isnot(None), QueuedRun.claimed_at.isnot(None))
+        .group_by(QueuedRun.agent_id)
+        .all()
+    )
+    return [
+        {
+            "name": agent.name,
+            "hostname": agent.hostname,
+            "capacity": agent.capacity,
+            "envs": agent.envs,
+            "active": counts.get(agent.id, 0),
+            "online": bool(agent.last_heartbeat)
+            and now - agent.last_heartbeat <= timedelta(seconds=AGENT_LEASE_SECONDS),
+            "last_heartbeat": agent.last_heartbeat,
+        }
+        for agent in db.query(RunnerAgent).order_by(RunnerAgent.name)
+    ]
@@ -0,0 +1,310 @@
+"""Compressed run artifacts: compression after a run, HTTP serving and retention."""
+import gzip
+import logging
+import os
+import re
+import shutil
+import tarfile
+from datetime import datetime, timedelta
+
+from fastapi.responses import Response, StreamingResponse
+
+from app.config import (
+    ARTIFACT_COMPRESSION,
+    ARTIFACT_KEEP_PER_ENV,
+    ARTIFACT_MAX_AGE_DAYS,
+    ROBOT_RUNS_PATH,
+)
+from app.db import SessionLocal
+from app.models import TestRun
+from app.uploads import collect_garbage
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is always available
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Files worth compressing; small files are left as they are.
+COMPRESSIBLE_SUFFIXES = (".html", ".xml", ".log", ".txt", ".jsonl")
+MIN_COMPRESS_SIZE = 1024
+CHUNK_SIZE = 64 * 1024
+# Runs in these statuses will not write to their folder any more.
+DONE_STATUSES = ("finished", "failed", "error", "timeout", "cancelled")
+
+# Stored suffix -> Content-Encoding token.
+_ENCODINGS = {".zst": "zstd", ".gz": "gzip"}
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _codec() -> str | None:
+    if ARTIFACT_COMPRESSION == "zstd" and zstandard is not None:
+        return ".zst"
+    if ARTIFACT_COMPRESSION in ("gzip", "zstd"):
+        return ".gz"
+    return None
+
+
+def _compress_file(path: str, suffix: str) -> None:
+    tmp = f"{path}{suffix}.tmp"
+    with open(path, "rb") as src, open(tmp, "wb") as raw:
+        if suffix == ".zst":
+            with zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False) as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        else:
+            # mtime=0 keeps the output (and its ETag) stable for identical input.
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    os.replace(tmp, path + suffix)
+    os.remove(path)
+
+
+def compress_run(run_folder: str) -> int:
+    """Compress the artifacts of a completed run in place. Returns the number of files compressed."""
+    suffix = _codec()
+    run_dir = os.path.join(ROBOT_RUNS_PATH, run_folder)
+    if suffix is None or not os.path.isdir(run_dir):
+        return 0
+    count = 0
+    for root, _, files in os.walk(run_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if not name.endswith(COMPRESSIBLE_SUFFIXES) or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+                continue
+            try:
+                _compress_file(path, suffix)
+                count += 1
+            except OSError:
+                logger.exception("Could not compress %s", path)
+    return count
+
+
+def _locate(base: str) -> tuple[str, str | None] | None:
+    if os.path.isfile(base):
+        return base, None
+    for suffix, encoding in _ENCODINGS.items():
+        if os.path.isfile(base + suffix):
+            return base + suffix, encoding
+    return None
+
+
+def find_artifact(run_folder: str, name: str) -> tuple[str, str | None] | None:
+    """(path, content encoding) of a run artifact, stored plain or compressed."""
+    if run_folder != os.path.basename(run_folder):
+        return None
+    return _locate(os.path.join(ROBOT_RUNS_PATH, run_folder, name))
+
+
+def open_decoded(path: str):
+    """Open `path` (or its compressed form) for reading as plain bytes; None if missing."""
+    found = _locate(path)
+    if found is None:
+        return None
+    path, encoding = found
+    if encoding == "gzip":
+        return gzip.open(path, "rb")
+    if encoding == "zstd":
+        if zstandard is None:
+            return None
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+def open_artifact(run_folder: str, name: str):
+    """Open a run artifact for reading as plain bytes, whatever its storage encoding (None if missing)."""
+    if run_folder != os.path.basename(run_folder):
+        return None
+    return open_decoded(os.path.join(ROBOT_RUNS_PATH, run_folder, name))
+
+
+def unpack_artifacts(run_folder: str, archive_path: str) -> int:
+    """
+    Extract an uploaded tar of run artifacts (files already compressed by the agent) into the
+    run folder. Only regular files with relative paths inside the folder are accepted.
+    """
+    run_dir = os.path.realpath(os.path.join(ROBOT_RUNS_PATH, run_folder))
+    if run_folder != os.path.basename(run_folder):
+        raise ValueError("invalid run folder")
+    count = 0
+    with tarfile.open(archive_path, "r:") as archive:
+        for member in archive:
+            target = os.path.realpath(os.path.join(run_dir, member.name))
+            if not member.isfile() or os.path.isabs(member.name) or not target.startswith(run_dir + os.sep):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with archive.extractfile(member) as src, open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            count += 1
+    return count
+
+
+def _accepts(request, encoding: str) -> bool:
+    for part in request.headers.get("accept-encoding", "").split(","):
+        token, _, params = part.strip().partition(";")
+        if token.strip().lower() in (encoding, "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def _parse_range(header: str | None, size: int) -> tuple[int, int] | None | bool:
+    """(start, end) of a single byte range, None for no/ignored range, False if unsatisfiable."""
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None  # multiple or malformed ranges: serve the whole file
+    if match.group(1):
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    else:
+        start, end = max(0, size - int(match.group(2))), size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _iter_file(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _iter_decoded(run_folder: str, name: str):
+    f = open_artifact(run_folder, name)
+    try:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
+    finally:
+        f.close()
+
+
+def artifact_response(request, run_folder: str, name: str, media_type: str, headers: dict | None = None):
+    """
+    Serve a run artifact. Compressed files go out as stored with Content-Encoding when the
+    client accepts it (decoded on the fly otherwise). Supports If-None-Match and a single Range.
+    Returns None if the artifact does not exist.
+    """
+    found = find_artifact(run_folder, name)
+    if found is None:
+        return None
+    path, encoding = found
+    st = os.stat(path)
+    etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}{"-" + encoding if encoding else ""}"'
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    if encoding and not _accepts(request, encoding):
+        # Rare (curl without --compressed): the decoded size is unknown, so no ranges either.
+        headers["Accept-Ranges"] = "none"
+        headers["ETag"] = etag[:-1] + '-identity"'
+        if request.headers.get("if-none-match") == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
+        return StreamingResponse(_iter_decoded(run_folder, name), media_type=media_type, headers=headers)
+
+    if request.headers.get("if-none-match") in (etag, "*"):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    headers["Accept-Ranges"] = "bytes"
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == etag:
+        byte_range = _parse_range(request.headers.get("range"), st.st_size)
+    if byte_range is False:
+        headers["Content-Range"] = f"bytes */{st.st_size}"
+        return Response(status_code=416, headers=headers)
+    if byte_range is None:
+        start, end, status_code = 0, st.st_size - 1, 200
+    else:
+        (start, end), status_code = byte_range, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _iter_file(path, start, end - start + 1),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+def _remove_run_folder(run: TestRun) -> None:
+    run_dir = os.path.join(ROBOT_RUNS_PATH, run.run_folder)
+    if run.run_folder == os.path.basename(run.run_folder) and os.path.isdir(run_dir):
+        shutil.rmtree(run_dir, ignore_errors=True)
+    run.artifacts_pruned = True
+
+
+def prune(db, now: datetime | None = None) -> int:
+    """Apply retention: delete run folders beyond ARTIFACT_KEEP_PER_ENV per env or older than ARTIFACT_MAX_AGE_DAYS."""
+    now = now or datetime.utcnow()
+    candidates = db.query(TestRun).filter(
+        TestRun.status.in_(DONE_STATUSES),
+        TestRun.run_folder.isnot(None),
+        TestRun.artifacts_pruned.isnot(True),
+    )
+    pruned = 0
+    if ARTIFACT_MAX_AGE_DAYS > 0:
+        cutoff = now - timedelta(days=ARTIFACT_MAX_AGE_DAYS)
+        for run in candidates.filter(TestRun.finished_at < cutoff).yield_per(500):
+            _remove_run_folder(run)
+            pruned += 1
+        db.commit()
+    if ARTIFACT_KEEP_PER_ENV > 0:
+        envs = [env for (env,) in db.query(TestRun.env).distinct()]
+        for env in envs:
+            old_runs = (
+                candidates.filter(TestRun.env == env)
+                .order_by(TestRun.id.desc())
+                .offset(ARTIFACT_KEEP_PER_ENV)
+                .all()
+            )
+            for run in old_runs:
+                _remove_run_folder(run)
+                pruned += 1
+            db.commit()
+    return pruned
+
+
+def compress_pending(db) -> int:
+    """Compress completed runs left uncompressed (older releases or an interrupted worker)."""
+    if _codec() is None or not os.path.isdir(ROBOT_RUNS_PATH):
+        return 0
+    folders = [
+        entry.name for entry in os.scandir(ROBOT_RUNS_PATH)
+        if entry.is_dir() and (
+            os.path.isfile(os.path.join(entry.path, "log.html"))
+            or os.path.isfile(os.path.join(entry.path, "output.xml"))
+        )
+    ]
+    count = 0
+    for i in range(0, len(folders), 500):
+        done = (
+            db.query(TestRun.run_folder)
+            .filter(TestRun.run_folder.in_(folders[i:i + 500]), TestRun.status.in_(DONE_STATUSES))
+            .all()
+        )
+        for (run_folder,) in done:
+            if compress_run(run_folder):
+                count += 1
+    return count
+
+
+def maintain_artifacts() -> None:
+    """Hourly job: compress leftovers, apply retention, then drop uploads no run needs any more."""
+    db = SessionLocal()
+    try:
+        compressed = compress_pending(db)
+        pruned = prune(db)
+        blobs = collect_garbage(db)
+        if compressed or pruned or blobs:
+            logger.info(
+                "Artifacts: compressed %d run(s), pruned %d run(s), removed %d upload blob(s)", compressed, pruned, blobs
+            )
+    finally:
+        db.close()
@@ -1,36 +1,145 @@
 """Shared configuration and path constants."""
 import os
+import threading
+import time
 from typing import Any
 
-import yaml
+from app.metrics import ENV_CONFIG_SECONDS
 
+# The robot-tests checkout; ROBOT_ROOT points elsewhere (e.g. a benchmark's synthetic tree).
 ROBOT_ROOT = os.path.abspath(
-    os.path.join(os.path.dirname(__file__), "../../robot-tests")
+    os.getenv("ROBOT_ROOT") or os.path.join(os.path.dirname(__file__), "../../robot-tests")
 )
 ROBOT_RUNS_PATH = os.path.join(ROBOT_ROOT, "artifacts", "robot", "runs")
 CONFIG_DIR = os.path.join(ROBOT_ROOT, "config")
 TESTS_DIR = os.path.join(ROBOT_ROOT, "tests")
 RESOURCES_DIR = os.path.join(ROBOT_ROOT, "resources")
+# Uploaded suites (content-addressed, app/uploads.py) and the per-run workspaces built from them.
+UPLOADS_PATH = os.path.join(ROBOT_ROOT, "artifacts", "uploads")
+WORKSPACES_PATH = os.path.join(ROBOT_ROOT, "artifacts", "workspaces")
+# Folded stacks written by the sampling profiler (app/profiling.py).
+PROFILES_PATH = os.path.join(ROBOT_ROOT, "artifacts", "profiles")
+
+# Run queue concurrency limits. A per-env limit can be overridden with
+# `max_concurrent_runs` in robot-tests/config/<env>.yaml.
+MAX_CONCURRENT_RUNS = int(os.getenv("MAX_CONCURRENT_RUNS", "4"))
+MAX_CONCURRENT_RUNS_PER_ENV = int(os.getenv("MAX_CONCURRENT_RUNS_PER_ENV", "2"))
+# Runs still going after this many seconds are stopped (0 disables the limit).
+RUN_TIMEOUT_SECONDS = float(os.getenv("RUN_TIMEOUT_SECONDS", "3600"))
+
+# Warm worker pool (robot-tests/runner/warm_worker.py) for local runs; 0 spawns a fresh process per run.
+WARM_WORKERS = int(os.getenv("WARM_WORKERS", "0"))
+WARM_WORKER_MAX_RUNS = int(os.getenv("WARM_WORKER_MAX_RUNS", "50"))
+# Unix socket path or host:port the pool listens on.
+WARM_WORKER_ADDRESS = os.getenv(
+    "WARM_WORKER_ADDRESS",
+    os.path.join(ROBOT_ROOT, "artifacts", "warm.sock") if os.name == "posix" else "127.0.0.1:47631",
+)
+
+# Set LOCAL_RUNNER=0 to leave all execution to remote runner agents.
+LOCAL_RUNNER_ENABLED = os.getenv("LOCAL_RUNNER", "1").lower() not in ("0", "false", "no")
+# A run claimed by an agent or a dashboard process goes back to the queue when its lease is not renewed in time.
+AGENT_LEASE_SECONDS = int(os.getenv("AGENT_LEASE_SECONDS", "60"))
+# Shared secret agents send as "Authorization: Bearer <token>" (unset: no check).
+AGENT_TOKEN = os.getenv("AGENT_TOKEN") or None
+
+# Finished runs' artifacts are compressed with "gzip", "zstd" (needs the zstandard package) or "none".
+ARTIFACT_COMPRESSION = os.getenv("ARTIFACT_COMPRESSION", "gzip").lower()
+# Retention: keep the newest N finished runs per env and drop runs older than N days (0 disables either).
+ARTIFACT_KEEP_PER_ENV = int(os.getenv("ARTIFACT_KEEP_PER_ENV", "200"))
+ARTIFACT_MAX_AGE_DAYS = int(os.getenv("ARTIFACT_MAX_AGE_DAYS", "30"))
+
+# Scheduler (jobs persist in the apscheduler_jobs table). A fire that is late by more than
+# the grace period is missed; missed one-off runs are queued late ("run") or cancelled ("skip").
+SCHEDULER_MISFIRE_GRACE_SECONDS = int(os.getenv("SCHEDULER_MISFIRE_GRACE_SECONDS", "900"))
+SCHEDULER_COALESCE = os.getenv("SCHEDULER_COALESCE", "1").lower() not in ("0", "false", "no")
+SCHEDULER_CATCH_UP = os.getenv("SCHEDULER_CATCH_UP", "run").lower()
+# Recurring runs start up to this many seconds after their minute so they don't all start at once.
+SCHEDULER_JITTER_SECONDS = int(os.getenv("SCHEDULER_JITTER_SECONDS", "30"))
+# With several replicas one of them runs the jobs (PostgreSQL advisory lock); SCHEDULER_ENABLED=0
+# keeps a replica from ever taking that role.
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1").lower() not in ("0", "false", "no")
+
+# A run is flagged "degraded" when an endpoint's p95 exceeds the median p95 of its previous
+# LATENCY_BASELINE_RUNS runs in the same env by LATENCY_DEGRADATION_PCT percent and at least
+# LATENCY_MIN_DELTA_MS milliseconds (0 percent disables the check).
+LATENCY_BASELINE_RUNS = int(os.getenv("LATENCY_BASELINE_RUNS", "10"))
+LATENCY_DEGRADATION_PCT = float(os.getenv("LATENCY_DEGRADATION_PCT", "50"))
+LATENCY_MIN_DELTA_MS = float(os.getenv("LATENCY_MIN_DELTA_MS", "25"))
+
+
+# Apply pending schema migrations (app/migrations.py) at startup. With 0, run
+# `python -m app.migrations` before starting; the dashboard then refuses to start on an old schema.
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1").lower() not in ("0", "false", "no")
+
+# Database connection pools. The sync engine (background workers, scheduler) and the async
+# engine (request handlers) each hold up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+# Seconds to wait for a free connection before failing; connections older than DB_POOL_RECYCLE are replaced.
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Queries slower than this are logged (0 disables the log).
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+
+# Sampling profiler, off unless PROFILING=1: a request with an "X-Profile: 1" header is profiled,
+# and POST /api/profile?seconds=N profiles the whole process for up to PROFILE_MAX_SECONDS.
+PROFILING_ENABLED = os.getenv("PROFILING", "0").lower() in ("1", "true", "yes")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "300"))
+
+# Parsed env configs keyed by file name; reused while (mtime_ns, size) match.
+_env_config_cache: dict[str, tuple[int, int, dict | None]] = {}
+_env_config_lock = threading.Lock()
+
+
+def _read_env_config(path: str, env_name: str) -> dict | None:
+    import yaml  # only needed once a config file changed
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+        return {
+            "env_name": data.get("env_name", env_name),
+            "base_url": data.get("base_url", ""),
+            "max_concurrent_runs": int(
+                data.get("max_concurrent_runs", MAX_CONCURRENT_RUNS_PER_ENV)
+            ),
+        }
+    except Exception:
+        return None
 
 
 def load_env_configs() -> dict[str, Any]:
-    """Read environment configs from robot-tests/config/*.yaml."""
+    """Read environment configs from robot-tests/config/*.yaml (only changed files are re-parsed)."""
     configs: dict[str, Any] = {}
     if not os.path.isdir(CONFIG_DIR):
         return configs
 
-    for name in sorted(os.listdir(CONFIG_DIR)):
-        if not name.endswith(".yaml"):
-            continue
-        env_name = name[:-5]
-        path = os.path.join(CONFIG_DIR, name)
-        try:
-            with open(path, encoding="utf-8") as f:
-                data = yaml.safe_load(f) or {}
-            configs[env_name] = {
-                "env_name": data.get("env_name", env_name),
-                "base_url": data.get("base_url", ""),
-            }
-        except Exception:
-            continue
+    start = time.perf_counter()
+    reparsed = False
+    with _env_config_lock:
+        seen = set()
+        for name in sorted(os.listdir(CONFIG_DIR)):
+            if not name.endswith(".yaml"):
+                continue
+            path = os.path.join(CONFIG_DIR, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            seen.add(name)
+            cached = _env_config_cache.get(name)
+            if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                config = cached[2]
+            else:
+                config = _read_env_config(path, name[:-5])
+                _env_config_cache[name] = (st.st_mtime_ns, st.st_size, config)
+                reparsed = True
+            if config is not None:
+                configs[name[:-5]] = dict(config)
+        for name in list(_env_config_cache):
+            if name not in seen:
+                del _env_config_cache[name]
+    ENV_CONFIG_SECONDS.observe(time.perf_counter() - start, "miss" if reparsed else "hit")
     return configs
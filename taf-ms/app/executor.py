@@ -0,0 +1,211 @@
+"""Background asyncio loop that supervises robot subprocesses."""
+import asyncio
+import atexit
+import os
+import signal
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future
+from multiprocessing.connection import Client
+from typing import Coroutine
+
+from app.config import ROBOT_ROOT, WARM_WORKER_ADDRESS, WARM_WORKER_MAX_RUNS, WARM_WORKERS
+
+# Seconds a terminated run gets to write its partial output before it is killed.
+CANCEL_GRACE_SECONDS = 15.0
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+_processes: dict[int, asyncio.subprocess.Process] = {}
+_cancel_requested: set[int] = set()
+# Runs currently executing in the warm worker pool.
+_warm_runs: set[int] = set()
+_warm_pool: subprocess.Popen | None = None
+_warm_authkey = os.urandom(16)
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the executor loop, starting its thread on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="run-executor", daemon=True)
+            thread.start()
+            _loop = loop
+        return _loop
+
+
+def submit(coro: Coroutine) -> Future:
+    """Schedule a coroutine on the executor loop from any thread."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def call_soon(callback, *args) -> None:
+    """Run a plain callback on the executor loop from any thread."""
+    get_loop().call_soon_threadsafe(callback, *args)
+
+
+def _signal_tree(proc: asyncio.subprocess.Process, sig: int) -> None:
+    """Signal the run's whole process group so parallel shards stop as well."""
+    try:
+        if sys.platform != "win32":
+            os.killpg(proc.pid, sig)
+        elif sig == signal.SIGTERM:
+            proc.terminate()
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _stop(proc: asyncio.subprocess.Process) -> None:
+    # Robot Framework stops gracefully on SIGTERM and still writes output.xml.
+    _signal_tree(proc, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(proc.wait(), CANCEL_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        _signal_tree(proc, signal.SIGKILL if sys.platform != "win32" else signal.SIGTERM)
+        await proc.wait()
+
+
+async def run_process(run_id: int, cmd: list[str], log_path: str, timeout: float | None) -> dict:
+    """
+    Run `cmd` with stdout/stderr streamed straight into `log_path`.
+    Returns: {"returncode": int, "timed_out": bool, "cancelled": bool}
+    """
+    env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+    kwargs = {}
+    if sys.platform == "win32":
+        kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+
+    timed_out = False
+    with open(log_path, "ab") as log:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=log, stderr=asyncio.subprocess.STDOUT, env=env, **kwargs
+        )
+        _processes[run_id] = proc
+        try:
+            if run_id in _cancel_requested:
+                await _stop(proc)
+            else:
+                await asyncio.wait_for(proc.wait(), timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            await _stop(proc)
+        finally:
+            _processes.pop(run_id, None)
+
+    cancelled = run_id in _cancel_requested
+    _cancel_requested.discard(run_id)
+    return {"returncode": proc.returncode, "timed_out": timed_out, "cancelled": cancelled}
+
+
+def _warm_address():
+    host, sep, port = WARM_WORKER_ADDRESS.rpartition(":")
+    if sep and port.isdigit() and os.sep not in WARM_WORKER_ADDRESS:
+        return host or "127.0.0.1", int(port)
+    return WARM_WORKER_ADDRESS
+
+
+def _warm_request(message: dict, timeout: float = 5.0):
+    """Send one request to the warm pool and wait for the reply (blocking)."""
+    conn = Client(_warm_address(), authkey=_warm_authkey)
+    try:
+        conn.send(message)
+        if timeout is not None and not conn.poll(timeout):
+            raise TimeoutError("warm pool did not reply")
+        return conn.recv()
+    finally:
+        conn.close()
+
+
+def start_warm_pool() -> None:
+    """Start robot-tests/runner/warm_worker.py with WARM_WORKERS workers (no-op when disabled)."""
+    global _warm_pool
+    if WARM_WORKERS <= 0 or _warm_pool is not None:
+        return
+    log_dir = os.path.join(ROBOT_ROOT, "artifacts")
+    os.makedirs(log_dir, exist_ok=True)
+    with open(os.path.join(log_dir, "warm_pool.log"), "ab") as log:
+        _warm_pool = subprocess.Popen(
+            [
+                "python",
+                os.path.join(ROBOT_ROOT, "runner", "warm_worker.py"),
+                "--address", WARM_WORKER_ADDRESS,
+                "--workers", str(WARM_WORKERS),
+                "--max-runs", str(WARM_WORKER_MAX_RUNS),
+            ],
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            env={**os.environ, "TAF_WARM_AUTHKEY": _warm_authkey.hex(), "PYTHONUNBUFFERED": "1"},
+        )
+    atexit.register(_warm_pool.terminate)
+
+
+def warm_pool_ready() -> bool:
+    """True when the warm pool is running and answers a ping."""
+    if _warm_pool is None or _warm_pool.poll() is not None:
+        return False
+    try:
+        return bool(_warm_request({"type": "ping"}, timeout=2.0).get("ok"))
+    except (OSError, EOFError, TimeoutError):
+        return False
+
+
+async def run_warm(run_id: int, argv: list[str], log_path: str, timeout: float | None) -> dict:
+    """
+    Execute run_tests.py `argv` in a warm pool worker. Same result shape as run_process.
+    Cancelling or timing out terminates the worker, which the pool then replaces.
+    """
+    conn = await asyncio.to_thread(Client, _warm_address(), authkey=_warm_authkey)
+    timed_out = False
+    try:
+        await asyncio.to_thread(conn.send, {"type": "run", "run_id": run_id, "argv": argv, "log_path": log_path})
+        _warm_runs.add(run_id)
+        if run_id in _cancel_requested:
+            await asyncio.to_thread(_warm_cancel, run_id)
+        reply = asyncio.ensure_future(asyncio.to_thread(conn.recv))
+        done, _ = await asyncio.wait({reply}, timeout=timeout)
+        if not done:
+            timed_out = True
+            await asyncio.to_thread(_warm_cancel, run_id)
+        try:
+            returncode = (await reply)["returncode"]
+        except (EOFError, OSError):
+            returncode = 255
+    finally:
+        _warm_runs.discard(run_id)
+        conn.close()
+
+    cancelled = run_id in _cancel_requested
+    _cancel_requested.discard(run_id)
+    return {"returncode": returncode, "timed_out": timed_out, "cancelled": cancelled}
+
+
+def _warm_cancel(run_id: int) -> None:
+    try:
+        _warm_request({"type": "cancel", "run_id": run_id})
+    except (OSError, EOFError, TimeoutError):
+        pass
+
+
+def cancel(run_id: int) -> None:
+    """Ask the executor to stop a run (thread-safe). Takes effect even if the process is still starting."""
+
+    def _cancel():
+        _cancel_requested.add(run_id)
+        proc = _processes.get(run_id)
+        if proc is not None and proc.returncode is None:
+            asyncio.ensure_future(_stop(proc))
+        elif run_id in _warm_runs:
+            asyncio.ensure_future(asyncio.to_thread(_warm_cancel, run_id))
+
+    call_soon(_cancel)
+
+
+def active_count() -> int:
+    return len(_processes) + len(_warm_runs)
@@ -0,0 +1,145 @@
+"""Fan-out runs: one parent run whose children execute the same tests against several envs or URLs."""
+from datetime import datetime
+from urllib.parse import urlparse
+
+from app.models import TestRun, TestResult
+
+# Children a single fan-out may create.
+MAX_TARGETS = 20
+_FINAL_STATUSES = ("finished", "failed", "error", "timeout", "cancelled")
+
+
+def fanout_targets(envs: list[str], target_urls: list[str], url_env: str, env_configs: dict) -> list[tuple[str, str | None]]:
+    """
+    (env, target_url) of each child: one per selected env with its own base URL, and one per
+    extra target URL run with the settings of `url_env`. Raises ValueError for invalid input.
+    """
+    targets: list[tuple[str, str | None]] = []
+    for env in envs:
+        if env not in env_configs:
+            raise ValueError(f"Unknown environment: {env}")
+        targets.append((env, None))
+    for url in target_urls:
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.netloc:
+            raise ValueError(f"Not an http(s) URL: {url}")
+        if url_env not in env_configs:
+            raise ValueError(f"Unknown environment for target URLs: {url_env}")
+        targets.append((url_env, url.rstrip("/")))
+    targets = list(dict.fromkeys(targets))
+    if len(targets) < 2:
+        raise ValueError("A fan-out run needs at least two environments or target URLs.")
+    if len(targets) > MAX_TARGETS:
+        raise ValueError(f"A fan-out run can have at most {MAX_TARGETS} targets.")
+    return targets
+
+
+def create_fanout(
+    db, targets: list[tuple[str, str | None]], test_type: str, strategy: str | None, upload_digest: str | None = None,
+) -> tuple[TestRun, list[TestRun]]:
+    """Store a parent run and one queued child per target; the caller enqueues the children."""
+    parent = TestRun(
+        env=",".join(dict.fromkeys(env for env, _ in targets)),
+        test_type=test_type,
+        status="queued",
+        strategy=strategy,
+        fanout=True,
+        upload_digest=upload_digest,
+        queued_at=datetime.utcnow(),
+    )
+    db.add(parent)
+    db.flush()
+    children = [
+        TestRun(
+            env=env, test_type=test_type, status="queued", target_url=url, strategy=strategy,
+            parent_id=parent.id, upload_digest=upload_digest,
+        )
+        for env, url in targets
+    ]
+    db.add_all(children)
+    db.commit()
+    return parent, children
+
+
+def children_of(db, parent_id: int) -> list[TestRun]:
+    return db.query(TestRun).filter(TestRun.parent_id == parent_id).order_by(TestRun.id).all()
+
+
+def target_label(run: TestRun) -> str:
+    """Column heading of a child: its env, plus the host of a custom target URL."""
+    return f"{run.env} @ {urlparse(run.target_url).netloc}" if run.target_url else run.env
+
+
+def refresh_parent(db, parent_id: int | None) -> None:
+    """Derive the parent's status, times and test counts from its children (the caller commits)."""
+    if not parent_id:
+        return
+    # Locking the parent serializes children finishing at once, so the last one sees all the others.
+    parent = db.query(TestRun).filter(TestRun.id == parent_id).with_for_update().populate_existing().first()
+    if parent is None:
+        return
+    children = children_of(db, parent_id)
+    statuses = {child.status for child in children}
+    started = [child.started_at for child in children if child.started_at]
+    parent.started_at = min(started) if started else None
+
+    if statuses <= set(_FINAL_STATUSES):
+        if statuses == {"finished"}:
+            parent.status = "finished"
+        elif "failed" in statuses:
+            parent.status = "failed"
+        elif statuses & {"error", "timeout"}:
+            parent.status = "error"
+        else:
+            parent.status = "cancelled"
+        parent.finished_at = max((child.finished_at for child in children if child.finished_at), default=datetime.utcnow())
+    else:
+        parent.status = "running" if "running" in statuses else "queued"
+        parent.finished_at = None
+
+    counted = [child for child in children if child.tests_passed is not None]
+    if counted:
+        parent.tests_passed = sum(child.tests_passed for child in counted)
+        parent.tests_failed = sum(child.tests_failed or 0 for child in counted)
+        parent.tests_skipped = sum(child.tests_skipped or 0 for child in counted)
+    degraded = [child for child in children if child.degraded]
+    parent.degraded = bool(degraded) or None
+    parent.degraded_reason = "; ".join(f"{target_label(child)}: {child.degraded_reason}" for child in degraded) or None
+
+
+def matrix(db, parent: TestRun) -> dict:
+    """One row per test and one column per child, with the test's status in each child."""
+    children = children_of(db, parent.id)
+    columns = [
+        {
+            "run_id": child.id,
+            "label": target_label(child),
+            "env": child.env,
+            "target_url": child.target_url,
+            "status": child.status,
+            "passed": child.tests_passed,
+            "failed": child.tests_failed,
+            "skipped": child.tests_skipped,
+            "run_folder": child.run_folder if not child.artifacts_pruned else None,
+        }
+        for child in children
+    ]
+    index = {child.id: i for i, child in enumerate(children)}
+    rows: dict[str, dict] = {}
+    results = (
+        db.query(TestResult.run_id, TestResult.suite, TestResult.name, TestResult.full_name,
+                 TestResult.status, TestResult.message)
+        .filter(TestResult.run_id.in_(list(index)))
+    )
+    for run_id, suite, name, full_name, status, message in results:
+        row = rows.setdefault(full_name, {"suite": suite, "name": name, "cells": [None] * len(children)})
+        row["cells"][index[run_id]] = {"status": status, "message": message or None}
+    reported = [column["passed"] is not None for column in columns]
+    ordered = []
+    for full_name in sorted(rows):
+        row = rows[full_name]
+        seen = {cell["status"] for cell in row["cells"] if cell}
+        missing = any(cell is None and done for cell, done in zip(row["cells"], reported))
+        # Outcome differs between targets, or a finished target did not run the test.
+        ordered.append({"full_name": full_name, **row, "diverges": len(seen) > 1 or missing})
+    return {"parent_id": parent.id, "status": parent.status, "columns": columns, "rows": ordered}
@@ -0,0 +1,171 @@
+"""Per-endpoint HTTP latency of each run (from http_timings.jsonl) and latency regression checks."""
+import json
+import os
+from datetime import datetime
+from statistics import median
+
+from sqlalchemy import delete, func, insert
+
+from app.artifact_store import open_decoded
+from app.config import LATENCY_BASELINE_RUNS, LATENCY_DEGRADATION_PCT, LATENCY_MIN_DELTA_MS
+from app.models import EndpointLatency, TestRun
+
+# Written into the run folder by robot-tests/libs/HttpClient.py, one JSON line per request.
+TIMINGS_FILE = "http_timings.jsonl"
+# Previous runs an endpoint needs before it is checked against its baseline.
+MIN_BASELINE_RUNS = 3
+_PHASES = ("dns_ms", "connect_ms", "tls_ms")
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _mean(values: list[float]) -> float | None:
+    return round(sum(values) / len(values), 2) if values else None
+
+
+def summarize_timings(run_dir: str) -> dict[str, dict]:
+    """Per-endpoint ("GET /path") counts, total-time percentiles and mean phase times in ms."""
+    source = open_decoded(os.path.join(run_dir, TIMINGS_FILE))
+    if source is None:
+        return {}
+    samples: dict[str, list[dict]] = {}
+    try:
+        for line in source:
+            try:
+                timing = json.loads(line)
+                timing["total_ms"] = float(timing["total_ms"])
+                samples.setdefault(f"{timing['method']} {timing['endpoint']}", []).append(timing)
+            except (ValueError, KeyError, TypeError):
+                continue  # partial last line of a killed run, or a record without a total
+    finally:
+        source.close()
+
+    summary = {}
+    for endpoint, timings in samples.items():
+        totals = [t["total_ms"] for t in timings]
+        opened = [t for t in timings if t.get("new_connection")]
+        summary[endpoint] = {
+            "count": len(timings),
+            "new_connections": len(opened),
+            "p50_ms": _percentile(totals, 50),
+            "p95_ms": _percentile(totals, 95),
+            "p99_ms": _percentile(totals, 99),
+            "max_ms": max(totals),
+            **{phase: _mean([t.get(phase, 0.0) for t in opened]) for phase in _PHASES},
+            "ttfb_ms": _mean([t["ttfb_ms"] for t in timings if "ttfb_ms" in t]),
+        }
+    return summary
+
+
+def baseline_p95(db, env: str, endpoint: str, before_run_id: int) -> tuple[float | None, int]:
+    """Median p95 of the endpoint over its previous LATENCY_BASELINE_RUNS runs in `env`, and their count."""
+    previous = [
+        p95 for (p95,) in db.query(EndpointLatency.p95_ms)
+        .filter(EndpointLatency.env == env, EndpointLatency.endpoint == endpoint, EndpointLatency.run_id < before_run_id)
+        .order_by(EndpointLatency.run_id.desc())
+        .limit(LATENCY_BASELINE_RUNS)
+    ]
+    return (median(previous) if previous else None), len(previous)
+
+
+def check_degradation(db, run: TestRun, summary: dict[str, dict]) -> tuple[bool, str | None]:
+    """Whether any endpoint's p95 regressed past the configured threshold, with the worst one as reason."""
+    if LATENCY_DEGRADATION_PCT <= 0:
+        return False, None
+    regressions = []
+    for endpoint, stats in summary.items():
+        baseline, samples = baseline_p95(db, run.env, endpoint, run.id)
+        if samples < MIN_BASELINE_RUNS:
+            continue
+        delta = stats["p95_ms"] - baseline
+        if delta >= LATENCY_MIN_DELTA_MS and stats["p95_ms"] > baseline * (1 + LATENCY_DEGRADATION_PCT / 100):
+            ratio = stats["p95_ms"] / baseline if baseline else float("inf")
+            regressions.append((ratio, endpoint, stats["p95_ms"], baseline))
+    if not regressions:
+        return False, None
+    regressions.sort(reverse=True)
+    _, endpoint, p95, baseline = regressions[0]
+    reason = f"{endpoint} p95 {p95:.0f} ms vs {baseline:.0f} ms baseline"
+    if len(regressions) > 1:
+        reason += f" (+{len(regressions) - 1} more endpoint(s))"
+    return True, reason
+
+
+def record_latency(db, run: TestRun, run_dir: str) -> None:
+    """Store the run's per-endpoint latency and flag it as degraded if needed (the caller commits)."""
+    db.execute(delete(EndpointLatency).where(EndpointLatency.run_id == run.id))
+    summary = summarize_timings(run_dir)
+    if not summary:
+        run.degraded, run.degraded_reason = None, None
+        return
+    now = datetime.utcnow()
+    db.execute(insert(EndpointLatency), [
+        {"run_id": run.id, "env": run.env, "endpoint": endpoint, "recorded_at": now, **stats}
+        for endpoint, stats in summary.items()
+    ])
+    run.degraded, run.degraded_reason = check_degradation(db, run, summary)
+
+
+def latency_overview(db, env: str | None = None) -> list[dict]:
+    """Latest latency of every endpoint (per env) with its baseline p95, in one windowed query."""
+    partition = (EndpointLatency.env, EndpointLatency.endpoint)
+    ranked = db.query(
+        EndpointLatency.env, EndpointLatency.endpoint, EndpointLatency.run_id,
+        EndpointLatency.p50_ms, EndpointLatency.p95_ms, EndpointLatency.p99_ms,
+        func.row_number().over(partition_by=partition, order_by=EndpointLatency.run_id.desc()).label("rank"),
+        func.count(EndpointLatency.id).over(partition_by=partition).label("runs"),
+    )
+    if env:
+        ranked = ranked.filter(EndpointLatency.env == env)
+    ranked = ranked.subquery()
+    # Rank 1 is the latest run of each endpoint; the next LATENCY_BASELINE_RUNS are its baseline.
+    rows = (
+        db.query(ranked)
+        .filter(ranked.c.rank <= LATENCY_BASELINE_RUNS + 1)
+        .order_by(ranked.c.env, ranked.c.endpoint, ranked.c.rank)
+    )
+    overview = []
+    previous: list[float] = []
+    for row in rows:
+        if row.rank == 1:
+            previous = []
+            overview.append({
+                "env": row.env,
+                "endpoint": row.endpoint,
+                "runs": row.runs,
+                "run_id": row.run_id,
+                "p50": row.p50_ms,
+                "p95": row.p95_ms,
+                "p99": row.p99_ms,
+                "baseline_p95": None,
+            })
+        else:
+            previous.append(row.p95_ms)
+            overview[-1]["baseline_p95"] = median(previous)
+    return overview
+
+
+def latency_series(db, env: str, endpoint: str, limit: int = 50) -> list[dict]:
+    """Per-run p50/p95/p99 and mean time to first byte of one endpoint, oldest first."""
+    rows = (
+        db.query(EndpointLatency)
+        .filter(EndpointLatency.env == env, EndpointLatency.endpoint == endpoint)
+        .order_by(EndpointLatency.run_id.desc())
+        .limit(limit)
+        .all()
+    )
+    return [
+        {
+            "label": f"#{row.run_id}",
+            "p50": row.p50_ms,
+            "p95": row.p95_ms,
+            "p99": row.p99_ms,
+            "ttfb": row.ttfb_ms,
+        }
+        for row in reversed(rows)
+    ]
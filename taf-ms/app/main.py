@@ -1,58 +1,163 @@
+import asyncio
+import logging
 import os
-import shutil
-import threading
+import tarfile
+import tempfile
 import time
-from contextlib import contextmanager
-from datetime import datetime
-from typing import Iterator, List
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Iterator, List
+from urllib.parse import urlencode
 
 from fastapi import FastAPI, File, Form, Request, UploadFile
-from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    JSONResponse,
+    PlainTextResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.templating import Jinja2Templates
-from sqlalchemy import func, text
-from sqlalchemy.exc import OperationalError
-
-from app.config import RESOURCES_DIR, ROBOT_RUNS_PATH, TESTS_DIR, load_env_configs
+from sqlalchemy import func, select, text
+
+from app import agents as agent_service, fanout as fanout_service, metrics, migrations, profiling, reruns
+from app import uploads as upload_store
+from app.artifact_store import artifact_response, unpack_artifacts
+from app.config import (
+    AGENT_LEASE_SECONDS,
+    AGENT_TOKEN,
+    MIGRATE_ON_STARTUP,
+    PROFILING_ENABLED,
+    ROBOT_RUNS_PATH,
+    load_env_configs,
+)
 from app.test_discovery import discover_tests
-from app.db import Base, SessionLocal, engine
-from app.models import TestRun
-from app.runner_service import run_robot, update_run_result
-from app.scheduler import cancel_scheduled_run, schedule_recurring, schedule_run
+from app.db import AsyncSessionLocal, SessionLocal, async_engine, db_stats, engine, wait_for_db
+from app.latency import latency_overview, latency_series
+from app.models import RunnerAgent, Schedule, TestRun
+from app.run_events import stream_progress
+from app.run_planning import STRATEGIES, STRATEGY_LABELS
+from app.rollups import totals as rollup_totals, trend
+from app.run_queue import (
+    PRIORITY_MANUAL,
+    cancel_running,
+    dequeue_run,
+    enqueue_run,
+    queue_stats,
+    start_workers,
+)
+from app.runner_service import CONSOLE_LOG
+from app import schedules as schedule_service
+from app.scheduler import cancel_scheduled_run, schedule_run, start_scheduler, stop_scheduler
+from app.schemas import (
+    AgentHeartbeat,
+    AgentRegister,
+    AgentResult,
+    ScheduleIn,
+    ScheduleOut,
+    ScheduleUpdate,
+    TestRunOut,
+)
+
+logger = logging.getLogger(__name__)
+
+# Probes answered before startup has finished.
+HEALTH_PATHS = ("/healthz", "/readyz")
+# Startup progress, reported by /readyz: phase durations in seconds and the first error.
+_startup: dict = {"ready": False, "error": None, "phases": {}, "seconds": None}
 
 
-def _wait_for_db(max_tries: int = 30, delay: float = 2.0) -> None:
-    """Block until the database is reachable (Docker startup)."""
-    for _ in range(max_tries):
-        try:
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
-            return
-        except OperationalError:
-            time.sleep(delay)
-    raise RuntimeError("Database unavailable after waiting.")
+@contextmanager
+def _phase(name: str) -> Iterator:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _startup["phases"][name] = round(time.perf_counter() - start, 4)
+
+
+def _start_services() -> None:
+    """Wait for the database, bring the schema up to date, then start the workers and the scheduler."""
+    started = time.perf_counter()
+    with _phase("wait_for_db"):
+        wait_for_db()
+    with _phase("migrations"):
+        if MIGRATE_ON_STARTUP:
+            migrations.migrate(engine)
+        elif todo := migrations.pending(engine):
+            raise RuntimeError(
+                f"{len(todo)} schema migration(s) pending; run `python -m app.migrations` first."
+            )
+    with _phase("workers"):
+        start_workers()
+    with _phase("scheduler"):
+        start_scheduler()
+    _startup["seconds"] = round(time.perf_counter() - started, 4)
+    _startup["ready"] = True
 
 
-_wait_for_db()
+async def _run_startup() -> None:
+    try:
+        await asyncio.to_thread(_start_services)
+    except Exception as exc:
+        logger.exception("Dashboard startup failed")
+        _startup["error"] = str(exc) or exc.__class__.__name__
 
-Base.metadata.create_all(bind=engine)
 
-# Add finished_at column if missing (migration)
-try:
-    with engine.begin() as conn:
-        conn.execute(text("ALTER TABLE test_runs ADD COLUMN finished_at TIMESTAMP NULL"))
-except Exception:
-    pass
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Startup runs in the background so /healthz answers while the database is still coming up.
+    task = asyncio.create_task(_run_startup())
+    yield
+    task.cancel()
+    stop_scheduler()
+    await async_engine.dispose()
+    engine.dispose()
 
-app = FastAPI(title="TAF Dashboard")
+
+class _ReadinessGate:
+    """ASGI middleware: 503 for everything but the health probes until startup has finished."""
+
+    def __init__(self, asgi_app):
+        self.app = asgi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not _startup["ready"] and scope["path"] not in HEALTH_PATHS:
+            response = PlainTextResponse("Starting up", status_code=503, headers={"Retry-After": "2"})
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+app = FastAPI(title="TAF Dashboard", lifespan=lifespan)
+# Last added is outermost: the readiness gate answers before requests are timed or profiled.
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(_ReadinessGate)
 templates = Jinja2Templates(directory="app/templates")
 
+RUNS_PAGE_SIZE = 50
+RUNS_API_MAX_LIMIT = 1000
+RUN_STATUSES = ("scheduled", "queued", "running", "finished", "failed", "error", "timeout", "cancelled")
+# Statuses not covered by rollups; counted live through the (status, id) index.
+LIVE_STATUSES = ("scheduled", "queued", "running", "cancelled")
+
 
 def _index_context(error: str | None = None) -> dict:
     """Base context for index template."""
+    discovery = discover_tests()
     ctx = {
         "request": None,
         "env_configs": load_env_configs(),
-        "test_discovery": discover_tests(),
+        # Only what the page script needs; test names stay server-side.
+        "test_discovery": {
+            "tags": discovery["tags"],
+            "all_tags": discovery["all_tags"],
+            "test_counts": {name: len(tests) for name, tests in discovery["tests"].items()},
+        },
+        "max_retry_failed": reruns.MAX_RETRY_FAILED,
     }
     if error:
         ctx["error"] = error
@@ -67,10 +172,13 @@ def _parse_time(s: str) -> tuple[int, int]:
 
 def _format_run_duration(run):
     """Return duration string for a run, or 'Running since...' for in-progress."""
-    if run.status == "running" and run.created_at:
-        return f"Running since {run.created_at.strftime('%H:%M')}"
-    if run.finished_at and run.created_at:
-        secs = (run.finished_at - run.created_at).total_seconds()
+    if run.status == "queued" and run.queued_at:
+        return f"Queued since {run.queued_at.strftime('%H:%M')}"
+    started = run.started_at or run.created_at
+    if run.status == "running" and started:
+        return f"Running since {started.strftime('%H:%M')}"
+    if run.finished_at and started:
+        secs = (run.finished_at - started).total_seconds()
         if secs < 60:
             return f"{int(secs)}s"
         m, s = int(secs) // 60, int(secs) % 60
@@ -87,30 +195,36 @@ def get_db() -> Iterator:
         db.close()
 
 
-def _save_uploaded_tests(uploaded: List[UploadFile]) -> None:
-    """Persist uploaded .robot / .resource files into robot-tests volume."""
-    if not uploaded:
-        return
-    os.makedirs(TESTS_DIR, exist_ok=True)
-    os.makedirs(RESOURCES_DIR, exist_ok=True)
-    for f in uploaded:
-        if not f.filename:
-            continue
-        name = os.path.basename(f.filename)
-        ext = os.path.splitext(name.lower())[1]
-        dest_dir = TESTS_DIR if ext == ".robot" else RESOURCES_DIR if ext == ".resource" else None
-        if dest_dir:
-            with open(os.path.join(dest_dir, name), "wb") as out:
-                shutil.copyfileobj(f.file, out)
-
-
-def _create_run(db, env: str, test_type: str, status: str, scheduled_for=None, target_url=None) -> TestRun:
+@asynccontextmanager
+async def get_async_db() -> AsyncIterator:
+    """Session on the async engine. Sync service code shared with the workers runs in it via run_sync."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _store_uploaded_tests(uploaded: List[UploadFile]) -> str | None:
+    """Store uploaded .robot / .resource files; returns the upload digest the run executes."""
+    return upload_store.store_upload((f.filename, f.file) for f in uploaded if f.filename)
+
+
+def _create_run(
+    db,
+    env: str,
+    test_type: str,
+    status: str,
+    scheduled_for=None,
+    target_url=None,
+    strategy: str | None = None,
+    upload_digest: str | None = None,
+) -> TestRun:
     run = TestRun(
         env=env,
         test_type=test_type,
         status=status,
         scheduled_for=scheduled_for,
         target_url=target_url or None,
+        strategy=strategy if strategy in STRATEGIES and strategy != "full" else None,
+        upload_digest=upload_digest,
     )
     db.add(run)
     db.commit()
@@ -118,10 +232,26 @@ def _create_run(db, env: str, test_type: str, status: str, scheduled_for=None, t
     return run
 
 
-def _run_robot_background(run_id: int, env: str, test_type: str, target_url: str | None) -> None:
-    """Execute run_robot in a thread and update the run when done."""
-    result = run_robot(env, test_type, target_url=target_url)
-    update_run_result(run_id, result)
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process serves requests (the database is not checked)."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: startup finished and the database answers; includes startup phase timings."""
+    body = {"phases": _startup["phases"], "startup_seconds": _startup["seconds"]}
+    if _startup["error"]:
+        return JSONResponse({"status": "error", "error": _startup["error"], **body}, status_code=503)
+    if not _startup["ready"]:
+        return JSONResponse({"status": "starting", **body}, status_code=503)
+    try:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception as exc:
+        return JSONResponse({"status": "database unavailable", "error": str(exc), **body}, status_code=503)
+    return {"status": "ready", **body}
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -144,6 +274,12 @@ def run_now(
     schedule_weekly_day: str = Form(None),
     schedule_weekly_time: str = Form(None),
     target_url: str = Form(None),
+    strategy: str = Form("full"),
+    spread_schedule: bool = Form(False),
+    retry_failed: int = Form(0),
+    target_mode: str = Form("env"),
+    fanout_envs: List[str] = Form(None),
+    fanout_urls: str = Form(""),
     uploaded_tests: List[UploadFile] = File(None),
 ):
     uploaded = uploaded_tests or []
@@ -165,96 +301,701 @@ def run_now(
     else:
         include_expr = test_suite
 
+    targets = None
+    if target_mode == "fanout":
+        try:
+            if schedule_type != "immediate":
+                raise ValueError("Fan-out runs can only be started immediately.")
+            targets = fanout_service.fanout_targets(
+                fanout_envs or [], fanout_urls.split(), env, load_env_configs()
+            )
+        except ValueError as exc:
+            ctx = _index_context(str(exc))
+            ctx["request"] = request
+            return templates.TemplateResponse("index.html", ctx, status_code=400)
+
+    # Uploaded suites run in a workspace of their own instead of the shared tests/.
+    upload_digest = _store_uploaded_tests(uploaded) if test_mode == "upload" else None
+
     with get_db() as db:
-        _save_uploaded_tests(uploaded)
+        if targets:
+            _start_fanout(db, targets, include_expr, strategy, upload_digest)
+            return RedirectResponse(url="/runs", status_code=303)
 
         if schedule_type == "custom" and schedule_time:
             run_time = datetime.fromisoformat(schedule_time)
-            run = _create_run(db, env, include_expr, "scheduled", scheduled_for=run_time, target_url=target_url)
+            run = _create_run(
+                db, env, include_expr, "scheduled", scheduled_for=run_time, target_url=target_url, strategy=strategy,
+                upload_digest=upload_digest,
+            )
             schedule_run(run.id, run_time)
-        elif schedule_type == "daily" and schedule_daily_time:
-            h, m = _parse_time(schedule_daily_time)
-            schedule_recurring("daily", env, include_expr, target_url or None, h, m)
-        elif schedule_type == "weekly" and schedule_weekly_day and schedule_weekly_time:
-            h, m = _parse_time(schedule_weekly_time)
-            schedule_recurring("weekly", env, include_expr, target_url or None, h, m, day_of_week=schedule_weekly_day)
+        elif (schedule_type == "daily" and schedule_daily_time) or (
+            schedule_type == "weekly" and schedule_weekly_day and schedule_weekly_time
+        ):
+            weekly = schedule_type == "weekly"
+            h, m = _parse_time(schedule_weekly_time if weekly else schedule_daily_time)
+            try:
+                schedule_service.create_schedule(db, {
+                    "schedule_type": schedule_type,
+                    "env": env,
+                    "test_type": include_expr,
+                    "target_url": target_url,
+                    "strategy": strategy,
+                    "hour": h,
+                    "minute": m,
+                    "day_of_week": schedule_weekly_day if weekly else None,
+                    "retry_failed": retry_failed,
+                    "upload_digest": upload_digest,
+                }, spread=spread_schedule)
+            except ValueError as exc:
+                ctx = _index_context(str(exc))
+                ctx["request"] = request
+                return templates.TemplateResponse("index.html", ctx, status_code=400)
+            return RedirectResponse(url="/schedules", status_code=303)
         else:
-            run = _create_run(db, env, include_expr, "running", target_url=target_url)
-            run_id = run.id
-            thread = threading.Thread(
-                target=_run_robot_background,
-                args=(run_id, env, include_expr, target_url or None),
-                daemon=True,
+            run = _create_run(
+                db, env, include_expr, "queued", target_url=target_url, strategy=strategy, upload_digest=upload_digest
             )
-            thread.start()
+            enqueue_run(db, run, PRIORITY_MANUAL)
 
     return RedirectResponse(url="/runs", status_code=303)
 
 
+def _start_fanout(
+    db, targets: list[tuple[str, str | None]], test_type: str, strategy: str | None, upload_digest: str | None = None,
+) -> TestRun:
+    """Create a fan-out parent and queue its children; they run in parallel within the concurrency limits."""
+    strategy = strategy if strategy in STRATEGIES and strategy != "full" else None
+    parent, children = fanout_service.create_fanout(db, targets, test_type, strategy, upload_digest)
+    for child in children:
+        enqueue_run(db, child, PRIORITY_MANUAL)
+    return parent
+
+
+def _parse_date(s: str) -> datetime | None:
+    """Parse YYYY-MM-DD (as sent by <input type=date>); ignore anything else."""
+    try:
+        return datetime.strptime(s, "%Y-%m-%d") if s else None
+    except ValueError:
+        return None
+
+
+def _filtered_runs(filters: dict, before: int | None):
+    """TestRun select for the given filters, newest first, starting below the `before` cursor."""
+    query = select(TestRun)
+    if filters["env"]:
+        query = query.where(TestRun.env == filters["env"])
+    if filters["status"]:
+        query = query.where(TestRun.status == filters["status"])
+    if filters["test_type"]:
+        query = query.where(TestRun.test_type == filters["test_type"])
+    date_from = _parse_date(filters["date_from"])
+    if date_from:
+        query = query.where(TestRun.created_at >= date_from)
+    date_to = _parse_date(filters["date_to"])
+    if date_to:
+        query = query.where(TestRun.created_at < date_to + timedelta(days=1))
+    if before:
+        query = query.where(TestRun.id < before)
+    return query.order_by(TestRun.id.desc())
+
+
+def _runs_filters(env: str, status: str, test_type: str, date_from: str, date_to: str) -> dict:
+    return {
+        "env": env.strip(),
+        "status": status.strip(),
+        "test_type": test_type.strip(),
+        "date_from": date_from.strip(),
+        "date_to": date_to.strip(),
+    }
+
+
 @app.get("/runs", response_class=HTMLResponse)
-def list_runs(request: Request):
-    with get_db() as db:
-        runs = db.query(TestRun).order_by(TestRun.id.desc()).all()
+async def list_runs(
+    request: Request,
+    env: str = "",
+    status: str = "",
+    test_type: str = "",
+    date_from: str = "",
+    date_to: str = "",
+    before: int | None = None,
+    limit: int = RUNS_PAGE_SIZE,
+):
+    filters = _runs_filters(env, status, test_type, date_from, date_to)
+    limit = max(1, min(limit, RUNS_API_MAX_LIMIT))
+    async with get_async_db() as db:
+        # One extra row tells whether an older page exists without a count(*).
+        runs = (await db.scalars(_filtered_runs(filters, before).limit(limit + 1))).all()
+        # Latest rerun of failed tests per listed run, for the link to its merged report.
+        merged_into = dict((await db.execute(
+            select(TestRun.rerun_of, func.max(TestRun.id))
+            .where(TestRun.rerun_of.in_([run.id for run in runs]))
+            .group_by(TestRun.rerun_of)
+        )).all())
+
+    active = {k: v for k, v in filters.items() if v}
+    if limit != RUNS_PAGE_SIZE:
+        active["limit"] = limit
+    next_url = None
+    if len(runs) > limit:
+        runs = runs[:limit]
+        next_url = "/runs?" + urlencode({**active, "before": runs[-1].id})
+    first_url = "/runs?" + urlencode(active) if before else None
+
     return templates.TemplateResponse(
         "runs.html",
-        {"request": request, "runs": runs, "format_duration": _format_run_duration},
+        {
+            "request": request,
+            "runs": runs,
+            "format_duration": _format_run_duration,
+            "strategy_labels": STRATEGY_LABELS,
+            "can_rerun_failed": reruns.can_rerun_failed,
+            "merged_into": merged_into,
+            "filters": filters,
+            "env_names": sorted(load_env_configs()),
+            "statuses": RUN_STATUSES,
+            "next_url": next_url,
+            "first_url": first_url,
+        },
     )
 
 
+@app.get("/api/runs")
+async def list_runs_api(
+    env: str = "",
+    status: str = "",
+    test_type: str = "",
+    date_from: str = "",
+    date_to: str = "",
+    before: int | None = None,
+    limit: int = RUNS_PAGE_SIZE,
+):
+    """JSON twin of /runs. Rows are streamed as they are read: {"runs": [...], "next_cursor": id|null}."""
+    filters = _runs_filters(env, status, test_type, date_from, date_to)
+    limit = max(1, min(limit, RUNS_API_MAX_LIMIT))
+
+    async def generate():
+        async with get_async_db() as db:
+            yield '{"runs":['
+            last_id = None
+            has_more = False
+            query = _filtered_runs(filters, before).limit(limit + 1).execution_options(yield_per=100)
+            i = 0
+            async for run in await db.stream_scalars(query):
+                if i == limit:
+                    has_more = True
+                    continue
+                yield ("," if i else "") + TestRunOut.model_validate(run).model_dump_json()
+                last_id = run.id
+                i += 1
+            next_cursor = last_id if has_more else None
+            yield f'],"next_cursor":{"null" if next_cursor is None else next_cursor}}}'
+
+    return StreamingResponse(generate(), media_type="application/json")
+
+
+def _stats_data(db, env: str, test_type: str, endpoint: str) -> dict:
+    now = datetime.utcnow()
+    status_counts = rollup_totals(db)
+    live = (
+        db.query(TestRun.status, func.count(TestRun.id))
+        .filter(TestRun.status.in_(LIVE_STATUSES), TestRun.fanout.isnot(True))
+        .group_by(TestRun.status)
+        .all()
+    )
+    status_counts.update({status: count for status, count in live})
+    latency = latency_overview(db, env or None)
+    # Chart the chosen endpoint, or the first one listed.
+    selected = next((row for row in latency if row["endpoint"] == endpoint), latency[0] if latency else None)
+    return {
+        "status_counts": status_counts,
+        "daily": trend(db, "day", now - timedelta(days=29), env or None, test_type or None),
+        "hourly": trend(db, "hour", now - timedelta(hours=47), env or None, test_type or None),
+        "queue": queue_stats(db),
+        "agents": agent_service.agent_stats(db),
+        "latency": latency,
+        "latency_selected": selected,
+        "latency_points": latency_series(db, selected["env"], selected["endpoint"]) if selected else [],
+    }
+
+
 @app.get("/stats", response_class=HTMLResponse)
-def stats(request: Request):
-    with get_db() as db:
-        total_runs = db.query(TestRun).count()
-        by_status = db.query(TestRun.status, func.count(TestRun.id)).group_by(TestRun.status).all()
+async def stats(request: Request, env: str = "", test_type: str = "", endpoint: str = ""):
+    env, test_type, endpoint = env.strip(), test_type.strip(), endpoint.strip()
+    async with get_async_db() as db:
+        data = await db.run_sync(_stats_data, env, test_type, endpoint)
+    daily, hourly, status_counts = data["daily"], data["hourly"], data["status_counts"]
+
+    for point in daily:
+        point["label"] = point.pop("bucket").strftime("%m-%d")
+    for point in hourly:
+        point["label"] = point.pop("bucket").strftime("%d %H:00")
 
-    status_counts = {status or "unknown": count for status, count in by_status}
     return templates.TemplateResponse(
         "stats.html",
-        {"request": request, "total_runs": total_runs, "status_counts": status_counts},
+        {
+            "request": request,
+            "total_runs": sum(status_counts.values()),
+            "status_counts": status_counts,
+            "queue": data["queue"],
+            "agents": data["agents"],
+            "db": db_stats(),
+            "latency": data["latency"],
+            "latency_selected": data["latency_selected"],
+            "latency_points": data["latency_points"],
+            "daily": daily,
+            "hourly": hourly,
+            "filters": {"env": env, "test_type": test_type},
+            "env_names": sorted(load_env_configs()),
+        },
     )
 
 
+@app.get("/api/db-stats")
+async def db_stats_api():
+    """Connection pool usage, checkout waits and query latency of the sync and async engines."""
+    return db_stats()
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus text exposition: request, discovery and run histograms, pools, queue and scheduler."""
+    async with get_async_db() as db:
+        body = await db.run_sync(metrics.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+@app.post("/api/profile")
+async def profile_process(seconds: float = 10.0):
+    """Sample every thread for `seconds` and return the folded stacks (PROFILING=1 only)."""
+    if not PROFILING_ENABLED:
+        return JSONResponse({"error": "Profiling is disabled; set PROFILING=1"}, status_code=404)
+    profile = await asyncio.to_thread(profiling.profile_for, seconds)
+    if profile is None:
+        return JSONResponse({"error": "A profile is already being taken"}, status_code=409)
+    name, folded = profile
+    return PlainTextResponse(folded, headers={"X-Profile": name})
+
+
+@app.get("/api/profiles/{name}")
+def stored_profile(name: str):
+    """A profile written by a profiled request or POST /api/profile."""
+    path = profiling.profile_path(name) if PROFILING_ENABLED else None
+    if path is None or not os.path.isfile(path):
+        return JSONResponse({"error": "Unknown profile"}, status_code=404)
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=name)
+
+
 @app.post("/rerun/{run_id}")
 def rerun(run_id: int):
-    """Create a new run with same params as the given run and start it immediately."""
+    """Create a new run with same params as the given run and queue it immediately."""
     with get_db() as db:
         run = db.get(TestRun, run_id)
         if not run:
             return RedirectResponse(url="/runs", status_code=303)
-        env, test_type, target_url = run.env, run.test_type, run.target_url
-        new_run = _create_run(db, env, test_type, "running", target_url=target_url)
-        run_id = new_run.id
-        thread = threading.Thread(
-            target=_run_robot_background,
-            args=(run_id, env, test_type, target_url),
-            daemon=True,
-        )
-        thread.start()
+        if run.fanout:
+            targets = [(child.env, child.target_url) for child in fanout_service.children_of(db, run.id)]
+            _start_fanout(db, targets, run.test_type, run.strategy, run.upload_digest)
+        else:
+            new_run = _create_run(
+                db, run.env, run.test_type, "queued", target_url=run.target_url, strategy=run.strategy,
+                upload_digest=run.upload_digest,
+            )
+            enqueue_run(db, new_run, PRIORITY_MANUAL)
     return RedirectResponse(url="/runs", status_code=303)
 
 
+@app.post("/rerun-failed/{run_id}")
+def rerun_failed(run_id: int):
+    """Run only the failed tests again; the new run's report merges them into the earlier results."""
+    with get_db() as db:
+        run = db.get(TestRun, run_id)
+        if run is not None and reruns.can_rerun_failed(run):
+            reruns.create_rerun(db, run)
+    return RedirectResponse(url="/runs", status_code=303)
+
+
+def _cancel(db, run: TestRun) -> None:
+    if run.status == "scheduled":
+        cancel_scheduled_run(run.id)
+        run.status = "cancelled"
+    elif run.status == "queued" and dequeue_run(db, run.id):
+        run.status = "cancelled"
+    elif run.status == "running":
+        # The run ends as "cancelled" once its process has stopped.
+        cancel_running(db, run.id)
+
+
 @app.post("/cancel/{run_id}")
 def cancel_run(run_id: int):
     with get_db() as db:
         run = db.get(TestRun, run_id)
-        if run and run.status == "scheduled":
-            cancel_scheduled_run(run_id)
-            run.status = "cancelled"
-            db.commit()
+        if run is None:
+            return RedirectResponse(url="/runs", status_code=303)
+        # Cancelling a fan-out cancels each of its children.
+        for target in fanout_service.children_of(db, run.id) if run.fanout else [run]:
+            _cancel(db, target)
+        fanout_service.refresh_parent(db, run.id if run.fanout else run.parent_id)
+        db.commit()
     return RedirectResponse(url="/runs", status_code=303)
 
 
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+@app.get("/runs/events")
+async def runs_events(request: Request, ids: str = ""):
+    """SSE progress for several runs over one connection (used by the runs page)."""
+    run_ids = [int(i) for i in ids.split(",") if i.strip().isdigit()][:100]
+    return StreamingResponse(stream_progress(run_ids, request), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+
+@app.get("/runs/{run_id}/events")
+async def run_events(request: Request, run_id: int):
+    """SSE progress of one run: status changes, per-test start/finish and live pass/fail counters."""
+    return StreamingResponse(stream_progress([run_id], request), media_type="text/event-stream", headers=_SSE_HEADERS)
+
+
+@app.get("/runs/{run_id}/console", response_class=PlainTextResponse)
+async def run_console(request: Request, run_id: int):
+    """Console output of a run; grows while the run is in progress."""
+    async with get_async_db() as db:
+        run_folder = await db.scalar(select(TestRun.run_folder).where(TestRun.id == run_id))
+    response = None
+    if run_folder:
+        response = await asyncio.to_thread(
+            artifact_response, request, run_folder, CONSOLE_LOG, "text/plain; charset=utf-8"
+        )
+    return response or PlainTextResponse("No console output yet.", status_code=404)
+
+
+def _run_matrix(db, run_id: int) -> dict | None:
+    run = db.get(TestRun, run_id)
+    if run is None or not run.fanout:
+        return None
+    return fanout_service.matrix(db, run)
+
+
+@app.get("/runs/{run_id}/matrix", response_class=HTMLResponse)
+async def run_matrix_page(request: Request, run_id: int, diff: bool = False):
+    """Per-test results of a fan-out run side by side, one column per environment or URL."""
+    async with get_async_db() as db:
+        data = await db.run_sync(_run_matrix, run_id)
+    if data is None:
+        return RedirectResponse(url="/runs", status_code=303)
+    rows = [row for row in data["rows"] if row["diverges"]] if diff else data["rows"]
+    return templates.TemplateResponse(
+        "run_matrix.html",
+        {
+            "request": request,
+            **data,
+            "rows": rows,
+            "diverging": sum(row["diverges"] for row in data["rows"]),
+            "total": len(data["rows"]),
+            "diff": diff,
+        },
+    )
+
+
+@app.get("/api/runs/{run_id}/matrix")
+async def run_matrix_api(run_id: int, diff: bool = False):
+    async with get_async_db() as db:
+        data = await db.run_sync(_run_matrix, run_id)
+    if data is None:
+        return JSONResponse({"error": "Not a fan-out run"}, status_code=404)
+    if diff:
+        data["rows"] = [row for row in data["rows"] if row["diverges"]]
+    return data
+
+
 @app.get("/report/{run_folder}", response_class=HTMLResponse)
 def open_report_page(request: Request, run_folder: str):
     return templates.TemplateResponse("report.html", {"request": request, "run_folder": run_folder})
 
 
 @app.get("/report-file/{run_folder}")
-def open_report_file(run_folder: str, download: bool = False):
-    report_path = os.path.join(ROBOT_RUNS_PATH, run_folder, "log.html")
-    if not os.path.exists(report_path):
-        return {"error": "Report not found"}
+def open_report_file(request: Request, run_folder: str, download: bool = False):
     headers = {}
     if download:
         headers["Content-Disposition"] = f'attachment; filename="report-{run_folder}.html"'
-    return FileResponse(report_path, headers=headers)
+    response = artifact_response(request, run_folder, "log.html", "text/html; charset=utf-8", headers)
+    return response or {"error": "Report not found"}
+
+
+# ---------- recurring schedules ----------
+
+
+def _schedule_out(schedule: Schedule, count: int = 5) -> dict:
+    out = ScheduleOut.model_validate(schedule)
+    out.next_runs = schedule_service.next_fire_times(schedule, count)
+    return out.model_dump(mode="json")
+
+
+def _schedules_data(db) -> dict:
+    schedules = db.query(Schedule).order_by(Schedule.hour, Schedule.minute, Schedule.id).all()
+    return {
+        "schedules": schedules,
+        "next_runs": {schedule.id: schedule_service.next_fire_times(schedule, 3) for schedule in schedules if schedule.enabled},
+        "conflicts": schedule_service.find_conflicts(db),
+        "upcoming": schedule_service.upcoming(db, 10),
+        "one_off": (
+            db.query(TestRun)
+            .filter(TestRun.status == "scheduled")
+            .order_by(TestRun.scheduled_for, TestRun.id)
+            .limit(20)
+            .all()
+        ),
+    }
+
+
+@app.get("/schedules", response_class=HTMLResponse)
+async def schedules_page(request: Request, error: str = ""):
+    async with get_async_db() as db:
+        data = await db.run_sync(_schedules_data)
+    return templates.TemplateResponse(
+        "schedules.html",
+        {
+            "request": request,
+            **data,
+            "weekdays": schedule_service.WEEKDAYS,
+            "strategy_labels": STRATEGY_LABELS,
+            "max_retry_failed": reruns.MAX_RETRY_FAILED,
+            "error": error,
+        },
+    )
+
+
+def _schedule_form_action(schedule_id: int, action) -> RedirectResponse:
+    with get_db() as db:
+        schedule = db.get(Schedule, schedule_id)
+        if schedule is not None:
+            try:
+                action(db, schedule)
+            except ValueError as exc:
+                return RedirectResponse(url="/schedules?" + urlencode({"error": str(exc)}), status_code=303)
+    return RedirectResponse(url="/schedules", status_code=303)
+
+
+@app.post("/schedules/{schedule_id}/edit")
+def edit_schedule(
+    schedule_id: int, time_of_day: str = Form(...), day_of_week: str = Form(None), retry_failed: int = Form(None)
+):
+    def action(db, schedule):
+        hour, minute = _parse_time(time_of_day)
+        fields = {"hour": hour, "minute": minute}
+        if retry_failed is not None:
+            fields["retry_failed"] = retry_failed
+        if schedule.schedule_type == "weekly" and day_of_week:
+            fields["day_of_week"] = day_of_week
+        schedule_service.update_schedule(db, schedule, fields)
+
+    return _schedule_form_action(schedule_id, action)
+
+
+@app.post("/schedules/{schedule_id}/toggle")
+def toggle_schedule(schedule_id: int):
+    return _schedule_form_action(
+        schedule_id, lambda db, schedule: schedule_service.update_schedule(db, schedule, {"enabled": not schedule.enabled})
+    )
+
+
+@app.post("/schedules/{schedule_id}/spread")
+def spread_schedule(schedule_id: int):
+    return _schedule_form_action(schedule_id, lambda db, schedule: schedule_service.update_schedule(db, schedule, {}, spread=True))
+
+
+@app.post("/schedules/{schedule_id}/delete")
+def delete_schedule(schedule_id: int):
+    return _schedule_form_action(schedule_id, schedule_service.delete_schedule)
+
+
+@app.get("/api/schedules")
+async def list_schedules_api():
+    """All schedules with their next fire times, plus planned overlaps over the next week."""
+    async with get_async_db() as db:
+        schedules = (await db.scalars(select(Schedule).order_by(Schedule.id))).all()
+        return {
+            "schedules": [_schedule_out(schedule) for schedule in schedules],
+            "conflicts": await db.run_sync(schedule_service.find_conflicts),
+        }
+
+
+@app.post("/api/schedules", status_code=201)
+def create_schedule_api(body: ScheduleIn, spread: bool = False):
+    """Create a schedule; with ?spread=true it is moved to a slot within the concurrency limits."""
+    with get_db() as db:
+        try:
+            schedule, moved = schedule_service.create_schedule(db, body.model_dump(), spread=spread)
+        except ValueError as exc:
+            return JSONResponse({"error": str(exc)}, status_code=400)
+        return {
+            "schedule": _schedule_out(schedule),
+            "moved": moved,
+            "conflicts": schedule_service.find_conflicts(db, schedule.id),
+        }
+
+
+@app.get("/api/schedules/{schedule_id}")
+async def get_schedule_api(schedule_id: int):
+    async with get_async_db() as db:
+        schedule = await db.get(Schedule, schedule_id)
+        if schedule is None:
+            return JSONResponse({"error": "Unknown schedule"}, status_code=404)
+        return _schedule_out(schedule)
+
+
+@app.put("/api/schedules/{schedule_id}")
+def update_schedule_api(schedule_id: int, body: ScheduleUpdate, spread: bool = False):
+    with get_db() as db:
+        schedule = db.get(Schedule, schedule_id)
+        if schedule is None:
+            return JSONResponse({"error": "Unknown schedule"}, status_code=404)
+        try:
+            moved = schedule_service.update_schedule(db, schedule, body.model_dump(exclude_unset=True), spread=spread)
+        except ValueError as exc:
+            return JSONResponse({"error": str(exc)}, status_code=400)
+        return {
+            "schedule": _schedule_out(schedule),
+            "moved": moved,
+            "conflicts": schedule_service.find_conflicts(db, schedule.id),
+        }
+
+
+@app.delete("/api/schedules/{schedule_id}", status_code=204)
+def delete_schedule_api(schedule_id: int):
+    with get_db() as db:
+        schedule = db.get(Schedule, schedule_id)
+        if schedule is None:
+            return JSONResponse({"error": "Unknown schedule"}, status_code=404)
+        schedule_service.delete_schedule(db, schedule)
+    return Response(status_code=204)
+
+
+@app.get("/api/schedules/{schedule_id}/preview")
+async def preview_schedule_api(schedule_id: int, count: int = 10):
+    """The next `count` fire times (before jitter)."""
+    async with get_async_db() as db:
+        schedule = await db.get(Schedule, schedule_id)
+        if schedule is None:
+            return JSONResponse({"error": "Unknown schedule"}, status_code=404)
+        return {"fire_times": schedule_service.next_fire_times(schedule, max(1, min(count, 100)))}
+
+
+# ---------- remote runner agents (robot-tests/runner/agent.py) ----------
+
+
+def _agent_auth_error(request: Request) -> JSONResponse | None:
+    if AGENT_TOKEN and request.headers.get("authorization") != f"Bearer {AGENT_TOKEN}":
+        return JSONResponse({"error": "Invalid agent token"}, status_code=401)
+    return None
+
+
+@app.post("/api/agents/register")
+async def agent_register(request: Request, body: AgentRegister):
+    if error := _agent_auth_error(request):
+        return error
+    async with get_async_db() as db:
+        agent = await db.run_sync(agent_service.register_agent, body.name, body.hostname, body.capacity, body.envs)
+        return {"agent_id": agent.id, "lease_seconds": AGENT_LEASE_SECONDS}
+
+
+@app.post("/api/agents/{agent_id}/heartbeat")
+async def agent_heartbeat(request: Request, agent_id: int, body: AgentHeartbeat):
+    """Renew leases; the response lists runs the agent must stop (cancelled or reclaimed)."""
+    if error := _agent_auth_error(request):
+        return error
+    async with get_async_db() as db:
+        agent = await db.get(RunnerAgent, agent_id)
+        if agent is None:
+            return JSONResponse({"error": "Unknown agent"}, status_code=404)
+        return {"cancel": await db.run_sync(lambda sync_db: agent_service.heartbeat(sync_db, agent, body.run_ids))}
+
+
+@app.post("/api/agents/{agent_id}/claim")
+def agent_claim(request: Request, agent_id: int):
+    """Next run for the agent, or 204 when nothing fits its capacity and the concurrency limits."""
+    if error := _agent_auth_error(request):
+        return error
+    with get_db() as db:
+        agent = db.get(RunnerAgent, agent_id)
+        if agent is None:
+            return JSONResponse({"error": "Unknown agent"}, status_code=404)
+        job = agent_service.claim(db, agent)
+    return job if job else Response(status_code=204)
+
+
+@app.put("/api/agents/{agent_id}/runs/{run_id}/artifacts")
+async def agent_upload_artifacts(request: Request, agent_id: int, run_id: int):
+    """Receive the run folder as an (uncompressed) tar stream of individually compressed files."""
+    if error := _agent_auth_error(request):
+        return error
+
+    def _run_folder(db) -> str | None:
+        agent = db.get(RunnerAgent, agent_id)
+        run = agent_service.held_run(db, agent, run_id) if agent else None
+        return run.run_folder if run else None
+
+    async with get_async_db() as db:
+        run_folder = await db.run_sync(_run_folder)
+    if not run_folder:
+        return JSONResponse({"error": "Run is not held by this agent"}, status_code=409)
+
+    run_dir = os.path.join(ROBOT_RUNS_PATH, run_folder)
+    os.makedirs(run_dir, exist_ok=True)
+    fd, archive_path = tempfile.mkstemp(prefix=".upload-", suffix=".tar", dir=run_dir)
+    try:
+        with os.fdopen(fd, "wb") as archive:
+            async for chunk in request.stream():
+                await asyncio.to_thread(archive.write, chunk)
+        files = await asyncio.to_thread(unpack_artifacts, run_folder, archive_path)
+    except (OSError, tarfile.TarError, ValueError):
+        return JSONResponse({"error": "Invalid artifact archive"}, status_code=400)
+    finally:
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+    return {"files": files}
+
+
+@app.get("/api/agents/{agent_id}/blobs/{digest}")
+async def agent_blob(request: Request, agent_id: int, digest: str):
+    """An uploaded suite file by its SHA-256, for building a run's workspace on the agent."""
+    if error := _agent_auth_error(request):
+        return error
+    async with get_async_db() as db:
+        agent = await db.get(RunnerAgent, agent_id)
+    path = upload_store.blob_path(digest) if upload_store.is_digest(digest) else None
+    if agent is None or path is None or not os.path.isfile(path):
+        return JSONResponse({"error": "Unknown blob"}, status_code=404)
+    return FileResponse(path, media_type="application/octet-stream")
+
+
+@app.get("/api/agents/{agent_id}/runs/{run_id}/rerun-source")
+async def agent_rerun_source(request: Request, agent_id: int, run_id: int):
+    """output.xml of the run whose failed tests the held run re-executes."""
+    if error := _agent_auth_error(request):
+        return error
+
+    def _source_folder(db) -> str | None:
+        agent = db.get(RunnerAgent, agent_id)
+        run = agent_service.held_run(db, agent, run_id) if agent else None
+        source = db.get(TestRun, run.rerun_of) if run and run.rerun_of else None
+        return source.run_folder if source else None
+
+    async with get_async_db() as db:
+        source_folder = await db.run_sync(_source_folder)
+    response = None
+    if source_folder:
+        response = await asyncio.to_thread(artifact_response, request, source_folder, "output.xml", "application/xml")
+    return response or JSONResponse({"error": "No output to rerun"}, status_code=404)
+
+
+@app.post("/api/agents/{agent_id}/runs/{run_id}/complete")
+def agent_complete(request: Request, agent_id: int, run_id: int, body: AgentResult):
+    if error := _agent_auth_error(request):
+        return error
+    with get_db() as db:
+        agent = db.get(RunnerAgent, agent_id)
+        if agent is None or not agent_service.complete(db, agent, run_id, body.status, body.returncode):
+            return JSONResponse({"error": "Run is not held by this agent"}, status_code=409)
+        run = db.get(TestRun, run_id)
+        return {"status": run.status}
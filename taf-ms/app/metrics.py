@@ -0,0 +1,166 @@
+"""
+Prometheus metrics, served in the text exposition format by GET /metrics.
+
+Histograms are recorded in process (request latency per route, test discovery and env config
+loads, run durations); pool and query counters, queue depth, subprocesses and scheduler
+misfires are read when scraped.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; requests and discovery scans.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Seconds; whole runs.
+RUN_BUCKETS = (10, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 10800)
+_INF = 'le="+Inf"'
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values; safe to observe from any thread."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series: dict[tuple, list] = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = f'le="{_number(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labels, key, _INF)} {values[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(float(values[-2]))}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {values[-1]}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "taf_http_request_duration_seconds", "Time to answer an HTTP request, by route template.",
+    ("method", "route", "status"),
+)
+DISCOVERY_SECONDS = Histogram(
+    "taf_test_discovery_seconds", "Time of a test discovery scan; cache=miss when files were re-parsed.", ("cache",),
+)
+ENV_CONFIG_SECONDS = Histogram(
+    "taf_env_config_load_seconds", "Time to load the env configs; cache=miss when a YAML file was re-parsed.",
+    ("cache",),
+)
+RUN_SECONDS = Histogram(
+    "taf_run_duration_seconds", "Duration of finished runs from start to end.", ("env", "test_type", "status"),
+    RUN_BUCKETS,
+)
+HISTOGRAMS = (REQUEST_SECONDS, DISCOVERY_SECONDS, ENV_CONFIG_SECONDS, RUN_SECONDS)
+
+
+def observe_run(run) -> None:
+    """Record a run that has just ended (runs that never started have no duration)."""
+    if run.started_at and run.finished_at:
+        RUN_SECONDS.observe((run.finished_at - run.started_at).total_seconds(), run.env, run.test_type, run.status)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each HTTP request under its route template (e.g. /runs/{run_id})."""
+
+    def __init__(self, asgi_app):
+        self.app = asgi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], route, status[0])
+
+
+def _family(lines: list[str], name: str, kind: str, help_text: str, samples) -> None:
+    """Append a gauge or counter family given (labels dict, value) samples."""
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+
+
+def render(db) -> str:
+    """The whole exposition: recorded histograms plus pool, query, queue and scheduler state."""
+    from app import executor, scheduler
+    from app.db import db_stats
+    from app.run_queue import queue_stats
+
+    lines: list[str] = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render()
+
+    pools = db_stats()
+    for key, name, kind, help_text in (
+        ("queries", "taf_db_queries_total", "counter", "Queries executed."),
+        ("query_seconds", "taf_db_query_seconds_total", "counter", "Time spent executing queries."),
+        ("slow_queries", "taf_db_slow_queries_total", "counter", "Queries slower than DB_SLOW_QUERY_MS."),
+        ("checkouts", "taf_db_pool_checkouts_total", "counter", "Connections checked out of the pool."),
+        ("checkout_wait_seconds", "taf_db_pool_checkout_wait_seconds_total", "counter",
+         "Time spent waiting for a pooled connection."),
+        ("checkout_timeouts", "taf_db_pool_checkout_timeouts_total", "counter", "Checkouts that timed out."),
+        ("checked_out", "taf_db_pool_checked_out", "gauge", "Connections currently in use."),
+        ("idle", "taf_db_pool_idle", "gauge", "Idle connections in the pool."),
+        ("overflow", "taf_db_pool_overflow", "gauge", "Connections open beyond the pool size."),
+    ):
+        _family(lines, name, kind, help_text, [({"engine": engine}, stats[key]) for engine, stats in pools.items()])
+
+    queue = queue_stats(db)
+    _family(lines, "taf_queue_depth", "gauge", "Runs waiting in the queue.",
+            [({"env": env}, count) for env, count in sorted(queue["depth_by_env"].items())])
+    _family(lines, "taf_queue_active_runs", "gauge", "Runs claimed by the local runner or an agent.",
+            [({}, queue["active"])])
+    _family(lines, "taf_queue_oldest_wait_seconds", "gauge", "Age of the oldest waiting run.",
+            [({}, queue["oldest_wait"])])
+    _family(lines, "taf_run_subprocesses", "gauge", "Robot processes running in this process's executor.",
+            [({}, executor.active_count())])
+    _family(lines, "taf_scheduler_misfires_total", "counter", "Scheduled fires missed beyond the grace period.",
+            [({}, scheduler.misfires)])
+    return "\n".join(lines) + "\n"
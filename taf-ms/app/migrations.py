@@ -0,0 +1,168 @@
+"""
+Versioned schema migrations, applied once each and recorded in the schema_migrations table.
+
+New schema changes get a new entry at the end of MIGRATIONS; never edit an applied one.
+Run pending migrations ahead of a deploy with `python -m app.migrations` (or let the
+dashboard apply them at startup, see MIGRATE_ON_STARTUP).
+"""
+import argparse
+import logging
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.orm import Session
+
+from app import models  # noqa: F401  (registers every table on Base.metadata)
+from app.db import Base
+
+logger = logging.getLogger(__name__)
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+# Serializes migrations between dashboard replicas starting at once (PostgreSQL only).
+_ADVISORY_LOCK_ID = 7_310_917
+# test_runs indexes that existed when migrations were introduced; later ones have their own migration.
+_BASELINE_INDEXES = (
+    "ix_test_runs_env_id", "ix_test_runs_status_id", "ix_test_runs_test_type_id", "ix_test_runs_created_at",
+)
+
+
+def _add_column(conn, table: str, column: str, type_: str) -> None:
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {type_} NULL"))
+
+
+def _create_test_runs_index(conn, name: str) -> None:
+    index = next(index for index in models.TestRun.__table__.indexes if index.name == name)
+    index.create(bind=conn, checkfirst=True)
+
+
+def _baseline(conn) -> None:
+    """Tables, plus columns and indexes added to existing tables before migrations were versioned."""
+    Base.metadata.create_all(bind=conn)
+    for table, column, type_ in (
+        ("test_runs", "finished_at", "TIMESTAMP"),
+        ("test_runs", "queued_at", "TIMESTAMP"),
+        ("test_runs", "started_at", "TIMESTAMP"),
+        ("test_runs", "tests_passed", "INTEGER"),
+        ("test_runs", "tests_failed", "INTEGER"),
+        ("test_runs", "tests_skipped", "INTEGER"),
+        ("test_runs", "artifacts_pruned", "BOOLEAN"),
+        ("test_runs", "runner", "VARCHAR"),
+        ("test_runs", "strategy", "VARCHAR"),
+        ("test_runs", "content_digest", "VARCHAR"),
+        ("test_runs", "degraded", "BOOLEAN"),
+        ("test_runs", "degraded_reason", "VARCHAR"),
+        ("test_runs", "schedule_id", "INTEGER"),
+        ("run_queue", "agent_id", "INTEGER"),
+        ("run_queue", "lease_expires_at", "TIMESTAMP"),
+        ("run_queue", "cancel_requested", "BOOLEAN"),
+    ):
+        _add_column(conn, table, column, type_)
+    # create_all only indexes tables it creates.
+    for name in _BASELINE_INDEXES:
+        _create_test_runs_index(conn, name)
+
+
+def _backfill_rollups(conn) -> None:
+    from app.rollups import backfill
+
+    with Session(bind=conn) as db:
+        backfill(db)
+
+
+def _fanout_runs(conn) -> None:
+    _add_column(conn, "test_runs", "fanout", "BOOLEAN")
+    _add_column(conn, "test_runs", "parent_id", "INTEGER")
+    _create_test_runs_index(conn, "ix_test_runs_parent_id")
+
+
+def _rerun_failed(conn) -> None:
+    _add_column(conn, "test_runs", "rerun_of", "INTEGER")
+    _add_column(conn, "schedules", "retry_failed", "INTEGER")
+    _create_test_runs_index(conn, "ix_test_runs_rerun_of")
+
+
+def _upload_workspaces(conn) -> None:
+    _add_column(conn, "test_runs", "upload_digest", "VARCHAR")
+    _add_column(conn, "schedules", "upload_digest", "VARCHAR")
+
+
+# (version, description, function(connection)); each runs in its own transaction.
+MIGRATIONS: list[tuple[int, str, Callable]] = [
+    (1, "baseline schema", _baseline),
+    (2, "backfill run rollups", _backfill_rollups),
+    (3, "fan-out parent and child runs", _fanout_runs),
+    (4, "reruns of failed tests and schedule retry policy", _rerun_failed),
+    (5, "content-addressed uploads", _upload_workspaces),
+]
+
+
+def applied_versions(conn) -> set[int]:
+    if not inspect(conn).has_table(schema_migrations.name):
+        return set()
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pending(engine) -> list[tuple[int, str, Callable]]:
+    with engine.connect() as conn:
+        applied = applied_versions(conn)
+    return [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+
+def schema_version(engine) -> int:
+    with engine.connect() as conn:
+        return max(applied_versions(conn), default=0)
+
+
+def migrate(engine) -> list[int]:
+    """Apply pending migrations in order; returns the versions applied."""
+    postgres = engine.dialect.name == "postgresql"
+    with engine.connect() as lock_conn:
+        if postgres:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": _ADVISORY_LOCK_ID})
+        try:
+            with engine.begin() as conn:
+                schema_migrations.create(bind=conn, checkfirst=True)
+            applied = []
+            for version, description, apply in pending(engine):
+                with engine.begin() as conn:
+                    apply(conn)
+                    conn.execute(schema_migrations.insert().values(
+                        version=version, description=description, applied_at=datetime.utcnow(),
+                    ))
+                logger.info("Applied migration %s (%s)", version, description)
+                applied.append(version)
+            return applied
+        finally:
+            if postgres:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _ADVISORY_LOCK_ID})
+
+
+def main() -> None:
+    from app.db import engine, wait_for_db
+
+    parser = argparse.ArgumentParser(description="Apply pending TAF dashboard schema migrations.")
+    parser.add_argument("--status", action="store_true", help="Only list pending migrations")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    wait_for_db()
+    if args.status:
+        todo = pending(engine)
+        print(f"Schema version {schema_version(engine)}; {len(todo)} pending")
+        for version, description, _ in todo:
+            print(f"  {version}: {description}")
+        return
+    applied = migrate(engine)
+    print(f"Applied {len(applied)} migration(s); schema version {schema_version(engine)}")
+
+
+if __name__ == "__main__":
+    main()
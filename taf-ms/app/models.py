@@ -1,17 +1,180 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String, Text, UniqueConstraint
 from datetime import datetime
 from app.db import Base
 
 
 class TestRun(Base):
     __tablename__ = "test_runs"
+    # Composite indexes match the /runs filters combined with the id keyset cursor.
+    __table_args__ = (
+        Index("ix_test_runs_env_id", "env", "id"),
+        Index("ix_test_runs_status_id", "status", "id"),
+        Index("ix_test_runs_test_type_id", "test_type", "id"),
+        Index("ix_test_runs_created_at", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True)
     env = Column(String, nullable=False)
     test_type = Column(String, nullable=False)
-    status = Column(String, nullable=False)  # scheduled, running, finished, failed
+    status = Column(String, nullable=False)  # scheduled, queued, running, finished, failed
     created_at = Column(DateTime, default=datetime.utcnow)
     scheduled_for = Column(DateTime, nullable=True)
     run_folder = Column(String, nullable=True)
     target_url = Column(String, nullable=True)
     finished_at = Column(DateTime, nullable=True)
+    queued_at = Column(DateTime, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    tests_passed = Column(Integer, nullable=True)
+    tests_failed = Column(Integer, nullable=True)
+    tests_skipped = Column(Integer, nullable=True)
+    artifacts_pruned = Column(Boolean, nullable=True)  # run folder removed by retention
+    runner = Column(String, nullable=True)  # "local" or the name of the agent that executed it
+    strategy = Column(String, nullable=True)  # full (default), failed_first, changed_only
+    content_digest = Column(String, nullable=True)  # ContentSnapshot of tests/ and resources/ it ran
+    degraded = Column(Boolean, nullable=True)  # HTTP latency regressed against the env's baseline
+    degraded_reason = Column(String, nullable=True)
+    schedule_id = Column(Integer, ForeignKey("schedules.id", ondelete="SET NULL"), nullable=True)  # recurring origin
+    # Fan-out: the parent run (fanout=True) only aggregates its children, one per env/target URL.
+    fanout = Column(Boolean, nullable=True)
+    parent_id = Column(Integer, ForeignKey("test_runs.id", ondelete="CASCADE"), nullable=True, index=True)
+    # Set on a run that re-executed the failed tests of this earlier run and merged them into its results.
+    rerun_of = Column(Integer, ForeignKey("test_runs.id", ondelete="SET NULL"), nullable=True, index=True)
+    upload_digest = Column(String, nullable=True)  # manifest of uploaded suites it runs instead of tests/
+
+
+class ContentSnapshot(Base):
+    """Content hashes of tests/ and resources/ files, shared by all runs that saw the same files."""
+    __tablename__ = "content_snapshots"
+
+    digest = Column(String, primary_key=True)
+    hashes = Column(Text, nullable=False)  # JSON {"tests/x.robot": sha1, ...}
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class Schedule(Base):
+    """Recurring (daily/weekly) run; executed by the scheduler job "schedule-<id>"."""
+    __tablename__ = "schedules"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=True)
+    schedule_type = Column(String, nullable=False)  # daily, weekly
+    env = Column(String, nullable=False)
+    test_type = Column(String, nullable=False)
+    target_url = Column(String, nullable=True)
+    strategy = Column(String, nullable=True)
+    hour = Column(Integer, nullable=False)
+    minute = Column(Integer, nullable=False)
+    day_of_week = Column(String, nullable=True)  # mon..sun for weekly schedules
+    enabled = Column(Boolean, nullable=False, default=True)
+    retry_failed = Column(Integer, nullable=True, default=0)  # automatic reruns of failed tests per run
+    upload_digest = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=True)
+
+
+class RunnerAgent(Base):
+    """A remote runner process that claims queued runs (robot-tests/runner/agent.py)."""
+    __tablename__ = "runner_agents"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+    hostname = Column(String, nullable=True)
+    capacity = Column(Integer, nullable=False, default=1)  # runs it executes at once
+    envs = Column(String, nullable=True)  # comma-separated envs it serves; empty = all
+    registered_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_heartbeat = Column(DateTime, nullable=True)
+
+
+class QueuedRun(Base):
+    """A run waiting for (or held by) a worker. Deleted once the run completes."""
+    __tablename__ = "run_queue"
+
+    id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, ForeignKey("test_runs.id", ondelete="CASCADE"), nullable=False, unique=True)
+    env = Column(String, nullable=False)
+    priority = Column(Integer, nullable=False)  # lower runs first
+    enqueued_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    claimed_at = Column(DateTime, nullable=True)
+    agent_id = Column(Integer, ForeignKey("runner_agents.id", ondelete="SET NULL"), nullable=True)  # None: local
+    lease_expires_at = Column(DateTime, nullable=True)  # renewed by the agent or dashboard process holding the claim
+    cancel_requested = Column(Boolean, nullable=True)  # picked up by the agent on its next heartbeat
+
+
+class SuiteResult(Base):
+    """One executed suite of a run, ingested from output.xml."""
+    __tablename__ = "suite_results"
+
+    id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, ForeignKey("test_runs.id", ondelete="CASCADE"), nullable=False, index=True)
+    name = Column(String, nullable=False)
+    full_name = Column(String, nullable=False)
+    source = Column(String, nullable=True)
+    status = Column(String, nullable=True)  # PASS, FAIL, SKIP
+    start_time = Column(DateTime, nullable=True)
+    end_time = Column(DateTime, nullable=True)
+    duration = Column(Float, nullable=True)  # seconds
+    message = Column(Text, nullable=True)
+
+
+class TestResult(Base):
+    """One executed test of a run, ingested from output.xml."""
+    __tablename__ = "test_results"
+
+    id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, ForeignKey("test_runs.id", ondelete="CASCADE"), nullable=False, index=True)
+    suite = Column(String, nullable=False)  # full name of the parent suite
+    name = Column(String, nullable=False)
+    full_name = Column(String, nullable=False, index=True)
+    status = Column(String, nullable=False)  # PASS, FAIL, SKIP
+    tags = Column(String, nullable=True)  # comma separated
+    start_time = Column(DateTime, nullable=True)
+    end_time = Column(DateTime, nullable=True)
+    duration = Column(Float, nullable=True)  # seconds
+    message = Column(Text, nullable=True)
+
+
+class RunRollup(Base):
+    """Aggregated finished runs per time bucket, env and test_type."""
+    __tablename__ = "run_rollups"
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket_start", "env", "test_type", name="uq_run_rollups_bucket"),
+        Index("ix_run_rollups_granularity_bucket", "granularity", "bucket_start"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    granularity = Column(String, nullable=False)  # hour, day
+    bucket_start = Column(DateTime, nullable=False)
+    env = Column(String, nullable=False)
+    test_type = Column(String, nullable=False)
+    run_count = Column(Integer, nullable=False, default=0)
+    passed_count = Column(Integer, nullable=False, default=0)
+    failed_count = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+    duration_sum = Column(Float, nullable=False, default=0.0)  # seconds
+    duration_histogram = Column(Text, nullable=False)  # JSON counts per rollups.DURATION_BUCKETS
+
+
+class EndpointLatency(Base):
+    """HTTP latency of one endpoint in one run (from the run's http_timings.jsonl)."""
+    __tablename__ = "endpoint_latency"
+    __table_args__ = (
+        Index("ix_endpoint_latency_env_endpoint_run", "env", "endpoint", "run_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, ForeignKey("test_runs.id", ondelete="CASCADE"), nullable=False, index=True)
+    env = Column(String, nullable=False)
+    endpoint = Column(String, nullable=False)  # "GET /status/200"
+    recorded_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    count = Column(Integer, nullable=False)
+    new_connections = Column(Integer, nullable=False, default=0)
+    # Total request time percentiles (ms).
+    p50_ms = Column(Float, nullable=False)
+    p95_ms = Column(Float, nullable=False)
+    p99_ms = Column(Float, nullable=False)
+    max_ms = Column(Float, nullable=False)
+    # Mean phase times (ms); DNS/connect/TLS only over requests that opened a connection.
+    dns_ms = Column(Float, nullable=True)
+    connect_ms = Column(Float, nullable=True)
+    tls_ms = Column(Float, nullable=True)
+    ttfb_ms = Column(Float, nullable=True)
@@ -0,0 +1,133 @@
+"""
+Opt-in sampling profiler (PROFILING=1) for finding slow paths in a running dashboard.
+
+A sampler thread reads the Python stack of every other thread each PROFILE_INTERVAL_MS and
+counts identical stacks. Profiles are written in the folded format read by flamegraph.pl,
+speedscope and inferno: one "outer;...;inner count" line per stack.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from app.config import PROFILE_INTERVAL_MS, PROFILE_MAX_SECONDS, PROFILES_PATH, PROFILING_ENABLED
+
+PROFILE_HEADER = b"x-profile"
+# Profiles kept on disk; older ones are removed when a new one is written.
+PROFILES_KEEP = 50
+
+# One profile at a time: samplers of overlapping profiles would see each other's work anyway.
+_active = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class Sampler:
+    """Samples the stacks of all other threads from a daemon thread between start() and stop()."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def start(self) -> "Sampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> str:
+        """Stop sampling; returns the folded stacks."""
+        self._stop.set()
+        self._thread.join()
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def profile_name(label: str) -> str:
+    safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in label).strip("_")[:60]
+    return f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{safe or 'profile'}.folded"
+
+
+def profile_path(name: str) -> str | None:
+    """Path of a stored profile, or None for names that are not plain profile file names."""
+    if os.path.basename(name) != name or not name.endswith(".folded"):
+        return None
+    return os.path.join(PROFILES_PATH, name)
+
+
+def save(name: str, folded: str) -> str:
+    os.makedirs(PROFILES_PATH, exist_ok=True)
+    path = os.path.join(PROFILES_PATH, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(folded)
+    stored = sorted(entry for entry in os.listdir(PROFILES_PATH) if entry.endswith(".folded"))
+    for old in stored[:-PROFILES_KEEP]:
+        os.remove(os.path.join(PROFILES_PATH, old))
+    return path
+
+
+def profile_for(seconds: float) -> tuple[str, str] | None:
+    """Profile the whole process for `seconds` (capped); (name, folded stacks), or None if one is running."""
+    if not _active.acquire(blocking=False):
+        return None
+    try:
+        sampler = Sampler().start()
+        time.sleep(max(0.0, min(seconds, PROFILE_MAX_SECONDS)))
+        folded = sampler.stop()
+    finally:
+        _active.release()
+    name = profile_name(f"process-{seconds:g}s")
+    save(name, folded)
+    return name, folded
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling requests sent with an "X-Profile: 1" header (PROFILING=1 only).
+    The response carries the stored profile's name in its X-Profile header.
+    """
+
+    def __init__(self, asgi_app):
+        self.app = asgi_app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not PROFILING_ENABLED
+            or scope["type"] != "http"
+            or dict(scope["headers"]).get(PROFILE_HEADER) not in (b"1", b"true")
+            or not _active.acquire(blocking=False)
+        ):
+            await self.app(scope, receive, send)
+            return
+        name = profile_name(f"{scope['method']}-{scope['path']}")
+
+        async def send_with_name(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile", name.encode())]}
+            await send(message)
+
+        sampler = Sampler().start()
+        try:
+            await self.app(scope, receive, send_with_name)
+        finally:
+            folded = sampler.stop()
+            _active.release()
+            save(name, folded)
@@ -0,0 +1,62 @@
+"""Reruns of failed tests: only the failures of a run execute again and are merged into its results."""
+import logging
+
+from app.models import Schedule, TestRun
+from app.run_queue import PRIORITY_MANUAL, PRIORITY_SCHEDULED, enqueue_run
+
+logger = logging.getLogger(__name__)
+
+# Upper bound for a schedule's automatic reruns of failed tests.
+MAX_RETRY_FAILED = 3
+
+
+def can_rerun_failed(run: TestRun) -> bool:
+    """A run whose tests failed and whose output.xml is still stored."""
+    return (
+        run.status == "failed"
+        and bool(run.tests_failed)
+        and bool(run.run_folder)
+        and not run.artifacts_pruned
+        and not run.fanout
+    )
+
+
+def attempt(db, run: TestRun) -> int:
+    """1 for a first run, 2 for the rerun of its failures, and so on."""
+    count, seen = 1, {run.id}
+    while run.rerun_of and run.rerun_of not in seen:
+        run = db.get(TestRun, run.rerun_of)
+        if run is None:
+            break
+        seen.add(run.id)
+        count += 1
+    return count
+
+
+def create_rerun(db, run: TestRun, priority: int = PRIORITY_MANUAL) -> TestRun:
+    """Queue a run of `run`'s failed tests; its output is the merge of both runs."""
+    rerun = TestRun(
+        env=run.env,
+        test_type=run.test_type,
+        status="queued",
+        target_url=run.target_url,
+        schedule_id=run.schedule_id,
+        rerun_of=run.id,
+        upload_digest=run.upload_digest,
+    )
+    db.add(rerun)
+    db.commit()
+    db.refresh(rerun)
+    enqueue_run(db, rerun, priority)
+    return rerun
+
+
+def retry_failed(db, run: TestRun) -> TestRun | None:
+    """Apply the retry policy of the run's schedule once the run has ended."""
+    if not run.schedule_id or not can_rerun_failed(run):
+        return None
+    schedule = db.get(Schedule, run.schedule_id)
+    if schedule is None or attempt(db, run) > (schedule.retry_failed or 0):
+        return None
+    logger.info("Rerunning %s failed test(s) of run %s (schedule %s)", run.tests_failed, run.id, schedule.id)
+    return create_rerun(db, run, PRIORITY_SCHEDULED)
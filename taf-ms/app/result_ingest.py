@@ -0,0 +1,145 @@
+"""Stream Robot Framework output.xml into per-suite and per-test result rows."""
+import os
+from datetime import datetime, timedelta
+from xml.etree import ElementTree
+
+from sqlalchemy import delete, insert
+
+from app.artifact_store import open_decoded
+from app.models import SuiteResult, TestResult
+
+# Rows are written in batches so huge outputs never build one giant statement.
+BATCH_SIZE = 500
+
+# Direct children of <test>/<suite> that are read when the element ends.
+# Everything else (keywords, messages, arguments, ...) is dropped as soon as it
+# is parsed, so memory stays bounded by a single test's own status and tags.
+_KEPT_CHILDREN = {"status", "tag", "doc"}
+
+# <statistics> also contains <suite> elements; only these parents hold real suites.
+_SUITE_PARENTS = {"robot", "suite"}
+
+_RF6_TIME_FORMAT = "%Y%m%d %H:%M:%S.%f"
+
+
+def _parse_times(status) -> tuple[datetime | None, datetime | None, float | None]:
+    """Return (start, end, duration seconds) from a <status> element (RF 7 or RF 6 schema)."""
+    if status is None:
+        return None, None, None
+    start_raw = status.get("start")
+    if start_raw is not None:
+        start = datetime.fromisoformat(start_raw)
+        elapsed = float(status.get("elapsed", "0"))
+        return start, start + timedelta(seconds=elapsed), elapsed
+    try:
+        start = datetime.strptime(status.get("starttime", ""), _RF6_TIME_FORMAT)
+        end = datetime.strptime(status.get("endtime", ""), _RF6_TIME_FORMAT)
+    except ValueError:
+        return None, None, None
+    return start, end, (end - start).total_seconds()
+
+
+def _message(status) -> str | None:
+    if status is None or not status.text:
+        return None
+    return status.text.strip() or None
+
+
+def ingest_output_xml(db, run_id: int, run_dir: str) -> dict | None:
+    """
+    Parse <run_dir>/output.xml incrementally and store suite/test rows for the run.
+    Returns: {"status": "finished"|"failed", "passed": n, "failed": n, "skipped": n},
+    or None when there is no readable output (the caller falls back to the exit code).
+    """
+    # Runs uploaded by remote agents arrive with output.xml already compressed.
+    source = open_decoded(os.path.join(run_dir, "output.xml"))
+    if source is None:
+        return None
+
+    counts = {"PASS": 0, "FAIL": 0, "SKIP": 0}
+    suite_names: list[str] = []
+    elements: list = []
+    test_rows: list[dict] = []
+    suite_rows: list[dict] = []
+
+    def flush() -> None:
+        if test_rows:
+            db.execute(insert(TestResult), test_rows)
+            test_rows.clear()
+        if suite_rows:
+            db.execute(insert(SuiteResult), suite_rows)
+            suite_rows.clear()
+
+    try:
+        # Re-ingesting (e.g. after a merged rerun) replaces previous rows.
+        db.execute(delete(TestResult).where(TestResult.run_id == run_id))
+        db.execute(delete(SuiteResult).where(SuiteResult.run_id == run_id))
+
+        for event, elem in ElementTree.iterparse(source, events=("start", "end")):
+            if event == "start":
+                if elem.tag == "suite" and elements and elements[-1].tag in _SUITE_PARENTS:
+                    suite_names.append(elem.get("name", ""))
+                elements.append(elem)
+                continue
+
+            elements.pop()
+            parent = elements[-1] if elements else None
+
+            if elem.tag == "test":
+                status_el = elem.find("status")
+                status = status_el.get("status") if status_el is not None else "FAIL"
+                counts[status] = counts.get(status, 0) + 1
+                start, end, duration = _parse_times(status_el)
+                suite = ".".join(suite_names)
+                test_rows.append({
+                    "run_id": run_id,
+                    "suite": suite,
+                    "name": elem.get("name", ""),
+                    "full_name": f"{suite}.{elem.get('name', '')}",
+                    "status": status,
+                    "tags": ",".join(t.text or "" for t in elem.findall("tag")),
+                    "start_time": start,
+                    "end_time": end,
+                    "duration": duration,
+                    "message": _message(status_el),
+                })
+            elif elem.tag == "suite" and parent is not None and parent.tag in _SUITE_PARENTS:
+                status_el = elem.find("status")
+                start, end, duration = _parse_times(status_el)
+                suite_rows.append({
+                    "run_id": run_id,
+                    "name": elem.get("name", ""),
+                    "full_name": ".".join(suite_names),
+                    "source": elem.get("source"),
+                    "status": status_el.get("status") if status_el is not None else None,
+                    "start_time": start,
+                    "end_time": end,
+                    "duration": duration,
+                    "message": _message(status_el),
+                })
+                suite_names.pop()
+            elif elem.tag in _KEPT_CHILDREN:
+                continue
+
+            # Drop the element (and its subtree) from the partially built tree.
+            elem.clear()
+            if parent is not None:
+                parent.remove(elem)
+
+            if len(test_rows) >= BATCH_SIZE:
+                flush()
+
+        flush()
+        db.commit()
+    except Exception:
+        db.rollback()
+        return None
+    finally:
+        source.close()
+
+    return {
+        "status": "finished" if counts["FAIL"] == 0 else "failed",
+        "passed": counts["PASS"],
+        "failed": counts["FAIL"],
+        "skipped": counts["SKIP"],
+    }
@@ -0,0 +1,215 @@
+"""Hourly and daily run aggregates per env and test_type, updated as runs finish."""
+import json
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from app.models import RunRollup, TestRun
+
+GRANULARITIES = ("hour", "day")
+# Statuses that end a run and are counted in rollups.
+FINAL_STATUSES = ("finished", "failed", "error", "timeout")
+
+# Upper bounds (seconds) of the duration histogram buckets; the last bucket is open.
+DURATION_BUCKETS = (
+    1, 2, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 450, 600, 900,
+    1200, 1800, 2700, 3600, 5400, 7200, 10800,
+)
+
+_lock = threading.Lock()
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _bucket_index(seconds: float) -> int:
+    for i, bound in enumerate(DURATION_BUCKETS):
+        if seconds <= bound:
+            return i
+    return len(DURATION_BUCKETS)
+
+
+def _percentile(histogram: list[int], q: float) -> float | None:
+    """Estimate a percentile from bucket counts, interpolating inside the bucket."""
+    total = sum(histogram)
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    for i, count in enumerate(histogram):
+        if count and seen + count >= target:
+            lower = DURATION_BUCKETS[i - 1] if i > 0 else 0
+            upper = DURATION_BUCKETS[i] if i < len(DURATION_BUCKETS) else DURATION_BUCKETS[-1] * 2
+            return round(lower + (upper - lower) * (target - seen) / count, 1)
+        seen += count
+    return float(DURATION_BUCKETS[-1])
+
+
+def _run_duration(run: TestRun) -> float | None:
+    started = run.started_at or run.created_at
+    if not run.finished_at or not started:
+        return None
+    return max(0.0, (run.finished_at - started).total_seconds())
+
+
+def _add_to_bucket(db, granularity: str, run: TestRun, duration: float | None) -> None:
+    start = bucket_start(run.finished_at, granularity)
+    key = {"granularity": granularity, "bucket_start": start, "env": run.env, "test_type": run.test_type}
+    rollup = db.query(RunRollup).filter_by(**key).with_for_update().first()
+    if rollup is None:
+        rollup = RunRollup(
+            **key,
+            run_count=0,
+            passed_count=0,
+            failed_count=0,
+            error_count=0,
+            duration_sum=0.0,
+            duration_histogram=json.dumps([0] * (len(DURATION_BUCKETS) + 1)),
+        )
+        db.add(rollup)
+
+    rollup.run_count += 1
+    if run.status == "finished":
+        rollup.passed_count += 1
+    elif run.status == "failed":
+        rollup.failed_count += 1
+    else:
+        rollup.error_count += 1
+    if duration is not None:
+        histogram = json.loads(rollup.duration_histogram)
+        histogram[_bucket_index(duration)] += 1
+        rollup.duration_histogram = json.dumps(histogram)
+        rollup.duration_sum += duration
+
+
+def record_run(db, run: TestRun) -> None:
+    """Add a finished run to its hourly and daily buckets (commits)."""
+    if run.status not in FINAL_STATUSES or not run.finished_at:
+        return
+    duration = _run_duration(run)
+    with _lock:
+        # A concurrent process may insert the same bucket first; retry once as an update.
+        for attempt in range(2):
+            try:
+                for granularity in GRANULARITIES:
+                    _add_to_bucket(db, granularity, run, duration)
+                db.commit()
+                return
+            except IntegrityError:
+                db.rollback()
+                if attempt:
+                    raise
+
+
+def backfill(db) -> int:
+    """Build rollups from existing test_runs when the rollup table is still empty."""
+    if db.query(RunRollup.id).first() is not None:
+        return 0
+    buckets: dict[tuple, RunRollup] = {}
+    rows = (
+        db.query(TestRun.env, TestRun.test_type, TestRun.status,
+                 TestRun.created_at, TestRun.started_at, TestRun.finished_at)
+        .filter(TestRun.status.in_(FINAL_STATUSES), TestRun.finished_at.isnot(None))
+        .yield_per(1000)
+    )
+    count = 0
+    for env, test_type, status, created_at, started_at, finished_at in rows:
+        started = started_at or created_at
+        duration = max(0.0, (finished_at - started).total_seconds()) if started else None
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(finished_at, granularity), env, test_type)
+            rollup = buckets.get(key)
+            if rollup is None:
+                rollup = buckets[key] = RunRollup(
+                    granularity=granularity, bucket_start=key[1], env=env, test_type=test_type,
+                    run_count=0, passed_count=0, failed_count=0, error_count=0,
+                    duration_sum=0.0, duration_histogram=[0] * (len(DURATION_BUCKETS) + 1),
+                )
+            rollup.run_count += 1
+            if status == "finished":
+                rollup.passed_count += 1
+            elif status == "failed":
+                rollup.failed_count += 1
+            else:
+                rollup.error_count += 1
+            if duration is not None:
+                rollup.duration_histogram[_bucket_index(duration)] += 1
+                rollup.duration_sum += duration
+        count += 1
+
+    for rollup in buckets.values():
+        rollup.duration_histogram = json.dumps(rollup.duration_histogram)
+        db.add(rollup)
+    db.commit()
+    return count
+
+
+def totals(db) -> dict[str, int]:
+    """All-time counts of final statuses, read from the daily rollups."""
+    row = db.query(
+        func.coalesce(func.sum(RunRollup.passed_count), 0),
+        func.coalesce(func.sum(RunRollup.failed_count), 0),
+        func.coalesce(func.sum(RunRollup.error_count), 0),
+    ).filter(RunRollup.granularity == "day").one()
+    return {"finished": int(row[0]), "failed": int(row[1]), "error": int(row[2])}
+
+
+def trend(
+    db,
+    granularity: str,
+    since: datetime,
+    env: str | None = None,
+    test_type: str | None = None,
+) -> list[dict]:
+    """Per-bucket run count, pass rate and p50/p95 duration since `since`, empty buckets included."""
+    query = db.query(RunRollup).filter(
+        RunRollup.granularity == granularity,
+        RunRollup.bucket_start >= bucket_start(since, granularity),
+    )
+    if env:
+        query = query.filter(RunRollup.env == env)
+    if test_type:
+        query = query.filter(RunRollup.test_type == test_type)
+
+    merged: dict[datetime, dict] = {}
+    for rollup in query:
+        bucket = merged.setdefault(rollup.bucket_start, {
+            "runs": 0, "passed": 0, "failed": 0, "errors": 0,
+            "histogram": [0] * (len(DURATION_BUCKETS) + 1),
+        })
+        bucket["runs"] += rollup.run_count
+        bucket["passed"] += rollup.passed_count
+        bucket["failed"] += rollup.failed_count
+        bucket["errors"] += rollup.error_count
+        for i, count in enumerate(json.loads(rollup.duration_histogram)):
+            bucket["histogram"][i] += count
+
+    step = timedelta(hours=1) if granularity == "hour" else timedelta(days=1)
+    current = bucket_start(since, granularity)
+    end = bucket_start(datetime.utcnow(), granularity)
+    points = []
+    while current <= end:
+        bucket = merged.get(current)
+        if bucket:
+            points.append({
+                "bucket": current,
+                "runs": bucket["runs"],
+                "passed": bucket["passed"],
+                "failed": bucket["failed"],
+                "errors": bucket["errors"],
+                "pass_rate": round(100.0 * bucket["passed"] / bucket["runs"], 1) if bucket["runs"] else None,
+                "p50": _percentile(bucket["histogram"], 0.5),
+                "p95": _percentile(bucket["histogram"], 0.95),
+            })
+        else:
+            points.append({
+                "bucket": current, "runs": 0, "passed": 0, "failed": 0, "errors": 0,
+                "pass_rate": None, "p50": None, "p95": None,
+            })
+        current += step
+    return points
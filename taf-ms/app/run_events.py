@@ -0,0 +1,146 @@
+"""Server-Sent Events stream of live run progress, read from each run's events.jsonl."""
+import asyncio
+import json
+import os
+
+from sqlalchemy import select
+
+from app.artifact_store import open_decoded
+from app.config import ROBOT_RUNS_PATH
+from app.db import AsyncSessionLocal
+from app.models import TestRun
+
+# Written by robot-tests/libs/ProgressListener.py into the run folder.
+EVENTS_FILE = "events.jsonl"
+POLL_INTERVAL = 1.0
+# Idle streams still send a comment now and then so proxies keep them open.
+KEEPALIVE_INTERVAL = 15.0
+ACTIVE_STATUSES = ("scheduled", "queued", "running")
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def _load_states(run_ids: list[int]) -> dict[int, tuple]:
+    """(status, run_folder, (passed, failed, skipped)) of each run, in one query on the async engine."""
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(
+            select(
+                TestRun.id, TestRun.status, TestRun.run_folder,
+                TestRun.tests_passed, TestRun.tests_failed, TestRun.tests_skipped,
+            ).where(TestRun.id.in_(run_ids))
+        )
+        return {run_id: (status, run_folder, counts) for run_id, status, run_folder, *counts in rows}
+
+
+def _read_new_lines(path: str, offset: int) -> tuple[list[str], int]:
+    """Complete lines appended since `offset`, and the offset after them (also once compressed)."""
+    try:
+        source = open_decoded(path)
+        if source is None:
+            return [], offset
+        with source:
+            source.seek(offset)
+            chunk = source.read()
+    except OSError:
+        return [], offset
+    end = chunk.rfind(b"\n")
+    if end < 0:
+        return [], offset
+    return chunk[: end + 1].decode("utf-8", errors="replace").splitlines(), offset + end + 1
+
+
+class _RunProgress:
+    def __init__(self, run_id: int):
+        self.run_id = run_id
+        self.status: str | None = None
+        self.offset = 0
+        self.passed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.current: str | None = None
+
+    def counters(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "status": self.status,
+            "passed": self.passed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "current_test": self.current,
+        }
+
+    def settle(self, counts: tuple) -> None:
+        """Take the final counters recorded for the ended run (from output.xml) where there are any."""
+        if any(count is not None for count in counts):
+            self.passed, self.failed, self.skipped = (count or 0 for count in counts)
+        self.current = None
+
+    def apply(self, event: dict) -> None:
+        if event.get("event") == "test_start":
+            self.current = event.get("test")
+        elif event.get("event") == "test_end":
+            status = event.get("status")
+            if status == "PASS":
+                self.passed += 1
+            elif status == "SKIP":
+                self.skipped += 1
+            else:
+                self.failed += 1
+            if self.current == event.get("test"):
+                self.current = None
+
+
+async def stream_progress(run_ids: list[int], request):
+    """
+    Yield SSE messages for the given runs until all of them have ended or the client leaves.
+    Events: "status" (run status changed), "test_start", "test_end" (with live counters), "done".
+    """
+    progress = {run_id: _RunProgress(run_id) for run_id in run_ids}
+    idle = 0.0
+    yield "retry: 3000\n\n"
+
+    while progress:
+        if await request.is_disconnected():
+            return
+        states = await _load_states(list(progress))
+        sent = False
+
+        for run_id, tracker in list(progress.items()):
+            state = states.get(run_id)
+            if state is None:
+                yield _sse("done", {"run_id": run_id, "status": None})
+                del progress[run_id]
+                continue
+            status, run_folder, counts = state
+
+            if run_folder:
+                path = os.path.join(ROBOT_RUNS_PATH, run_folder, EVENTS_FILE)
+                lines, tracker.offset = await asyncio.to_thread(_read_new_lines, path, tracker.offset)
+                for line in lines:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    tracker.apply(event)
+                    yield _sse(event.get("event", "message"), {**tracker.counters(), "test": event.get("test"),
+                                                               "test_status": event.get("status")})
+                    sent = True
+
+            if status not in ACTIVE_STATUSES:
+                tracker.settle(counts)
+            if status != tracker.status:
+                tracker.status = status
+                yield _sse("status", tracker.counters())
+                sent = True
+            if status not in ACTIVE_STATUSES:
+                yield _sse("done", tracker.counters())
+                del progress[run_id]
+
+        idle = 0.0 if sent else idle + POLL_INTERVAL
+        if idle >= KEEPALIVE_INTERVAL:
+            idle = 0.0
+            yield ": keepalive\n\n"
+        if progress:
+            await asyncio.sleep(POLL_INTERVAL)
@@ -0,0 +1,157 @@
+"""Smart run strategies: order tests by failure history and limit runs to changed suites."""
+import hashlib
+import json
+import os
+
+from sqlalchemy.exc import IntegrityError
+
+from app.models import ContentSnapshot, SuiteResult, TestResult, TestRun
+from app.test_discovery import discover_tests
+
+STRATEGIES = ("full", "failed_first", "changed_only")
+STRATEGY_LABELS = {
+    "full": "Full selection",
+    "failed_first": "Failing & flaky first",
+    "changed_only": "Changed suites only",
+}
+# Final runs of an env whose per-test results feed the priorities.
+HISTORY_RUNS = 20
+_HISTORY_STATUSES = ("finished", "failed", "error", "timeout")
+
+
+def snapshot_content(db) -> tuple[str, dict[str, str], dict[str, list[str]]]:
+    """Record the current content hashes (deduplicated). Returns (digest, hashes, imports)."""
+    discovery = discover_tests()
+    hashes = discovery["hashes"]
+    encoded = json.dumps(hashes, sort_keys=True)
+    digest = hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+    if db.get(ContentSnapshot, digest) is None:
+        db.add(ContentSnapshot(digest=digest, hashes=encoded))
+        try:
+            db.commit()
+        except IntegrityError:  # stored concurrently by another run
+            db.rollback()
+    return digest, hashes, discovery["imports"]
+
+
+def test_priorities(db, env: str) -> dict[str, float]:
+    """
+    Score tests by recent history of `env`: failed in the latest run first, then flaky
+    (status flips) and frequently failing ones. Tests with no failures are left out.
+    """
+    run_ids = [
+        run_id for (run_id,) in db.query(TestRun.id)
+        .filter(TestRun.env == env, TestRun.status.in_(_HISTORY_STATUSES))
+        .order_by(TestRun.id.desc())
+        .limit(HISTORY_RUNS)
+    ]
+    if not run_ids:
+        return {}
+    history: dict[str, list[tuple[int, str]]] = {}
+    rows = db.query(TestResult.full_name, TestResult.run_id, TestResult.status).filter(TestResult.run_id.in_(run_ids))
+    for full_name, run_id, status in rows:
+        history.setdefault(full_name, []).append((run_id, status))
+
+    scores = {}
+    for full_name, results in history.items():
+        results.sort(reverse=True)  # newest first
+        statuses = [status for _, status in results if status != "SKIP"]
+        if "FAIL" not in statuses:
+            continue
+        flips = sum(1 for a, b in zip(statuses, statuses[1:]) if a != b)
+        score = (100.0 if statuses[0] == "FAIL" else 0.0) + 10.0 * flips + 10.0 * statuses.count("FAIL") / len(statuses)
+        scores[full_name] = round(score, 2)
+    return scores
+
+
+def _affected_suites(changed: set[str], imports: dict[str, list[str]]) -> set[str]:
+    """Robot files that changed or (transitively) import a changed resource."""
+    affected = set()
+    for key in imports:
+        if not key.startswith("tests/"):
+            continue
+        seen, stack = set(), [key]
+        while stack:
+            current = stack.pop()
+            if current in changed:
+                affected.add(key.split("/", 1)[1])
+                break
+            for imported in imports.get(current, []):
+                if imported not in seen:
+                    seen.add(imported)
+                    stack.append(imported)
+    return affected
+
+
+def changed_suites(db, run: TestRun, hashes: dict[str, str], imports: dict[str, list[str]]) -> tuple[list[str] | None, int | None]:
+    """
+    Suite files to run for changed_only: files changed since the last green run with the same
+    env and selection, plus suites that failed in later runs.
+    Returns (sorted file names, baseline run id), or (None, None) without a green baseline.
+    """
+    baseline = (
+        db.query(TestRun)
+        .filter(
+            TestRun.env == run.env,
+            TestRun.test_type == run.test_type,
+            TestRun.status == "finished",
+            TestRun.content_digest.isnot(None),
+            TestRun.upload_digest.is_(None),  # upload runs did not run the checkout's suites
+            TestRun.id < run.id,
+        )
+        .order_by(TestRun.id.desc())
+        .first()
+    )
+    snapshot = db.get(ContentSnapshot, baseline.content_digest) if baseline else None
+    if snapshot is None:
+        return None, None
+
+    old_hashes = json.loads(snapshot.hashes)
+    changed = {path for path, sha in hashes.items() if old_hashes.get(path) != sha}
+    suites = _affected_suites(changed, imports)
+
+    later_runs = (
+        db.query(TestRun.id)
+        .filter(TestRun.env == run.env, TestRun.test_type == run.test_type, TestRun.id > baseline.id, TestRun.id < run.id)
+    )
+    for (source,) in (
+        db.query(SuiteResult.source)
+        .filter(SuiteResult.run_id.in_(later_runs.scalar_subquery()), SuiteResult.status == "FAIL")
+        .distinct()
+    ):
+        name = os.path.basename(source or "")
+        if name.endswith(".robot") and f"tests/{name}" in hashes:
+            suites.add(name)
+    return sorted(suites), baseline.id
+
+
+def plan_run(db, run_id: int) -> dict | None:
+    """
+    Snapshot the test content for a run about to start (not for upload runs) and build its execution plan:
+    {"strategy", "priorities": {test full name: score}, "suite_files": [...] | None, "baseline_run_id"}.
+    Reruns of failed tests get {"strategy": "rerun_failed", "rerun_of", "rerun_source": run folder}.
+    Returns None for full runs (nothing to change).
+    """
+    run = db.get(TestRun, run_id)
+    if run is None:
+        return None
+    hashes, imports = {}, {}
+    # Upload runs execute their own files: a snapshot of tests/ would not describe what they ran.
+    if not run.upload_digest:
+        digest, hashes, imports = snapshot_content(db)
+        run.content_digest = digest
+        db.commit()
+
+    if run.rerun_of:
+        source = db.get(TestRun, run.rerun_of)
+        folder = source.run_folder if source is not None and not source.artifacts_pruned else None
+        return {"strategy": "rerun_failed", "rerun_of": run.rerun_of, "rerun_source": folder}
+
+    strategy = run.strategy or "full"
+    if strategy not in ("failed_first", "changed_only"):
+        return None
+    plan = {"strategy": strategy, "priorities": test_priorities(db, run.env), "suite_files": None, "baseline_run_id": None}
+    # Uploaded suites are not part of the content snapshot, so there is nothing to compare.
+    if strategy == "changed_only" and not run.upload_digest:
+        plan["suite_files"], plan["baseline_run_id"] = changed_suites(db, run, hashes, imports)
+    return plan
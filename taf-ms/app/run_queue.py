@@ -0,0 +1,391 @@
+"""DB-backed run queue drained by a dispatcher on the executor loop."""
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from app.config import (
+    AGENT_LEASE_SECONDS,
+    LOCAL_RUNNER_ENABLED,
+    MAX_CONCURRENT_RUNS,
+    MAX_CONCURRENT_RUNS_PER_ENV,
+    load_env_configs,
+)
+from app import executor
+from app.db import SessionLocal
+from app.fanout import refresh_parent
+from app.models import QueuedRun, RunnerAgent, TestRun
+from app.run_planning import plan_run
+from app.runner_service import run_folder_for, run_robot, update_run_result
+
+logger = logging.getLogger(__name__)
+
+# Lower value is picked first: manual runs jump ahead of scheduled ones.
+PRIORITY_MANUAL = 0
+PRIORITY_SCHEDULED = 10
+
+# The dispatcher also polls, so runs enqueued by another process are picked up too.
+POLL_INTERVAL = 5.0
+
+_wakeup: asyncio.Event | None = None
+_dispatch_lock = threading.Lock()
+_dispatcher: Future | None = None
+_tasks: set[asyncio.Task] = set()
+# Runs this process is executing; their local claims' leases are renewed by the dispatcher.
+_running: set[int] = set()
+
+
+def enqueue_run(db, run: TestRun, priority: int = PRIORITY_MANUAL) -> None:
+    """Mark a run as queued and add it to the queue table."""
+    now = datetime.utcnow()
+    run.status = "queued"
+    run.queued_at = now
+    # The artifact folder is fixed before execution so nothing has to guess it later.
+    run.run_folder = run.run_folder or run_folder_for(run.id)
+    db.add(QueuedRun(run_id=run.id, env=run.env, priority=priority, enqueued_at=now))
+    db.commit()
+    notify_workers()
+
+
+def dequeue_run(db, run_id: int) -> bool:
+    """Remove a run that no worker has taken yet. Returns False if it is already running."""
+    deleted = (
+        db.query(QueuedRun)
+        .filter(QueuedRun.run_id == run_id, QueuedRun.claimed_at.is_(None))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return bool(deleted)
+
+
+def notify_workers() -> None:
+    """Wake the dispatcher (thread-safe)."""
+    if _wakeup is not None:
+        executor.call_soon(_wakeup.set)
+
+
+def env_limit(env: str, env_configs: dict) -> int:
+    return env_configs.get(env, {}).get("max_concurrent_runs", MAX_CONCURRENT_RUNS_PER_ENV)
+
+
+def run_capacity(db) -> int:
+    """Runs that can execute at once: the local limit plus agents that heartbeated within a lease."""
+    agent_capacity = (
+        db.query(func.sum(RunnerAgent.capacity))
+        .filter(RunnerAgent.last_heartbeat >= datetime.utcnow() - timedelta(seconds=AGENT_LEASE_SECONDS))
+        .scalar()
+        or 0
+    )
+    return (MAX_CONCURRENT_RUNS if LOCAL_RUNNER_ENABLED else 0) + agent_capacity
+
+
+def _claim_next(db, agent: RunnerAgent | None = None) -> int | None:
+    """
+    Claim the highest-priority queued run that fits the concurrency limits, for the local
+    worker (agent=None, capped by MAX_CONCURRENT_RUNS) or for a remote agent (capped by its
+    capacity and served envs). Per-env limits count runs held anywhere.
+    """
+    active_by_env = dict(
+        db.query(QueuedRun.env, func.count(QueuedRun.id))
+        .filter(QueuedRun.claimed_at.isnot(None))
+        .group_by(QueuedRun.env)
+        .all()
+    )
+    held = db.query(func.count(QueuedRun.id)).filter(QueuedRun.claimed_at.isnot(None))
+    if agent is None:
+        held = held.filter(QueuedRun.agent_id.is_(None)).scalar()
+        if held >= MAX_CONCURRENT_RUNS:
+            return None
+    else:
+        held = held.filter(QueuedRun.agent_id == agent.id).scalar()
+        if held >= agent.capacity:
+            return None
+
+    env_configs = load_env_configs()
+    saturated = [env for env, count in active_by_env.items() if count >= env_limit(env, env_configs)]
+
+    query = db.query(QueuedRun).filter(QueuedRun.claimed_at.is_(None))
+    if saturated:
+        query = query.filter(QueuedRun.env.notin_(saturated))
+    if agent is not None and agent.envs:
+        query = query.filter(QueuedRun.env.in_(agent.envs.split(",")))
+    entry = query.order_by(QueuedRun.priority, QueuedRun.enqueued_at, QueuedRun.id).first()
+    if entry is None:
+        return None
+
+    now = datetime.utcnow()
+    # Local claims hold a lease too, so a replica that stops renewing (crashed) loses its runs,
+    # while runs another replica is executing are left alone.
+    values = {"claimed_at": now, "lease_expires_at": now + timedelta(seconds=AGENT_LEASE_SECONDS)}
+    if agent is not None:
+        values["agent_id"] = agent.id
+    # Conditional update so two claimers can never take the same entry.
+    claimed = (
+        db.query(QueuedRun)
+        .filter(QueuedRun.id == entry.id, QueuedRun.claimed_at.is_(None))
+        .update(values, synchronize_session=False)
+    )
+    if not claimed:
+        db.rollback()
+        return None
+    run = db.get(TestRun, entry.run_id)
+    if run:
+        run.status = "running"
+        run.started_at = now
+        run.runner = agent.name if agent is not None else "local"
+        refresh_parent(db, run.parent_id)
+    db.commit()
+    return entry.run_id
+
+
+def claim_for_agent(db, agent: RunnerAgent) -> int | None:
+    """Claim the next run for a remote agent (same ordering and limits as the local worker)."""
+    with _dispatch_lock:
+        return _claim_next(db, agent)
+
+
+def requeue(db, entry: QueuedRun) -> None:
+    """Release a claimed entry so any worker can take the run again."""
+    entry.claimed_at = None
+    entry.agent_id = None
+    entry.lease_expires_at = None
+    entry.cancel_requested = None
+    run = db.get(TestRun, entry.run_id)
+    if run:
+        run.status = "queued"
+        run.started_at = None
+        run.runner = None
+        refresh_parent(db, run.parent_id)
+
+
+def renew_local_leases(db, run_ids) -> None:
+    """Extend the leases of the local claims this process is still executing."""
+    if not run_ids:
+        return
+    db.query(QueuedRun).filter(
+        QueuedRun.run_id.in_(list(run_ids)), QueuedRun.agent_id.is_(None), QueuedRun.claimed_at.isnot(None)
+    ).update(
+        {"lease_expires_at": datetime.utcnow() + timedelta(seconds=AGENT_LEASE_SECONDS)},
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def reclaim_expired_leases(db) -> int:
+    """Put runs whose agent or dashboard process stopped renewing its lease back in the queue."""
+    expired = (
+        db.query(QueuedRun)
+        .filter(QueuedRun.claimed_at.isnot(None), QueuedRun.lease_expires_at < datetime.utcnow())
+        .all()
+    )
+    for entry in expired:
+        if entry.cancel_requested:
+            # Nobody will report back; finish the cancellation here.
+            run = db.get(TestRun, entry.run_id)
+            if run:
+                run.status = "cancelled"
+                run.finished_at = datetime.utcnow()
+                refresh_parent(db, run.parent_id)
+            db.delete(entry)
+        else:
+            requeue(db, entry)
+    db.commit()
+    return len(expired)
+
+
+def _load_run(run_id: int) -> tuple | None:
+    db = SessionLocal()
+    try:
+        run = db.get(TestRun, run_id)
+        if not run:
+            return None
+        return run.env, run.test_type, run.target_url, run.run_folder or run_folder_for(run.id), run.upload_digest
+    finally:
+        db.close()
+
+
+def _claim() -> int | None:
+    if not LOCAL_RUNNER_ENABLED:
+        return None
+    with _dispatch_lock:
+        db = SessionLocal()
+        try:
+            return _claim_next(db)
+        finally:
+            db.close()
+
+
+def _reclaim() -> None:
+    db = SessionLocal()
+    try:
+        renew_local_leases(db, set(_running))
+        if reclaim_expired_leases(db):
+            notify_workers()
+    finally:
+        db.close()
+
+
+def _plan(run_id: int) -> dict | None:
+    db = SessionLocal()
+    try:
+        return plan_run(db, run_id)
+    except Exception:
+        # A smart run whose plan cannot be built still runs, as a full run.
+        logger.exception("Could not plan run %s", run_id)
+        return None
+    finally:
+        db.close()
+
+
+def _finish(run_id: int) -> None:
+    db = SessionLocal()
+    try:
+        db.query(QueuedRun).filter(QueuedRun.run_id == run_id).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _mark_error(run_id: int) -> None:
+    """End a run whose result could not be recorded as "error", so it does not stay "running"."""
+    db = SessionLocal()
+    try:
+        run = db.get(TestRun, run_id)
+        if run and run.finished_at is None:
+            run.status = "error"
+            run.finished_at = datetime.utcnow()
+            refresh_parent(db, run.parent_id)
+            db.commit()
+    finally:
+        db.close()
+
+
+async def _execute(run_id: int) -> None:
+    """Run one claimed entry; blocking DB work goes to the default thread pool."""
+    _running.add(run_id)
+    try:
+        spec = await asyncio.to_thread(_load_run, run_id)
+        if spec is None:
+            return
+        env, test_type, target_url, run_folder, upload_digest = spec
+        try:
+            plan = await asyncio.to_thread(_plan, run_id)
+            result = await run_robot(
+                run_id, env, test_type, target_url=target_url, run_folder=run_folder, plan=plan, uploads=upload_digest
+            )
+        except Exception:
+            result = {"interpreted_status": "error", "run_folder": run_folder}
+        try:
+            await asyncio.to_thread(update_run_result, run_id, result)
+        except Exception:
+            logger.exception("Could not record the result of run %s", run_id)
+            await asyncio.to_thread(_mark_error, run_id)
+    finally:
+        await asyncio.to_thread(_finish, run_id)
+        _running.discard(run_id)
+        # A slot was freed; look for the next run.
+        notify_workers()
+
+
+async def _dispatch_loop() -> None:
+    """Claim runs while the concurrency limits allow and run each as a task on this loop."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    while True:
+        _wakeup.clear()
+        try:
+            await asyncio.to_thread(_reclaim)
+        except Exception:
+            pass
+        while True:
+            try:
+                run_id = await asyncio.to_thread(_claim)
+            except Exception:
+                run_id = None
+            if run_id is None:
+                break
+            task = asyncio.create_task(_execute(run_id))
+            _tasks.add(task)
+            task.add_done_callback(_tasks.discard)
+        try:
+            await asyncio.wait_for(_wakeup.wait(), POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+def recover_queue() -> None:
+    """
+    Requeue local claims without a lease (taken before claims had one). Leased claims, including
+    runs other replicas are executing, are only reclaimed once their lease expires.
+    """
+    db = SessionLocal()
+    try:
+        orphaned = (
+            db.query(QueuedRun)
+            .filter(
+                QueuedRun.claimed_at.isnot(None), QueuedRun.agent_id.is_(None), QueuedRun.lease_expires_at.is_(None)
+            )
+            .all()
+        )
+        for entry in orphaned:
+            requeue(db, entry)
+        db.commit()
+    finally:
+        db.close()
+
+
+def start_workers() -> None:
+    """Start the dispatcher once; it keeps at most MAX_CONCURRENT_RUNS runs going."""
+    global _dispatcher
+    if _dispatcher is not None:
+        return
+    recover_queue()
+    executor.start_warm_pool()
+    _dispatcher = executor.submit(_dispatch_loop())
+
+
+def cancel_running(db, run_id: int) -> bool:
+    """Stop a claimed run (locally, or via the agent's next heartbeat). Returns False if it is not running."""
+    entry = db.query(QueuedRun).filter(QueuedRun.run_id == run_id, QueuedRun.claimed_at.isnot(None)).first()
+    if entry is None:
+        return False
+    if entry.agent_id is not None:
+        entry.cancel_requested = True
+        db.commit()
+    else:
+        executor.cancel(run_id)
+    return True
+
+
+def queue_stats(db, window: timedelta = timedelta(hours=24)) -> dict:
+    """Queue depth and wait-time metrics for the stats page."""
+    now = datetime.utcnow()
+    depth_by_env = dict(
+        db.query(QueuedRun.env, func.count(QueuedRun.id))
+        .filter(QueuedRun.claimed_at.is_(None))
+        .group_by(QueuedRun.env)
+        .all()
+    )
+    active = db.query(func.count(QueuedRun.id)).filter(QueuedRun.claimed_at.isnot(None)).scalar() or 0
+    oldest = db.query(func.min(QueuedRun.enqueued_at)).filter(QueuedRun.claimed_at.is_(None)).scalar()
+
+    waits = [
+        (started - queued).total_seconds()
+        for queued, started in db.query(TestRun.queued_at, TestRun.started_at)
+        .filter(TestRun.started_at >= now - window, TestRun.queued_at.isnot(None))
+        .all()
+    ]
+    return {
+        "depth": sum(depth_by_env.values()),
+        "depth_by_env": depth_by_env,
+        "active": active,
+        "max_concurrent": run_capacity(db),
+        "subprocesses": executor.active_count(),
+        "oldest_wait": (now - oldest).total_seconds() if oldest else 0.0,
+        "avg_wait": sum(waits) / len(waits) if waits else 0.0,
+        "max_wait": max(waits) if waits else 0.0,
+        "started_in_window": len(waits),
+    }
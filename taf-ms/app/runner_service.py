@@ -1,92 +1,190 @@
+import asyncio
+import contextlib
+import json
 import os
-import subprocess
+import shutil
 from datetime import datetime
-from xml.etree import ElementTree
 
-from app.config import ROBOT_RUNS_PATH, ROBOT_ROOT
+from app import executor
+from app.artifact_store import compress_run, open_decoded
+from app.config import ROBOT_RUNS_PATH, ROBOT_ROOT, RUN_TIMEOUT_SECONDS, WORKSPACES_PATH
 from app.db import SessionLocal
+from app.fanout import refresh_parent
+from app.latency import record_latency
+from app.metrics import observe_run
 from app.models import TestRun
-
-
-def _status_from_output_xml(runs_path: str, latest: str | None) -> str | None:
-    if not latest:
-        return None
-
-    output_path = os.path.join(runs_path, latest, "output.xml")
-    if not os.path.exists(output_path):
-        return None
-
-    try:
-        tree = ElementTree.parse(output_path)
-        root = tree.getroot()
-
-        # Prefer total statistics, fall back to first suite stat
-        stat = root.find("./statistics/total/stat")
-        if stat is None:
-            stat = root.find("./statistics/suite/stat")
-
-        if stat is None:
-            return None
-
-        failed = int(stat.get("fail", "0"))
-        return "finished" if failed == 0 else "failed"
-    except Exception:
-        return None
-
-
-def run_robot(env: str = "dev", test_type: str = "smoke", target_url: str | None = None):
+from app.rollups import record_run
+from app.uploads import build_workspace, remove_workspace
+
+# Console output (stdout + stderr) of a run, inside its run folder.
+CONSOLE_LOG = "console.log"
+# Execution plan of a smart run, written into the run folder for the priority modifier.
+PLAN_FILE = "plan.json"
+# output.xml of the earlier run whose failed tests a rerun executes (run_tests.py --rerun-failed).
+RERUN_SOURCE_FILE = "rerun-source.xml"
+# Outcomes decided by the dashboard that output.xml must not overwrite.
+_KEPT_STATUSES = ("cancelled", "timeout")
+
+
+def run_folder_for(run_id: int) -> str:
+    """Artifact folder name (under ROBOT_RUNS_PATH) owned by a single run."""
+    return f"run-{run_id}"
+
+
+def build_command(
+    env: str,
+    test_type: str,
+    target_url: str | None,
+    run_dir: str,
+    plan: dict | None = None,
+    workspace: str | None = None,
+) -> list[str]:
     cmd = [
         "python",
         os.path.join(ROBOT_ROOT, "runner", "run_tests.py"),
         "--env",
         env,
+        "--output-dir",
+        run_dir,
     ]
 
     if target_url:
         cmd.extend(["--base-url", target_url])
+    if workspace:
+        cmd.extend(["--workspace", workspace])
 
     # pass tag include properly
     if test_type:
         cmd.extend(["--include", test_type])
 
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    # Smart runs (app/run_planning.py): restrict to changed suites, failing tests first.
+    if plan and plan.get("rerun_of"):
+        cmd.extend(["--rerun-failed", os.path.join(run_dir, RERUN_SOURCE_FILE)])
+    elif plan:
+        if plan.get("suite_files"):
+            cmd.extend(["--suite-files", ",".join(plan["suite_files"])])
+        if plan.get("priorities"):
+            cmd.extend(["--priorities", os.path.join(run_dir, PLAN_FILE)])
+    return cmd
+
+
+def copy_rerun_source(source_folder: str | None, run_dir: str) -> bool:
+    """Decompress the earlier run's output.xml into `run_dir`; False if it is gone."""
+    if not source_folder:
+        return False
+    source = open_decoded(os.path.join(ROBOT_RUNS_PATH, source_folder, "output.xml"))
+    if source is None:
+        return False
+    with source, open(os.path.join(run_dir, RERUN_SOURCE_FILE), "wb") as target:
+        shutil.copyfileobj(source, target, 64 * 1024)
+    return True
+
+
+async def run_robot(
+    run_id: int,
+    env: str = "dev",
+    test_type: str = "smoke",
+    target_url: str | None = None,
+    *,
+    run_folder: str,
+    timeout: float | None = RUN_TIMEOUT_SECONDS,
+    plan: dict | None = None,
+    uploads: str | None = None,
+):
+    """
+    Run the suite into ROBOT_RUNS_PATH/<run_folder> on the executor loop and interpret the outcome.
+    With `uploads` (an upload manifest digest) only those suites run, in a workspace of their own.
+    """
+    run_dir = os.path.join(ROBOT_RUNS_PATH, run_folder)
+    os.makedirs(run_dir, exist_ok=True)
+    log_path = os.path.join(run_dir, CONSOLE_LOG)
+    if plan:
+        with open(os.path.join(run_dir, PLAN_FILE), "w", encoding="utf-8") as f:
+            json.dump(plan, f)
+        if plan.get("suite_files") == []:
+            with open(log_path, "a", encoding="utf-8") as log:
+                log.write(f"No suite changed since green run #{plan['baseline_run_id']}; nothing to execute.\n")
+            return {"returncode": 0, "interpreted_status": "finished", "run_folder": run_folder}
+        if plan.get("rerun_of") and not copy_rerun_source(plan["rerun_source"], run_dir):
+            with open(log_path, "a", encoding="utf-8") as log:
+                log.write(f"output.xml of run #{plan['rerun_of']} is no longer stored; nothing to rerun.\n")
+            return {"returncode": 252, "interpreted_status": "error", "run_folder": run_folder}
+    workspace = None
+    if uploads:
+        try:
+            workspace = await asyncio.to_thread(build_workspace, os.path.join(WORKSPACES_PATH, run_folder), uploads)
+        except (OSError, ValueError):
+            with open(log_path, "a", encoding="utf-8") as log:
+                log.write("The uploaded suites of this run are no longer stored.\n")
+            return {"returncode": 252, "interpreted_status": "error", "run_folder": run_folder}
+    cmd = build_command(env, test_type, target_url, run_dir, plan, workspace)
 
-    latest = None
-    if os.path.exists(ROBOT_RUNS_PATH):
-        folders = sorted(os.listdir(ROBOT_RUNS_PATH), reverse=True)
-        if folders:
-            latest = folders[0]
+    try:
+        if await asyncio.to_thread(executor.warm_pool_ready):
+            # Same arguments, executed in an already-initialised worker instead of a new interpreter.
+            outcome = await executor.run_warm(run_id, cmd[2:], log_path, timeout or None)
+        else:
+            outcome = await executor.run_process(run_id, cmd, log_path, timeout or None)
+    finally:
+        if workspace:
+            await asyncio.to_thread(remove_workspace, workspace)
+    if plan and plan.get("rerun_of"):
+        # The merged output.xml includes everything the source held.
+        with contextlib.suppress(OSError):
+            os.remove(os.path.join(run_dir, RERUN_SOURCE_FILE))
 
     # ---------- interpret Robot outcome ----------
-    status_code = result.returncode
-
-    interpreted_status = _status_from_output_xml(ROBOT_RUNS_PATH, latest)
-    if interpreted_status is None:
-        if status_code == 0:
-            interpreted_status = "finished"
-        elif status_code == 1:
-            interpreted_status = "failed"
-        else:
-            interpreted_status = "error"
+    # Exit code only; update_run_result refines it from the ingested output.xml.
+    status_code = outcome["returncode"]
+    if outcome["cancelled"]:
+        interpreted_status = "cancelled"
+    elif outcome["timed_out"]:
+        interpreted_status = "timeout"
+    elif status_code == 0:
+        interpreted_status = "finished"
+    elif 1 <= status_code <= 250:
+        interpreted_status = "failed"
+    else:
+        interpreted_status = "error"
 
     return {
         "returncode": status_code,
         "interpreted_status": interpreted_status,
-        "run_folder": latest,
-        "stdout": result.stdout,
-        "stderr": result.stderr,
+        "run_folder": run_folder,
     }
 
 
 def update_run_result(run_id: int, result: dict) -> None:
-    """Update a TestRun with robot execution result."""
+    """Update a TestRun with robot execution result and ingest its per-test results."""
+    from app.result_ingest import ingest_output_xml  # XML parsing is only needed once a run ends
+    from app.reruns import retry_failed  # imports the run queue, which imports this module
+
     db = SessionLocal()
     try:
         run = db.get(TestRun, run_id)
         if run:
-            run.status = result.get("interpreted_status", "error")
-            run.run_folder = result.get("run_folder")
+            status = result.get("interpreted_status", "error")
+            run_folder = result.get("run_folder") or run.run_folder
+            summary = None
+            if run_folder:
+                run_dir = os.path.join(ROBOT_RUNS_PATH, run_folder)
+                summary = ingest_output_xml(db, run_id, run_dir)
+                record_latency(db, run, run_dir)
+            if summary:
+                if status not in _KEPT_STATUSES:
+                    status = summary["status"]
+                run.tests_passed = summary["passed"]
+                run.tests_failed = summary["failed"]
+                run.tests_skipped = summary["skipped"]
+            run.status = status
+            run.run_folder = run_folder
             run.finished_at = datetime.utcnow()
+            refresh_parent(db, run.parent_id)
             db.commit()
+            record_run(db, run)
+            observe_run(run)
+            if run_folder:
+                compress_run(run_folder)
+            retry_failed(db, run)
     finally:
         db.close()
@@ -1,14 +1,202 @@
+import logging
+import threading
 from datetime import datetime
 from typing import Optional
 
+from apscheduler.events import EVENT_JOB_MISSED
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import text
 
-from app.db import SessionLocal
+from app.artifact_store import maintain_artifacts
+from app.config import (
+    SCHEDULER_CATCH_UP,
+    SCHEDULER_COALESCE,
+    SCHEDULER_ENABLED,
+    SCHEDULER_MISFIRE_GRACE_SECONDS,
+)
+from app.db import SessionLocal, engine
 from app.models import TestRun
-from app.runner_service import run_robot, update_run_result
+from app.run_queue import PRIORITY_SCHEDULED, enqueue_run
 
-scheduler = BackgroundScheduler()
-scheduler.start()
+logger = logging.getLogger(__name__)
+
+
+def _job_store() -> SQLAlchemyJobStore:
+    """Jobs live in the database so scheduled and recurring runs survive restarts."""
+    return SQLAlchemyJobStore(engine=engine, tablename="apscheduler_jobs")
+
+
+# Started by start_scheduler() once the schema exists.
+scheduler = BackgroundScheduler(
+    jobstores={"default": _job_store()},
+    job_defaults={
+        "coalesce": SCHEDULER_COALESCE,
+        "misfire_grace_time": SCHEDULER_MISFIRE_GRACE_SECONDS,
+        "max_instances": 1,
+    },
+)
+SCHEDULED_RUN_PREFIX = "scheduled-run-"
+# Ids of daily/weekly jobs from before recurring runs were Schedule rows (see app.schedules).
+LEGACY_RECURRING_PREFIX = "recurring-"
+# Fires missed since start (beyond the misfire grace period).
+misfires = 0
+
+# Replicas share the job store, but APScheduler does not coordinate schedulers on one store: only
+# the leader (holder of a PostgreSQL advisory lock) runs jobs. The others keep a paused scheduler,
+# so their handlers can still add and remove jobs, and take over when the leader goes away.
+_LEADER_LOCK_ID = 7_310_918
+# How often followers try to become leader, and the leader picks up jobs other replicas added.
+LEADER_POLL_SECONDS = 15.0
+is_leader = False
+_leader_conn = None
+_leader_stop = threading.Event()
+
+
+def _scheduled_run_job_id(run_id: int) -> str:
+    return f"{SCHEDULED_RUN_PREFIX}{run_id}"
+
+
+def start_scheduler() -> None:
+    """Start the scheduler paused, then run jobs once this process is the leader (checked periodically)."""
+    if scheduler.running:
+        return
+    scheduler.add_listener(_on_missed, EVENT_JOB_MISSED)
+    scheduler.start(paused=True)
+    scheduler.add_job(
+        func=maintain_artifacts,
+        trigger="interval",
+        hours=1,
+        id="artifact-maintenance",
+        replace_existing=True,
+    )
+    _leader_stop.clear()
+    _elect()
+    threading.Thread(target=_leader_loop, name="scheduler-leader", daemon=True).start()
+
+
+def stop_scheduler() -> None:
+    """Stop firing jobs (they stay persisted for the next start) and give up leadership."""
+    _leader_stop.set()
+    if scheduler.running:
+        if is_leader:
+            scheduler.shutdown(wait=False)
+        else:
+            # Even paused, the scheduler processes due jobs once more on shutdown, which would submit
+            # (and drop) the leader's jobs here: detach the shared store first.
+            scheduler.remove_jobstore("default")
+            scheduler.shutdown(wait=False)
+            scheduler.add_jobstore(_job_store(), "default")
+    _step_down()
+
+
+def _acquire_leadership() -> bool:
+    global _leader_conn
+    if engine.dialect.name != "postgresql":
+        return True  # SQLite: a single dashboard process
+    conn = engine.connect()
+    try:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": _LEADER_LOCK_ID}).scalar()
+        conn.rollback()  # the lock is held by the session, not the transaction
+    except Exception:
+        conn.close()
+        raise
+    if not acquired:
+        conn.close()
+        return False
+    _leader_conn = conn
+    return True
+
+
+def _still_leader() -> bool:
+    """False once the connection holding the lock is gone (the lock went with it)."""
+    if _leader_conn is None:
+        return engine.dialect.name != "postgresql"
+    try:
+        _leader_conn.execute(text("SELECT 1"))
+        _leader_conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def _step_down() -> None:
+    global is_leader, _leader_conn
+    if is_leader:
+        logger.info("Scheduler stepped down")
+        if scheduler.running:
+            scheduler.pause()
+    is_leader = False
+    if _leader_conn is not None:
+        try:
+            _leader_conn.close()  # ends the session and releases the lock
+        except Exception:
+            pass
+        _leader_conn = None
+
+
+def _elect() -> None:
+    global is_leader
+    if is_leader:
+        if _still_leader():
+            scheduler.wakeup()  # jobs added by other replicas
+            return
+        _step_down()
+    if not SCHEDULER_ENABLED or not _acquire_leadership():
+        return
+    is_leader = True
+    from app.schedules import sync_all  # imports this module
+
+    _rehydrate_scheduled_runs()
+    with SessionLocal() as db:
+        sync_all(db)
+    scheduler.resume()
+    logger.info("Scheduler is running jobs in this process")
+
+
+def _leader_loop() -> None:
+    while not _leader_stop.wait(LEADER_POLL_SECONDS):
+        try:
+            _elect()
+        except Exception:
+            logger.exception("Scheduler leader election failed")
+
+
+def _rehydrate_scheduled_runs() -> None:
+    """Runs still `scheduled` whose job is gone (e.g. created before jobs were persisted)."""
+    db = SessionLocal()
+    try:
+        runs = db.query(TestRun.id, TestRun.scheduled_for).filter(TestRun.status == "scheduled").all()
+    finally:
+        db.close()
+    for run_id, scheduled_for in runs:
+        if scheduler.get_job(_scheduled_run_job_id(run_id)) is None:
+            # A past run_date fires now if within the grace period, otherwise it is reported as missed.
+            schedule_run(run_id, scheduled_for or datetime.now())
+            logger.info("Re-created the job of scheduled run %s", run_id)
+
+
+def _on_missed(event) -> None:
+    global misfires
+    misfires += 1
+    logger.warning("Scheduler missed job %s (due %s)", event.job_id, event.scheduled_run_time)
+    if event.job_id.startswith(SCHEDULED_RUN_PREFIX):
+        run_id = int(event.job_id[len(SCHEDULED_RUN_PREFIX):])
+        if SCHEDULER_CATCH_UP == "skip":
+            _cancel_missed_run(run_id)
+        else:
+            execute_scheduled_run(run_id)
+
+
+def _cancel_missed_run(run_id: int) -> None:
+    db = SessionLocal()
+    try:
+        run = db.get(TestRun, run_id)
+        if run and run.status == "scheduled":
+            run.status = "cancelled"
+            db.commit()
+    finally:
+        db.close()
 
 
 def schedule_run(run_id: int, run_time) -> None:
@@ -17,68 +205,37 @@ def schedule_run(run_id: int, run_time) -> None:
         trigger="date",
         run_date=run_time,
         args=[run_id],
-        id=str(run_id),
+        id=_scheduled_run_job_id(run_id),
         replace_existing=True,
     )
 
 
 def cancel_scheduled_run(run_id: int) -> None:
     try:
-        scheduler.remove_job(str(run_id))
+        scheduler.remove_job(_scheduled_run_job_id(run_id))
     except Exception:
         pass
 
 
 def execute_recurring_run(env: str, test_type: str, target_url: Optional[str]) -> None:
-    """Create a TestRun and execute it (for daily/weekly recurring)."""
+    """Recurring jobs persisted before schedules existed; app.schedules adopts them at startup."""
     db = SessionLocal()
     try:
-        run = TestRun(env=env, test_type=test_type, status="running", target_url=target_url)
+        run = TestRun(env=env, test_type=test_type, status="queued", target_url=target_url)
         db.add(run)
         db.commit()
         db.refresh(run)
-        run_id = run.id
+        enqueue_run(db, run, PRIORITY_SCHEDULED)
     finally:
         db.close()
-    result = run_robot(env, test_type, target_url=target_url)
-    update_run_result(run_id, result)
-
-
-def schedule_recurring(
-    schedule_type: str,
-    env: str,
-    test_type: str,
-    target_url: Optional[str],
-    hour: int,
-    minute: int,
-    day_of_week: Optional[str] = None,
-) -> str:
-    """Add daily or weekly recurring job. Returns job_id."""
-    job_id = f"recurring-{schedule_type}-{env}-{test_type}-{id(datetime.now())}"
-    trigger_kw = {"hour": hour, "minute": minute}
-    if schedule_type == "weekly" and day_of_week:
-        trigger_kw["day_of_week"] = day_of_week
-    scheduler.add_job(
-        func=execute_recurring_run,
-        trigger="cron",
-        id=job_id,
-        replace_existing=True,
-        args=[env, test_type, target_url],
-        **trigger_kw,
-    )
-    return job_id
 
 
 def execute_scheduled_run(run_id: int) -> None:
     db = SessionLocal()
     try:
         run = db.get(TestRun, run_id)
-        if not run:
+        if not run or run.status != "scheduled":
             return
-        env, test_type, target_url = run.env, run.test_type, run.target_url
-        run.status = "running"
-        db.commit()
+        enqueue_run(db, run, PRIORITY_SCHEDULED)
     finally:
         db.close()
-    result = run_robot(env, test_type, target_url=target_url)
-    update_run_result(run_id, result)
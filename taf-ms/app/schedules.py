@@ -0,0 +1,331 @@
+"""Recurring schedules: CRUD, their scheduler jobs, fire-time previews and a load-aware planner."""
+import logging
+from datetime import datetime, timedelta
+from statistics import median
+
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.triggers.cron import CronTrigger
+
+from app.config import SCHEDULER_JITTER_SECONDS, load_env_configs
+from app.db import SessionLocal
+from app.models import Schedule, TestRun
+from app.reruns import MAX_RETRY_FAILED
+from app.run_planning import STRATEGIES
+from app.run_queue import PRIORITY_SCHEDULED, enqueue_run, env_limit, run_capacity
+from app.scheduler import LEGACY_RECURRING_PREFIX, scheduler
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_TYPES = ("daily", "weekly")
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+SCHEDULE_FIELDS = (
+    "name", "schedule_type", "env", "test_type", "target_url", "strategy", "hour", "minute", "day_of_week", "enabled",
+    "retry_failed", "upload_digest",
+)
+JOB_PREFIX = "schedule-"
+
+# Expected duration of a run without finished history for its env and test_type.
+DEFAULT_RUN_SECONDS = 600
+# Recent runs of an env/test_type whose median duration estimates the next one.
+DURATION_HISTORY = 20
+# Overlaps are checked over one full weekly cycle; spreading moves a schedule in 5-minute steps.
+PLAN_HORIZON = timedelta(days=7)
+SPREAD_STEP_MINUTES = 5
+
+
+def job_id_for(schedule_id: int) -> str:
+    return f"{JOB_PREFIX}{schedule_id}"
+
+
+def validate(fields: dict) -> str | None:
+    """Error message for invalid schedule fields, None when valid."""
+    if fields.get("schedule_type") not in SCHEDULE_TYPES:
+        return "schedule_type must be daily or weekly."
+    if not (fields.get("env") or "").strip():
+        return "env is required."
+    if not (fields.get("test_type") or "").strip():
+        return "test_type is required."
+    if not 0 <= int(fields.get("hour", -1)) <= 23 or not 0 <= int(fields.get("minute", -1)) <= 59:
+        return "hour must be 0-23 and minute 0-59."
+    if fields["schedule_type"] == "weekly" and fields.get("day_of_week") not in WEEKDAYS:
+        return "Weekly schedules need day_of_week (mon..sun)."
+    if fields.get("strategy") and fields["strategy"] not in STRATEGIES:
+        return f"strategy must be one of {', '.join(STRATEGIES)}."
+    if not 0 <= int(fields.get("retry_failed") or 0) <= MAX_RETRY_FAILED:
+        return f"retry_failed must be 0-{MAX_RETRY_FAILED}."
+    return None
+
+
+def _normalized(fields: dict) -> dict:
+    fields = {key: fields[key] for key in SCHEDULE_FIELDS if key in fields}
+    fields["target_url"] = fields.get("target_url") or None
+    fields["retry_failed"] = fields.get("retry_failed") or 0
+    if fields.get("strategy") == "full":
+        fields["strategy"] = None
+    if fields.get("schedule_type") == "daily":
+        fields["day_of_week"] = None
+    return fields
+
+
+def trigger_for(schedule: Schedule, jitter: bool = True) -> CronTrigger:
+    kwargs = {"hour": schedule.hour, "minute": schedule.minute, "timezone": scheduler.timezone}
+    if schedule.schedule_type == "weekly":
+        kwargs["day_of_week"] = schedule.day_of_week
+    if jitter and SCHEDULER_JITTER_SECONDS > 0:
+        kwargs["jitter"] = SCHEDULER_JITTER_SECONDS
+    return CronTrigger(**kwargs)
+
+
+def sync_job(schedule: Schedule) -> None:
+    """Create, replace or remove the scheduler job of `schedule`."""
+    if schedule.enabled:
+        scheduler.add_job(
+            func=execute_schedule,
+            trigger=trigger_for(schedule),
+            args=[schedule.id],
+            id=job_id_for(schedule.id),
+            replace_existing=True,
+        )
+    else:
+        _remove_job(job_id_for(schedule.id))
+
+
+def _remove_job(job_id: str) -> None:
+    try:
+        scheduler.remove_job(job_id)
+    except JobLookupError:
+        pass
+
+
+def execute_schedule(schedule_id: int) -> None:
+    """Scheduler job: queue one run of the schedule."""
+    db = SessionLocal()
+    try:
+        schedule = db.get(Schedule, schedule_id)
+        if schedule is None or not schedule.enabled:
+            return
+        run = TestRun(
+            env=schedule.env,
+            test_type=schedule.test_type,
+            status="queued",
+            target_url=schedule.target_url,
+            strategy=schedule.strategy,
+            schedule_id=schedule.id,
+            upload_digest=schedule.upload_digest,
+        )
+        db.add(run)
+        db.commit()
+        db.refresh(run)
+        enqueue_run(db, run, PRIORITY_SCHEDULED)
+    finally:
+        db.close()
+
+
+def next_fire_times(
+    schedule: Schedule, count: int = 5, after: datetime | None = None, until: datetime | None = None,
+) -> list[datetime]:
+    """The next `count` times (or all times up to `until`) the schedule fires, before jitter."""
+    trigger = trigger_for(schedule, jitter=False)
+    fire = trigger.get_next_fire_time(None, after or datetime.now(scheduler.timezone))
+    times = []
+    while fire is not None and (len(times) < count if until is None else fire <= until):
+        times.append(fire)
+        fire = trigger.get_next_fire_time(fire, fire)
+    return times
+
+
+# ---------- CRUD ----------
+
+
+def create_schedule(db, fields: dict, spread: bool = False) -> tuple[Schedule, bool]:
+    """
+    Store a schedule and its job; an identical existing schedule is returned instead of a duplicate.
+    With `spread`, a schedule that would exceed the concurrency limits is moved to a free slot.
+    Returns (schedule, moved). Raises ValueError for invalid fields.
+    """
+    fields = _normalized(fields)
+    error = validate(fields)
+    if error:
+        raise ValueError(error)
+    identity = {key: fields.get(key) for key in SCHEDULE_FIELDS if key not in ("name", "enabled", "retry_failed")}
+    existing = db.query(Schedule).filter_by(**identity).first()
+    if existing is not None:
+        return existing, False
+    schedule = Schedule(**fields)
+    db.add(schedule)
+    db.flush()
+    moved = spread_schedule(db, schedule) if spread else False
+    db.commit()
+    sync_job(schedule)
+    return schedule, moved
+
+
+def update_schedule(db, schedule: Schedule, fields: dict, spread: bool = False) -> bool:
+    """Apply changed fields (ValueError if invalid) and reschedule. Returns whether it was spread."""
+    merged = _normalized({**{key: getattr(schedule, key) for key in SCHEDULE_FIELDS}, **fields})
+    error = validate(merged)
+    if error:
+        raise ValueError(error)
+    for key, value in merged.items():
+        setattr(schedule, key, value)
+    schedule.updated_at = datetime.utcnow()
+    db.flush()
+    moved = spread_schedule(db, schedule) if spread else False
+    db.commit()
+    sync_job(schedule)
+    return moved
+
+
+def delete_schedule(db, schedule: Schedule) -> None:
+    _remove_job(job_id_for(schedule.id))
+    db.delete(schedule)
+    db.commit()
+
+
+def sync_all(db) -> None:
+    """
+    Startup: adopt recurring jobs created before schedules existed, give every enabled schedule
+    its job and drop jobs whose schedule was deleted.
+    """
+    for job in scheduler.get_jobs():
+        if job.id.startswith(LEGACY_RECURRING_PREFIX):
+            _adopt_legacy_job(db, job)
+    schedules = {schedule.id: schedule for schedule in db.query(Schedule)}
+    for job in scheduler.get_jobs():
+        if job.id.startswith(JOB_PREFIX) and int(job.id[len(JOB_PREFIX):]) not in schedules:
+            _remove_job(job.id)
+    for schedule in schedules.values():
+        if schedule.enabled and scheduler.get_job(job_id_for(schedule.id)) is None:
+            sync_job(schedule)
+
+
+def _adopt_legacy_job(db, job) -> None:
+    try:
+        values = {field.name: str(field) for field in job.trigger.fields}
+        env, test_type, target_url = job.args
+        weekly = values["day_of_week"] != "*"
+        create_schedule(db, {
+            "schedule_type": "weekly" if weekly else "daily",
+            "env": env,
+            "test_type": test_type,
+            "target_url": target_url,
+            "hour": int(values["hour"]),
+            "minute": int(values["minute"]),
+            "day_of_week": values["day_of_week"] if weekly else None,
+        })
+    except (AttributeError, KeyError, ValueError):
+        logger.exception("Could not convert recurring job %s into a schedule", job.id)
+        return
+    _remove_job(job.id)
+
+
+# ---------- planner ----------
+
+
+def expected_duration(db, env: str, test_type: str) -> float:
+    """Median duration (seconds) of recent completed runs with this env and test_type."""
+    rows = (
+        db.query(TestRun.started_at, TestRun.finished_at)
+        .filter(
+            TestRun.env == env,
+            TestRun.test_type == test_type,
+            TestRun.status.in_(("finished", "failed")),
+            TestRun.started_at.isnot(None),
+            TestRun.finished_at.isnot(None),
+        )
+        .order_by(TestRun.id.desc())
+        .limit(DURATION_HISTORY)
+    )
+    durations = [(finished - started).total_seconds() for started, finished in rows]
+    return median(durations) if durations else DEFAULT_RUN_SECONDS
+
+
+def _conflicts(db, schedules: list[Schedule], durations: dict, only_id: int | None = None) -> list[dict]:
+    start = datetime.now(scheduler.timezone)
+    end = start + PLAN_HORIZON
+    events = []
+    for schedule in schedules:
+        key = (schedule.env, schedule.test_type)
+        if key not in durations:
+            durations[key] = expected_duration(db, *key)
+        # Jitter can delay a run's start, so it may overlap for that much longer.
+        length = timedelta(seconds=durations[key] + max(0, SCHEDULER_JITTER_SECONDS))
+        for fire in next_fire_times(schedule, after=start, until=end):
+            events.append((fire, 1, schedule))
+            events.append((fire + length, -1, schedule))
+    # At the same instant, runs that end free their slot before new ones start.
+    events.sort(key=lambda event: (event[0], event[1]))
+
+    env_configs = load_env_configs()
+    global_limit = run_capacity(db)
+    active: dict[int, int] = {}
+    by_id = {schedule.id: schedule for schedule in schedules}
+    conflicts, seen = [], set()
+    for at, delta, schedule in events:
+        active[schedule.id] = active.get(schedule.id, 0) + delta
+        if delta < 0:
+            continue
+        running = {sid: n for sid, n in active.items() if n > 0}
+        env_running = {sid: n for sid, n in running.items() if by_id[sid].env == schedule.env}
+        checks = (
+            ("all environments", running, global_limit),
+            (f"env {schedule.env}", env_running, env_limit(schedule.env, env_configs)),
+        )
+        for scope, members, limit in checks:
+            # No runner online (LOCAL_RUNNER=0 without agents): there is no capacity to plan against.
+            if limit <= 0 or sum(members.values()) <= limit:
+                continue
+            ids = tuple(sorted(members))
+            if only_id is not None and only_id not in ids:
+                continue
+            if (scope, ids) in seen:
+                continue
+            seen.add((scope, ids))
+            conflicts.append({
+                "at": at,
+                "scope": scope,
+                "runs": sum(members.values()),
+                "limit": limit,
+                "schedule_ids": list(ids),
+            })
+    return conflicts
+
+
+def find_conflicts(db, schedule_id: int | None = None) -> list[dict]:
+    """
+    Times within the next week when enabled schedules would run more runs at once than the
+    global or per-env concurrency limit, using each schedule's expected duration
+    (optionally only conflicts involving `schedule_id`).
+    """
+    schedules = db.query(Schedule).filter(Schedule.enabled.is_(True)).all()
+    return _conflicts(db, schedules, {}, only_id=schedule_id)
+
+
+def spread_schedule(db, schedule: Schedule) -> bool:
+    """
+    Move `schedule` to the first later time of day (in SPREAD_STEP_MINUTES steps, same weekday)
+    where it causes no conflict. Returns whether it moved; it stays put when no slot is free.
+    """
+    if not schedule.enabled:
+        return False
+    others = [s for s in db.query(Schedule).filter(Schedule.enabled.is_(True)) if s.id != schedule.id]
+    durations: dict = {}
+    if not _conflicts(db, others + [schedule], durations, only_id=schedule.id):
+        return False
+    original = schedule.hour, schedule.minute
+    start = schedule.hour * 60 + schedule.minute
+    for step in range(1, 24 * 60 // SPREAD_STEP_MINUTES):
+        schedule.hour, schedule.minute = divmod((start + step * SPREAD_STEP_MINUTES) % (24 * 60), 60)
+        if not _conflicts(db, others + [schedule], durations, only_id=schedule.id):
+            return True
+    schedule.hour, schedule.minute = original
+    return False
+
+
+def upcoming(db, count: int = 10) -> list[dict]:
+    """Next fire times across enabled schedules, soonest first."""
+    fires = []
+    for schedule in db.query(Schedule).filter(Schedule.enabled.is_(True)):
+        fires.extend({"at": at, "schedule": schedule} for at in next_fire_times(schedule, count))
+    fires.sort(key=lambda fire: fire["at"])
+    return fires[:count]
@@ -0,0 +1,97 @@
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict
+
+
+class TestRunOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    env: str
+    test_type: str
+    status: str
+    target_url: str | None = None
+    run_folder: str | None = None
+    created_at: datetime | None = None
+    scheduled_for: datetime | None = None
+    queued_at: datetime | None = None
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    tests_passed: int | None = None
+    tests_failed: int | None = None
+    tests_skipped: int | None = None
+    artifacts_pruned: bool | None = None
+    runner: str | None = None
+    strategy: str | None = None
+    degraded: bool | None = None
+    degraded_reason: str | None = None
+    schedule_id: int | None = None
+    fanout: bool | None = None
+    parent_id: int | None = None
+    rerun_of: int | None = None
+    upload_digest: str | None = None
+
+
+class AgentRegister(BaseModel):
+    name: str
+    hostname: str | None = None
+    capacity: int = 1
+    envs: list[str] = []
+
+
+class AgentHeartbeat(BaseModel):
+    run_ids: list[int] = []
+
+
+class AgentResult(BaseModel):
+    status: str
+    returncode: int | None = None
+
+
+class ScheduleIn(BaseModel):
+    name: str | None = None
+    schedule_type: str
+    env: str
+    test_type: str
+    target_url: str | None = None
+    strategy: str | None = None
+    hour: int
+    minute: int = 0
+    day_of_week: str | None = None
+    enabled: bool = True
+    retry_failed: int = 0
+
+
+class ScheduleUpdate(BaseModel):
+    name: str | None = None
+    schedule_type: str | None = None
+    env: str | None = None
+    test_type: str | None = None
+    target_url: str | None = None
+    strategy: str | None = None
+    hour: int | None = None
+    minute: int | None = None
+    day_of_week: str | None = None
+    enabled: bool | None = None
+    retry_failed: int | None = None
+
+
+class ScheduleOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str | None = None
+    schedule_type: str
+    env: str
+    test_type: str
+    target_url: str | None = None
+    strategy: str | None = None
+    hour: int
+    minute: int
+    day_of_week: str | None = None
+    enabled: bool
+    retry_failed: int | None = 0
+    upload_digest: str | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+    next_runs: list[datetime] = []
@@ -1,79 +1,205 @@
-"""Discover test files and tags from robot-tests."""
+"""Discover test files, tests and tags from robot-tests."""
+import hashlib
 import os
 import re
+import threading
+import time
 
 from app.config import RESOURCES_DIR, ROBOT_ROOT, TESTS_DIR
+from app.metrics import DISCOVERY_SECONDS
 
 # Tags we consider "predefined suites"
 PREDEFINED_TAGS = ("smoke", "regression")
 
+_SECTION_RE = re.compile(r"^\*+\s*([^*]+?)\s*\**\s*$")
+_SEPARATOR_RE = re.compile(r"\s{2,}|\t|\s+\|\s+")
+_FILE_TAG_SETTINGS = ("test tags", "force tags")
+
+# Parsed files keyed by path; an entry is reused while (mtime_ns, size) match.
+_index: dict[str, tuple[int, int, dict]] = {}
+# Last discover_tests() result and the directory signature it was built from.
+_result: tuple[tuple, dict] | None = None
+_lock = threading.Lock()
+
+
+def _cells(line: str) -> list[str]:
+    return [c for c in _SEPARATOR_RE.split(line.strip()) if c]
+
+
+def _parse_robot_file(path: str) -> dict:
+    """
+    Extract file-level tags, test cases with their tags and resource imports from a
+    .robot or .resource file, plus a hash of its content.
+    Returns: { "file_tags": [...], "tests": [{"name": ..., "tags": [...]}, ...],
+               "resources": [import values], "sha1": "..." }
+    """
+    file_tags: list[str] = []
+    resources: list[str] = []
+    default_tags: list[str] = []
+    tests: list[dict] = []
+    explicit: set[int] = set()  # tests with their own [Tags]
+    section = ""
+    continuing: list[str] | None = None  # list that a "..." line extends
 
-def _tags_in_file(path: str) -> set[str]:
-    """Extract [Tags] from a .robot file."""
-    tags = set()
     try:
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            in_tags = False
-            for line in f:
-                line = line.rstrip()
-                if re.match(r"^\s*\[\s*Tags\s*\]", line, re.IGNORECASE):
-                    in_tags = True
-                    rest = re.sub(r"^\s*\[\s*Tags\s*\]\s*", "", line, flags=re.IGNORECASE)
-                    tags.update(t.strip().lower() for t in rest.split() if t.strip())
+        with open(path, "rb") as f:
+            content = f.read()
+    except OSError:
+        content = b""
+
+    for raw in content.decode("utf-8", errors="ignore").splitlines():
+        line = raw.rstrip()
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        header = _SECTION_RE.match(line)
+        if header:
+            section = header.group(1).lower()
+            continuing = None
+            continue
+
+        cells = _cells(line)
+        if cells and cells[0] == "...":
+            if continuing is not None:
+                continuing.extend(t.lower() for t in cells[1:])
+            continue
+        continuing = None
+
+        if section in ("settings", "setting"):
+            name = cells[0].lower()
+            if name in _FILE_TAG_SETTINGS:
+                continuing = file_tags
+            elif name == "default tags":
+                continuing = default_tags
+            elif name == "resource" and len(cells) > 1:
+                resources.append(cells[1])
+            if continuing is not None:
+                continuing.extend(t.lower() for t in cells[1:])
+        elif section in ("test cases", "test case", "tasks", "task"):
+            if not line[0].isspace():
+                tests.append({"name": cells[0], "tags": []})
+                cells = cells[1:]
+                if not cells:
                     continue
-                if in_tags:
-                    if line.strip().startswith("[") or not line.strip():
-                        in_tags = False
-                    else:
-                        tags.update(t.strip().lower() for t in line.split() if t.strip())
-    except Exception:
-        pass
-    return tags
+            if tests and re.match(r"^\[\s*tags\s*\]$", cells[0], re.IGNORECASE):
+                explicit.add(len(tests) - 1)
+                continuing = tests[-1]["tags"]
+                continuing.extend(t.lower() for t in cells[1:])
+
+    for i, test in enumerate(tests):
+        own = test["tags"] if i in explicit else default_tags
+        test["tags"] = sorted(set(own) | set(file_tags))
+    return {
+        "file_tags": sorted(set(file_tags)),
+        "tests": tests,
+        "resources": resources,
+        "sha1": hashlib.sha1(content).hexdigest(),
+    }
+
+
+def _parsed(path: str, mtime_ns: int, size: int) -> dict:
+    """Cached parse of `path` (caller holds _lock)."""
+    cached = _index.get(path)
+    if cached and cached[0] == mtime_ns and cached[1] == size:
+        return cached[2]
+    parsed = _parse_robot_file(path)
+    _index[path] = (mtime_ns, size, parsed)
+    return parsed
+
+
+def _resolve_import(value: str, resource_names: set[str]) -> str | None:
+    """Map a `Resource` import to "resources/<name>" (all shared resources live in resources/)."""
+    name = value.replace("\\", "/").rsplit("/", 1)[-1]
+    return f"resources/{name}" if name in resource_names else None
+
+
+def _scan(directory: str, extension: str) -> list[tuple[str, int, int]]:
+    """(name, mtime_ns, size) of matching files, sorted by name."""
+    if not os.path.isdir(directory):
+        return []
+    found = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.lower().endswith(extension) or not entry.is_file():
+                continue
+            st = entry.stat()
+            found.append((entry.name, st.st_mtime_ns, st.st_size))
+    return sorted(found)
 
 
 def discover_tests() -> dict:
     """
     Scan tests/ for .robot files and map tags to file names.
-    Returns: { "tags": {...}, "all_tags": {...}, "robot_files": [...], "resource_files": [...] }
+    Only files whose mtime or size changed since the last call are re-parsed.
+    Returns: { "tags": {...}, "all_tags": {...}, "robot_files": [...], "resource_files": [...],
+               "tests": {file: [{"name", "tags"}]}, "file_tags": {file: [...]},
+               "hashes": {"tests/x.robot" | "resources/y.resource": sha1},
+               "imports": {same keys: ["resources/y.resource", ...]} }
+    The returned dict is shared between callers and must not be modified.
     """
-    tags_to_files: dict[str, list[str]] = {t: [] for t in PREDEFINED_TAGS}
-    all_tags_to_files: dict[str, list[str]] = {}
-    robot_files: list[str] = []
-    resource_files: list[str] = []
+    global _result
+    start = time.perf_counter()
+    robot_stats = _scan(TESTS_DIR, ".robot")
+    resource_stats = _scan(RESOURCES_DIR, ".resource")
+    signature = (tuple(robot_stats), tuple(resource_stats))
+
+    with _lock:
+        if _result is not None and _result[0] == signature:
+            DISCOVERY_SECONDS.observe(time.perf_counter() - start, "hit")
+            return _result[1]
+
+        tags_to_files: dict[str, list[str]] = {t: [] for t in PREDEFINED_TAGS}
+        all_tags_to_files: dict[str, list[str]] = {}
+        tests_by_file: dict[str, list[dict]] = {}
+        file_tags_by_file: dict[str, list[str]] = {}
+        robot_files: list[str] = []
+        seen_paths = set()
+
+        resource_names = {name for name, _, _ in resource_stats}
+        hashes: dict[str, str] = {}
+        imports: dict[str, list[str]] = {}
+
+        for name, mtime_ns, size in resource_stats:
+            path = os.path.join(RESOURCES_DIR, name)
+            seen_paths.add(path)
+            parsed = _parsed(path, mtime_ns, size)
+            key = f"resources/{name}"
+            hashes[key] = parsed["sha1"]
+            imports[key] = [r for r in (_resolve_import(v, resource_names) for v in parsed["resources"]) if r]
+
+        for name, mtime_ns, size in robot_stats:
+            path = os.path.join(TESTS_DIR, name)
+            seen_paths.add(path)
+            parsed = _parsed(path, mtime_ns, size)
+            key = f"tests/{name}"
+            hashes[key] = parsed["sha1"]
+            imports[key] = [r for r in (_resolve_import(v, resource_names) for v in parsed["resources"]) if r]
 
-    if not os.path.isdir(TESTS_DIR):
-        return {
+            robot_files.append(name)
+            tests_by_file[name] = parsed["tests"]
+            file_tags_by_file[name] = parsed["file_tags"]
+            file_tags = set(parsed["file_tags"])
+            for test in parsed["tests"]:
+                file_tags.update(test["tags"])
+            for tag in PREDEFINED_TAGS:
+                if tag in file_tags:
+                    tags_to_files[tag].append(name)
+            for tag in sorted(file_tags):
+                all_tags_to_files.setdefault(tag, []).append(name)
+
+        for path in list(_index):
+            if path not in seen_paths:
+                del _index[path]
+
+        result = {
             "tags": tags_to_files,
             "all_tags": all_tags_to_files,
             "robot_files": robot_files,
-            "resource_files": resource_files,
+            "resource_files": [name for name, _, _ in resource_stats],
+            "tests": tests_by_file,
+            "file_tags": file_tags_by_file,
+            "hashes": hashes,
+            "imports": imports,
         }
-
-    for name in sorted(os.listdir(TESTS_DIR)):
-        if not name.lower().endswith(".robot"):
-            continue
-        path = os.path.join(TESTS_DIR, name)
-        if not os.path.isfile(path):
-            continue
-        robot_files.append(name)
-        file_tags = _tags_in_file(path)
-        for tag in PREDEFINED_TAGS:
-            if tag in file_tags:
-                tags_to_files[tag].append(name)
-        for tag in file_tags:
-            if tag not in all_tags_to_files:
-                all_tags_to_files[tag] = []
-            if name not in all_tags_to_files[tag]:
-                all_tags_to_files[tag].append(name)
-
-    if os.path.isdir(RESOURCES_DIR):
-        for name in sorted(os.listdir(RESOURCES_DIR)):
-            if name.lower().endswith(".resource"):
-                resource_files.append(name)
-
-    return {
-        "tags": tags_to_files,
-        "all_tags": all_tags_to_files,
-        "robot_files": robot_files,
-        "resource_files": resource_files,
-    }
+        _result = (signature, result)
+        DISCOVERY_SECONDS.observe(time.perf_counter() - start, "miss")
+        return result
@@ -0,0 +1,160 @@
+"""
+Uploaded suites: a content-addressed blob store and the per-run workspaces built from it.
+
+Each uploaded file is stored once under its SHA-256, and so is the manifest of an upload
+({"tests/a.robot": digest, "resources/b.resource": digest}); a run references the manifest's
+digest. Before the run starts it gets its own workspace with only its suites.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+from app.config import ROBOT_ROOT, UPLOADS_PATH, WORKSPACES_PATH
+from app.models import Schedule, TestRun
+
+logger = logging.getLogger(__name__)
+
+BLOBS_DIR = os.path.join(UPLOADS_PATH, "blobs")
+CHUNK_SIZE = 64 * 1024
+# Workspace directory of each uploaded file type.
+UPLOAD_KINDS = {".robot": "tests", ".resource": "resources"}
+# Checkout directories a workspace uses as they are (suites import ../libs/...).
+SHARED_DIRS = ("libs", "config")
+# Unreferenced blobs younger than this are kept: their upload may still be creating its run.
+GC_GRACE = timedelta(hours=1)
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_digest(value: str) -> bool:
+    return bool(_DIGEST_RE.match(value or ""))
+
+
+def blob_path(digest: str) -> str:
+    return os.path.join(BLOBS_DIR, digest[:2], digest)
+
+
+def store_blob(fileobj) -> str:
+    """Hash a file object in chunks and write it to the store only if the content is new."""
+    sha = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+        sha.update(chunk)
+    digest = sha.hexdigest()
+    path = blob_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fileobj.seek(0)
+        fd, tmp_path = tempfile.mkstemp(prefix=".upload-", dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(fileobj, out, CHUNK_SIZE)
+        # Workspaces hardlink blobs; read-only keeps a run from changing the stored content.
+        os.chmod(tmp_path, 0o444)
+        os.replace(tmp_path, path)
+    else:
+        # Repeated upload: only refresh the age used by garbage collection.
+        os.utime(path)
+    return digest
+
+
+def store_upload(files) -> str | None:
+    """
+    Store uploaded .robot/.resource files given as (filename, file object) pairs.
+    Returns the digest of their manifest, or None when no file qualifies.
+    """
+    manifest = {}
+    for filename, fileobj in files:
+        name = os.path.basename(filename or "")
+        kind = UPLOAD_KINDS.get(os.path.splitext(name.lower())[1])
+        if kind:
+            manifest[f"{kind}/{name}"] = store_blob(fileobj)
+    if not manifest:
+        return None
+    return store_blob(io.BytesIO(json.dumps(manifest, sort_keys=True).encode("utf-8")))
+
+
+def load_manifest(digest: str) -> dict[str, str]:
+    """{workspace path: blob digest} of an upload; FileNotFoundError once collected."""
+    with open(blob_path(digest), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _link(source: str, target: str) -> None:
+    try:
+        os.link(source, target)
+    except OSError:  # another filesystem, or links not supported
+        shutil.copyfile(source, target)
+
+
+def _link_dir(source: str, target: str) -> None:
+    try:
+        os.symlink(source, target, target_is_directory=True)
+    except OSError:
+        shutil.copytree(source, target)
+
+
+def build_workspace(path: str, digest: str) -> str:
+    """
+    Create the workspace of an upload at `path`: tests/ holds only the uploaded suites,
+    resources/ the uploaded resources plus the checkout's, libs/ and config/ point to the
+    checkout. Files are hardlinked, so this costs no copies. Returns `path`.
+    """
+    manifest = load_manifest(digest)
+    shutil.rmtree(path, ignore_errors=True)
+    for kind in UPLOAD_KINDS.values():
+        os.makedirs(os.path.join(path, kind))
+    for name, blob in manifest.items():
+        _link(blob_path(blob), os.path.join(path, name))
+    shared_resources = os.path.join(ROBOT_ROOT, "resources")
+    if os.path.isdir(shared_resources):
+        for entry in os.scandir(shared_resources):
+            target = os.path.join(path, "resources", entry.name)
+            if entry.is_file() and not os.path.exists(target):
+                _link(entry.path, target)
+    for name in SHARED_DIRS:
+        if os.path.isdir(os.path.join(ROBOT_ROOT, name)):
+            _link_dir(os.path.join(ROBOT_ROOT, name), os.path.join(path, name))
+    return path
+
+
+def remove_workspace(path: str) -> None:
+    # Shared directories are symlinks; rmtree on the workspace only unlinks them.
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def collect_garbage(db) -> int:
+    """Delete blobs no stored run or schedule refers to, and workspaces left by stopped runs."""
+    manifests = {digest for (digest,) in db.query(TestRun.upload_digest).filter(
+        TestRun.upload_digest.isnot(None), TestRun.artifacts_pruned.isnot(True)
+    ).distinct()}
+    manifests |= {digest for (digest,) in db.query(Schedule.upload_digest).filter(
+        Schedule.upload_digest.isnot(None)
+    ).distinct()}
+    keep = set(manifests)
+    for digest in manifests:
+        try:
+            keep.update(load_manifest(digest).values())
+        except (OSError, ValueError):
+            continue
+
+    removed = 0
+    cutoff = time.time() - GC_GRACE.total_seconds()
+    if os.path.isdir(BLOBS_DIR):
+        for prefix in os.scandir(BLOBS_DIR):
+            for entry in os.scandir(prefix.path) if prefix.is_dir() else ():
+                if entry.name not in keep and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+
+    if os.path.isdir(WORKSPACES_PATH):
+        active = {folder for (folder,) in db.query(TestRun.run_folder).filter(TestRun.status == "running")}
+        for entry in os.scandir(WORKSPACES_PATH):
+            if entry.name not in active and entry.stat().st_mtime < cutoff:
+                remove_workspace(entry.path)
+    return removed
@@ -0,0 +1,218 @@
+"""
+Seed a benchmark database and robot-tests tree with synthetic data (no network needed).
+
+Database (schema created by the migrations):
+  - `--runs` final runs spread over the last `--days` days, with mixed envs, selections and
+    outcomes, and their hourly/daily rollups
+  - per-test results and endpoint latency for the latest `--detailed-runs` runs
+
+Robot root (`--robot-root`, used by the dashboard through ROBOT_ROOT):
+  - config/, libs/, resources/ and runner/ of the real robot-tests checkout (linked)
+  - tests/ with `--suites` synthetic suite files of `--tests-per-suite` tests each, tagged `bench`;
+    every tenth suite is also tagged `e2e` (a small selection for end-to-end runs)
+  - run folders with a `--report-kb` log.html for the latest runs, compressed like real ones
+
+Usage (from taf-ms/):
+    python benchmarks/seed.py --database-url URL --robot-root DIR [--runs 100000] [--suites 2000]
+
+Prints a JSON summary (row counts and seconds per step).
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import time
+from datetime import datetime, timedelta
+
+TAF_MS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REAL_ROBOT_ROOT = os.path.join(os.path.dirname(TAF_MS), "robot-tests")
+LINKED_DIRS = ("config", "libs", "resources", "runner")
+
+BATCH_SIZE = 10_000
+ENVS = ("local", "stg", "dev", "qa")
+TEST_TYPES = ("smoke", "regression", "smoke AND api", "bench")
+# Cumulative weights of final statuses.
+STATUSES = (("finished", 0.80), ("failed", 0.95), ("error", 0.98), ("timeout", 0.99), ("cancelled", 1.0))
+ENDPOINTS = ("GET /get", "POST /post", "GET /status/200", "GET /json", "GET /headers")
+# Runs that get a run folder with a report.
+REPORT_RUNS = 20
+
+SUITE_TEMPLATE = """*** Settings ***
+Library    ../libs/HttpClient.py
+
+*** Test Cases ***
+{tests}"""
+TEST_TEMPLATE = """Bench Suite {suite:05d} Test {test:03d}
+    [Tags]    {tags}
+    ${{response}}=    Http Get    /status/200
+    Status Should Be    200    ${{response}}
+
+"""
+
+
+def build_tree(robot_root: str, suites: int, tests_per_suite: int) -> int:
+    """Create the robot root with a synthetic tests/ tree. Returns the number of tests."""
+    os.makedirs(robot_root, exist_ok=True)
+    for name in LINKED_DIRS:
+        target = os.path.join(robot_root, name)
+        if not os.path.lexists(target):
+            os.symlink(os.path.join(REAL_ROBOT_ROOT, name), target, target_is_directory=True)
+    tests_dir = os.path.join(robot_root, "tests")
+    shutil.rmtree(tests_dir, ignore_errors=True)
+    os.makedirs(tests_dir)
+    for suite in range(suites):
+        tags = ["bench", f"area-{suite % 50:02d}"] + (["e2e"] if suite % 10 == 0 else [])
+        tests = "".join(
+            TEST_TEMPLATE.format(suite=suite, test=test, tags="    ".join(tags)) for test in range(tests_per_suite)
+        )
+        with open(os.path.join(tests_dir, f"bench_{suite:05d}.robot"), "w", encoding="utf-8") as f:
+            f.write(SUITE_TEMPLATE.format(tests=tests))
+    return suites * tests_per_suite
+
+
+def _status(rng: random.Random) -> str:
+    roll = rng.random()
+    return next(status for status, bound in STATUSES if roll <= bound)
+
+
+def _run_rows(rng: random.Random, count: int, days: int, now: datetime):
+    span = days * 86400
+    for i in range(count):
+        # Ascending ids get ascending times, like real history.
+        created = now - timedelta(seconds=span * (1 - (i + 1) / count) + rng.random() * 60)
+        started = created + timedelta(seconds=rng.uniform(0, 30))
+        finished = started + timedelta(seconds=rng.lognormvariate(4, 0.8))
+        status = _status(rng)
+        total = rng.randint(5, 300)
+        failed = 0 if status == "finished" else rng.randint(1, max(1, total // 10)) if status == "failed" else 0
+        yield {
+            "env": rng.choice(ENVS),
+            "test_type": rng.choice(TEST_TYPES),
+            "status": status,
+            "created_at": created,
+            "queued_at": created,
+            "started_at": started,
+            "finished_at": finished,
+            "tests_passed": total - failed,
+            "tests_failed": failed,
+            "tests_skipped": 0,
+            "runner": "local",
+        }
+
+
+def seed_database(runs: int, days: int, detailed_runs: int, tests_per_run: int, seed: int) -> dict:
+    from sqlalchemy import insert, select
+
+    from app import migrations
+    from app.db import SessionLocal, engine
+    from app.models import EndpointLatency, TestResult, TestRun
+    from app.rollups import backfill
+
+    timings = {}
+    start = time.perf_counter()
+    migrations.migrate(engine)
+    timings["migrate_seconds"] = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    start = time.perf_counter()
+    batch = []
+    with engine.begin() as conn:
+        for row in _run_rows(rng, runs, days, now):
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                conn.execute(insert(TestRun), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(TestRun), batch)
+    timings["runs_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        latest = conn.execute(
+            select(TestRun.id, TestRun.env, TestRun.finished_at).order_by(TestRun.id.desc()).limit(detailed_runs)
+        ).all()
+        for run_id, _, _ in latest[:REPORT_RUNS]:
+            conn.execute(TestRun.__table__.update().where(TestRun.id == run_id).values(run_folder=f"run-{run_id}"))
+        results, latencies = [], []
+        for run_id, env, finished in latest:
+            for n in range(tests_per_run):
+                suite = n % 20
+                results.append({
+                    "run_id": run_id,
+                    "suite": f"Tests.Bench {suite:05d}",
+                    "name": f"Bench Suite {suite:05d} Test {n:03d}",
+                    "full_name": f"Tests.Bench {suite:05d}.Bench Suite {suite:05d} Test {n:03d}",
+                    "status": "FAIL" if rng.random() < 0.03 else "PASS",
+                    "tags": "bench",
+                    "duration": rng.uniform(0.01, 2.0),
+                })
+            for endpoint in ENDPOINTS:
+                p50 = rng.uniform(5, 40)
+                latencies.append({
+                    "run_id": run_id, "env": env, "endpoint": endpoint, "recorded_at": finished, "count": 50,
+                    "new_connections": 1, "p50_ms": p50, "p95_ms": p50 * 2, "p99_ms": p50 * 3, "max_ms": p50 * 4,
+                })
+        for i in range(0, len(results), BATCH_SIZE):
+            conn.execute(insert(TestResult), results[i:i + BATCH_SIZE])
+        if latencies:
+            conn.execute(insert(EndpointLatency), latencies)
+    timings["details_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        backfill(db)
+    timings["rollups_seconds"] = time.perf_counter() - start
+    return {
+        "runs": runs,
+        "test_results": len(latest) * tests_per_run,
+        "report_runs": [f"run-{run_id}" for run_id, _, _ in latest[:REPORT_RUNS]],
+        **{key: round(value, 3) for key, value in timings.items()},
+    }
+
+
+def write_reports(report_runs: list[str], report_kb: int) -> None:
+    """A log.html of roughly `report_kb` KiB per run folder, compressed like finished runs."""
+    from app.artifact_store import compress_run
+    from app.config import ROBOT_RUNS_PATH
+
+    line = '<tr><td class="kw">Http Get</td><td>/status/200</td><td class="pass">PASS</td></tr>\n'
+    body = "<html><body><table>\n" + line * (report_kb * 1024 // len(line)) + "</table></body></html>\n"
+    for run_folder in report_runs:
+        os.makedirs(os.path.join(ROBOT_RUNS_PATH, run_folder), exist_ok=True)
+        with open(os.path.join(ROBOT_RUNS_PATH, run_folder, "log.html"), "w", encoding="utf-8") as f:
+            f.write(body)
+        compress_run(run_folder)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed a benchmark database and robot-tests tree.")
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--robot-root", required=True, help="Directory for the synthetic robot-tests tree")
+    parser.add_argument("--runs", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--detailed-runs", type=int, default=200, help="Latest runs that get test results and latency")
+    parser.add_argument("--tests-per-run", type=int, default=100)
+    parser.add_argument("--suites", type=int, default=2000)
+    parser.add_argument("--tests-per-suite", type=int, default=10)
+    parser.add_argument("--report-kb", type=int, default=2048)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # The app reads both at import time.
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["ROBOT_ROOT"] = os.path.abspath(args.robot_root)
+    sys.path.insert(0, TAF_MS)
+
+    start = time.perf_counter()
+    tests = build_tree(args.robot_root, args.suites, args.tests_per_suite)
+    summary = {"suites": args.suites, "tests": tests, "tree_seconds": round(time.perf_counter() - start, 3)}
+    summary.update(seed_database(args.runs, args.days, args.detailed_runs, args.tests_per_run, args.seed))
+    write_reports(summary["report_runs"], args.report_kb)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
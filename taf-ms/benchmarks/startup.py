@@ -0,0 +1,158 @@
+"""
+Startup benchmark for the dashboard.
+
+Measures, each in a fresh interpreter:
+  - import: time to `import app.main` (no database work happens at import)
+  - cold boot: uvicorn start until /healthz and /readyz answer, on an empty SQLite database
+    (all migrations are applied)
+  - warm boot: the same on the database left by the cold boot (no migrations pending)
+
+Usage (from taf-ms/):
+    python benchmarks/startup.py [--repeat 5] [--output startup.json] [--database-url URL]
+
+With --database-url the cold boot is skipped unless the database is empty. Runs use
+LOCAL_RUNNER=0 unless set, so no tests are executed.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+TAF_MS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POLL_INTERVAL = 0.01
+BOOT_TIMEOUT = 120.0
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def _env(database_url: str) -> dict:
+    env = {**os.environ, "DATABASE_URL": database_url, "PYTHONPATH": TAF_MS}
+    env.setdefault("LOCAL_RUNNER", "0")
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _get(url: str) -> tuple[int, dict | None]:
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as exc:
+        return exc.code, None
+    except (urllib.error.URLError, ConnectionError, OSError):
+        return 0, None
+
+
+def measure_import(database_url: str) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=TAF_MS, env=_env(database_url), capture_output=True, text=True, check=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def measure_boot(database_url: str) -> dict:
+    """Seconds from process start until /healthz and /readyz return 200, plus the startup phases."""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=TAF_MS, env=_env(database_url), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    result = {"healthz_seconds": None, "readyz_seconds": None, "phases": {}}
+    try:
+        while time.perf_counter() - start < BOOT_TIMEOUT:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {proc.returncode}")
+            if result["healthz_seconds"] is None and _get(base + "/healthz")[0] == 200:
+                result["healthz_seconds"] = time.perf_counter() - start
+            if result["healthz_seconds"] is not None:
+                status, body = _get(base + "/readyz")
+                if status == 200:
+                    result["readyz_seconds"] = time.perf_counter() - start
+                    result["phases"] = body["phases"]
+                    return result
+            time.sleep(POLL_INTERVAL)
+        raise RuntimeError("dashboard did not become ready in time")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _summary(values: list[float]) -> dict:
+    return {
+        "median": round(statistics.median(values), 4),
+        "min": round(min(values), 4),
+        "max": round(max(values), 4),
+        "samples": [round(v, 4) for v in values],
+    }
+
+
+def _boot_summary(boots: list[dict]) -> dict:
+    phases = sorted({name for boot in boots for name in boot["phases"]})
+    return {
+        "healthz_seconds": _summary([b["healthz_seconds"] for b in boots]),
+        "readyz_seconds": _summary([b["readyz_seconds"] for b in boots]),
+        "phases_median": {
+            name: round(statistics.median(b["phases"].get(name, 0.0) for b in boots), 4) for name in phases
+        },
+    }
+
+
+def run(repeat: int, database_url: str | None) -> dict:
+    imports, cold, warm = [], [], []
+    with tempfile.TemporaryDirectory(prefix="taf-startup-") as tmp:
+        for i in range(repeat):
+            url = database_url or f"sqlite:///{os.path.join(tmp, f'bench-{i}.db')}"
+            imports.append(measure_import(url))
+            if database_url is None:
+                cold.append(measure_boot(url))
+            warm.append(measure_boot(url))
+    results = {
+        "python": sys.version.split()[0],
+        "database": "sqlite" if database_url is None else database_url.split(":", 1)[0],
+        "repeat": repeat,
+        "import_seconds": _summary(imports),
+        "warm_boot": _boot_summary(warm),
+    }
+    if cold:
+        results["cold_boot"] = _boot_summary(cold)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure dashboard import and boot times.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-url", help="Benchmark against this database instead of temporary SQLite files")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.database_url)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()